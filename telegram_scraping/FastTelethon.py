@@ -5,24 +5,33 @@ import asyncio
 import hashlib
 import inspect
 import math
+import mmap
 import os
-from collections import defaultdict
-from typing import Optional, List, AsyncGenerator, Union, Awaitable, DefaultDict, Tuple, BinaryIO
+import time
+import zlib
+from collections import deque
+from typing import Optional, List, AsyncGenerator, Union, Awaitable, Dict, Tuple, BinaryIO, Container, Callable, Set
 
 from telethon import utils, helpers, TelegramClient
-from telethon.crypto import AuthKey
+from telethon.errors import FloodWaitError
 from telethon.network import MTProtoSender
-from telethon.tl.alltlobjects import LAYER
-from telethon.tl.functions import InvokeWithLayerRequest
-from telethon.tl.functions.auth import ExportAuthorizationRequest, ImportAuthorizationRequest
 from telethon.tl.functions.upload import (GetFileRequest, SaveFilePartRequest,
                                           SaveBigFilePartRequest)
 from telethon.tl.types import (Document, InputFileLocation, InputDocumentFileLocation,
                                InputPhotoFileLocation, InputPeerPhotoFileLocation, TypeInputFile,
                                InputFileBig, InputFile)
 
+from metrics import metrics
+from sender_pool import SenderPool
+from transfer_tuning import AdaptiveController, DcStats, MAX_UPLOAD_CONNECTIONS, BIG_FILE_SIZE, DOWNLOAD_SINK
+
 loggers = None
 
+dc_stats = DcStats()
+
+# Called with the wait in seconds whenever a transfer hits FLOOD_WAIT
+flood_wait_hooks: List[Callable[[int], None]] = []
+
 TypeLocation = Union[Document, InputDocumentFileLocation, InputPeerPhotoFileLocation,
                      InputFileLocation, InputPhotoFileLocation]
 
@@ -44,6 +53,11 @@ class DownloadSender:
         self.request.offset += self.stride
         return result.bytes
 
+    async def fetch(self, offset: int) -> bytes:
+        self.request.offset = offset
+        result = await self.client._call(self.sender, self.request)
+        return result.bytes
+
     def disconnect(self) -> Awaitable[None]:
         return self.sender.disconnect()
 
@@ -70,7 +84,17 @@ class UploadSender:
 
     async def _next(self, data: bytes) -> None:
         self.request.bytes = data
-        await self.client._call(self.sender, self.request)
+        while True:
+            try:
+                with metrics.timer("telegram_upload_part_seconds"):
+                    await self.client._call(self.sender, self.request)
+                break
+            except FloodWaitError as e:
+                metrics.inc("telegram_flood_waits_total", dc="upload")
+                for hook in flood_wait_hooks:
+                    hook(e.seconds)
+                await asyncio.sleep(e.seconds)
+        metrics.inc("telegram_upload_bytes_total", len(data))
         self.request.file_part += self.stride
 
     async def disconnect(self) -> None:
@@ -79,18 +103,261 @@ class UploadSender:
         return await self.sender.disconnect()
 
 
+class DownloadSink:
+    """
+    Receives download parts as memoryviews at their offset in the file, so
+    parts can be written the moment they arrive without being copied or
+    reordered first. received counts bytes written, for progress.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.received = 0
+
+    def write(self, offset: int, data: memoryview) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class PwriteSink(DownloadSink):
+    """Positional writes into an open file descriptor, starting at base."""
+
+    def __init__(self, fd: int, size: int, base: int = 0) -> None:
+        super().__init__(size)
+        self.fd = fd
+        self.base = base
+
+    def write(self, offset: int, data: memoryview) -> None:
+        position = self.base + offset
+        view = data
+        while view:
+            written = os.pwrite(self.fd, view, position)
+            view = view[written:]
+            position += written
+        self.received += len(data)
+
+
+class MmapSink(DownloadSink):
+    """
+    Copies parts straight into a shared mapping of the file, which is grown
+    to size first. No syscall per part, but every written page stays
+    resident until the kernel writes it back.
+    """
+
+    def __init__(self, fd: int, size: int) -> None:
+        super().__init__(size)
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        self.map = mmap.mmap(fd, size) if size else None
+
+    def write(self, offset: int, data: memoryview) -> None:
+        self.map[offset:offset + len(data)] = data
+        self.received += len(data)
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+
+class ReassemblyWindow:
+    """
+    Collects parts that arrive out of order. In ordered mode get() returns
+    parts in sequence and at most `size` parts past the next one to be read
+    can be requested or held; unordered mode hands out whatever has arrived
+    and holds at most `size` parts. Either way buffered memory is capped at
+    size * part_size. With a sink, put() writes each part to it on arrival
+    and only the part's length is held for get().
+    """
+
+    def __init__(self, size: int, ordered: bool = True, sink: Optional[DownloadSink] = None,
+                 part_size: int = 0, on_part: Optional[Callable[[int, memoryview], None]] = None) -> None:
+        self.size = max(1, size)
+        self.ordered = ordered
+        self.sink = sink
+        self.part_size = part_size
+        self.on_part = on_part
+        self.next_part = 0
+        self.parts: Dict[int, Union[bytes, int]] = {}
+        self.error: Optional[BaseException] = None
+        self.running = 0
+        self.retired: Set[asyncio.Task] = set()
+        self.changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def reserve(self, part: int) -> None:
+        if self.ordered:
+            while part >= self.next_part + self.size:
+                await self.changed.wait()
+        else:
+            while len(self.parts) >= self.size:
+                await self.changed.wait()
+
+    def put(self, part: int, data: bytes) -> None:
+        if self.sink:
+            view = memoryview(data)
+            self.sink.write(part * self.part_size, view)
+            if self.on_part:
+                self.on_part(part, view)
+            data = len(data)
+        self.parts[part] = data
+        self._notify()
+
+    def retire(self) -> int:
+        """
+        Counts the calling sender out now rather than in its done callback,
+        so senders failing together each see the others go. Returns how many
+        are left.
+        """
+        self.retired.add(asyncio.current_task())
+        self.running -= 1
+        return self.running
+
+    def sender_done(self, task: asyncio.Task) -> None:
+        if task in self.retired:
+            self.retired.discard(task)
+        else:
+            self.running -= 1
+        if not task.cancelled() and task.exception():
+            self.error = task.exception()
+        self._notify()
+
+    def _ready(self) -> bool:
+        return self.next_part in self.parts if self.ordered else bool(self.parts)
+
+    async def get(self) -> Optional[Tuple[int, Union[bytes, int]]]:
+        while not self._ready():
+            if self.error:
+                raise self.error
+            if not self.running:
+                return None
+            await self.changed.wait()
+        part = self.next_part if self.ordered else min(self.parts)
+        data = self.parts.pop(part)
+        self.next_part = part + 1
+        self._notify()
+        return part, data
+
+
+class PartScheduler:
+    """Hands out part indices, lowest first, to however many senders are running."""
+
+    def __init__(self, parts: List[int], part_size: int) -> None:
+        self.pending = deque(parts)
+        self.part_size = part_size
+
+    def take(self) -> Optional[int]:
+        return self.pending.popleft() if self.pending else None
+
+    def put_back(self, part: int) -> None:
+        self.pending.appendleft(part)
+
+
+class PartJournal:
+    """
+    Records which parts of a download are already on disk, one
+    "<index> <crc32>" line per part, next to the output file. A journal
+    written for a different size or part size is ignored.
+    """
+
+    def __init__(self, path: str, size: int, part_size: int) -> None:
+        self.path = path
+        self.size = size
+        self.part_size = part_size
+        self.done: Dict[int, int] = {}
+        self.fp = None
+
+    @property
+    def part_count(self) -> int:
+        return math.ceil(self.size / self.part_size)
+
+    @property
+    def complete(self) -> bool:
+        return len(self.done) == self.part_count
+
+    def part_length(self, index: int) -> int:
+        return min(self.part_size, self.size - index * self.part_size)
+
+    @staticmethod
+    def saved_part_size(path: str, size: int) -> int:
+        try:
+            with open(path, "r") as f:
+                header = f.readline().split()
+        except OSError:
+            return 0
+        return int(header[1]) if len(header) == 2 and header[0] == str(size) else 0
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            header = f.readline().split()
+            if header != [str(self.size), str(self.part_size)]:
+                return
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2:  # a torn last line is just dropped
+                    self.done[int(parts[0])] = int(parts[1])
+
+    def verify(self, fd: int) -> None:
+        # Parts whose bytes did not make it to disk get downloaded again
+        for index, crc in list(self.done.items()):
+            data = os.pread(fd, self.part_length(index), index * self.part_size)
+            if zlib.crc32(data) != crc:
+                del self.done[index]
+
+    def start(self) -> None:
+        self.fp = open(self.path, "w")
+        self.fp.write(f"{self.size} {self.part_size}\n")
+        self.fp.writelines(f"{index} {crc}\n" for index, crc in self.done.items())
+        self.fp.flush()
+
+    def record(self, index: int, data: bytes) -> None:
+        crc = zlib.crc32(data)
+        self.done[index] = crc
+        self.fp.write(f"{index} {crc}\n")
+        self.fp.flush()
+
+    def close(self, remove: bool = False) -> None:
+        if self.fp:
+            self.fp.close()
+            self.fp = None
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
+
+
 class ParallelTransferrer:
-    def __init__(self, client: TelegramClient, dc_id: Optional[int] = None) -> None:
+    def __init__(self, client: TelegramClient, dc_id: Optional[int] = None,
+                 stats: Optional[DcStats] = None, pool: Optional[SenderPool] = None) -> None:
         self.client = client
+        self.stats = stats or dc_stats
+        self.pool = pool or SenderPool.for_client(client)
+        self.last_stats: Optional[dict] = None
         self.loop = self.client.loop
         self.dc_id = dc_id or self.client.session.dc_id
-        self.auth_key = (None if dc_id and self.client.session.dc_id != dc_id
-                         else self.client.session.auth_key)
         self.senders: Optional[List[Union[DownloadSender, UploadSender]]] = None
+        self.tasks: List[asyncio.Task] = []
         self.upload_ticker = 0
 
-    async def _cleanup(self) -> None:
-        await asyncio.gather(*[sender.disconnect() for sender in self.senders])
+    async def _release(self, sender: Union[DownloadSender, UploadSender], healthy: bool = True) -> None:
+        # Connections go back to the shared pool instead of being torn down
+        try:
+            if isinstance(sender, UploadSender) and sender.previous:
+                await sender.previous
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            await self.pool.release(self.dc_id, sender.sender, healthy)
+
+    async def _cleanup(self, healthy: bool = True) -> None:
+        await asyncio.gather(*[self._release(sender, healthy) for sender in self.senders],
+                             return_exceptions=not healthy)
         self.senders = None
 
     @staticmethod
@@ -102,6 +369,9 @@ class ParallelTransferrer:
 
     async def _init_download(self, connections: int, file: TypeLocation, part_count: int,
                              part_size: int) -> None:
+        # Every sender in one step: holding some while waiting on the pool for the rest can deadlock
+        senders = await self.pool.acquire_many(self.dc_id, connections)
+        connections = len(senders)
         minimum, remainder = divmod(part_count, connections)
 
         def get_part_count() -> int:
@@ -111,14 +381,9 @@ class ParallelTransferrer:
                 return minimum + 1
             return minimum
 
-        self.senders = [
-            await self._create_download_sender(file, 0, part_size, connections * part_size,
-                                               get_part_count()),
-            *await asyncio.gather(
-                *[self._create_download_sender(file, i, part_size, connections * part_size,
-                                               get_part_count())
-                  for i in range(1, connections)]),
-        ]
+        self.senders = [DownloadSender(self.client, sender, file, i * part_size, part_size,
+                                       connections * part_size, get_part_count())
+                        for i, sender in enumerate(senders)]
 
     async def _create_download_sender(self, file: TypeLocation, index: int, part_size: int,
                                       stride: int,
@@ -126,42 +391,225 @@ class ParallelTransferrer:
         return DownloadSender(self.client, await self._create_sender(), file, index * part_size, part_size,
                               stride, part_count)
 
+    async def _init_upload(self, connections: int, file_id: int, part_count: int, big: bool) -> None:
+        # Every sender in one step: concurrent uploads each holding some senders
+        # while waiting on the pool for the rest would deadlock
+        senders = await self.pool.acquire_many(self.dc_id, connections)
+        self.senders = [UploadSender(self.client, sender, file_id, part_count, big, i, len(senders), loop=self.loop)
+                        for i, sender in enumerate(senders)]
+
     async def _create_sender(self) -> MTProtoSender:
-        dc = await self.client._get_dc(self.dc_id)
-        sender = MTProtoSender(self.auth_key, loggers=self.client._log)
-        await sender.connect(self.client._connection(dc.ip_address, dc.port, dc.id,
-                                                     loggers=self.client._log,
-                                                     proxy=self.client._proxy))
-        if not self.auth_key:
-            auth = await self.client(ExportAuthorizationRequest(self.dc_id))
-            self.client._init_request.query = ImportAuthorizationRequest(id=auth.id,
-                                                                         bytes=auth.bytes)
-            req = InvokeWithLayerRequest(LAYER, self.client._init_request)
-            await sender.send(req)
-            self.auth_key = sender.auth_key
-        return sender
+        return await self.pool.acquire(self.dc_id)
 
-    async def download(self, file: TypeLocation, file_size: int,
-                       part_size_kb: Optional[float] = None,
-                       connection_count: Optional[int] = None) -> AsyncGenerator[bytes, None]:
-        connection_count = connection_count or self._get_connection_count(file_size)
-        part_size = (part_size_kb or utils.get_appropriated_part_size(file_size)) * 1024
+    async def _run_download_sender(self, sender: DownloadSender, parts: PartScheduler,
+                                   window: ReassemblyWindow, controller: AdaptiveController) -> None:
+        healthy = False
+        received = 0
+        started = time.perf_counter()
+        try:
+            while not controller.should_retire():
+                part = parts.take()
+                if part is None:
+                    break
+                await window.reserve(part)
+                data = await self._fetch_part(sender, part, parts, controller)
+                controller.on_bytes(len(data))
+                received += len(data)
+                metrics.inc("telegram_download_bytes_total", len(data), dc=self.dc_id)
+                window.put(part, data)
+                del data  # not held through the next fetch once a sink has written it
+            healthy = True
+        except asyncio.CancelledError:
+            # The reader is done with us; the connection itself is fine
+            healthy = True
+            raise
+        finally:
+            if received:
+                metrics.observe("telegram_connection_bytes_per_second",
+                                received / max(time.perf_counter() - started, 1e-6), dc=self.dc_id)
+            self.senders.remove(sender)
+            await self._release(sender, healthy)
+
+    async def _fetch_part(self, sender: DownloadSender, part: int, parts: PartScheduler,
+                          controller: AdaptiveController) -> bytes:
+        # A FLOOD_WAIT is sat out holding the part: were it put back, this
+        # sender could retire with it while the others wait on it in reserve()
+        while True:
+            try:
+                with metrics.timer("telegram_part_seconds", dc=self.dc_id):
+                    return await sender.fetch(part * parts.part_size)
+            except FloodWaitError as e:
+                metrics.inc("telegram_flood_waits_total", dc=self.dc_id)
+                controller.on_flood_wait(e.seconds)
+                for hook in flood_wait_hooks:
+                    hook(e.seconds)
+                await asyncio.sleep(e.seconds)
+            except Exception:
+                parts.put_back(part)
+                controller.on_error()
+                raise
+
+    def _add_download_sender(self, file: TypeLocation, parts: PartScheduler, window: ReassemblyWindow,
+                             controller: AdaptiveController) -> None:
+        # Counted before its connection is acquired, so callers see it at once
+        controller.on_sender_added()
+        window.running += 1
+        task = self.loop.create_task(self._start_download_sender(file, parts, window, controller))
+        task.add_done_callback(window.sender_done)
+        self.tasks.append(task)
+
+    async def _start_download_sender(self, file: TypeLocation, parts: PartScheduler, window: ReassemblyWindow,
+                                     controller: AdaptiveController) -> None:
+        try:
+            sender = await self._create_download_sender(file, 0, parts.part_size, 0, 0)
+        except Exception:
+            controller.active -= 1
+            controller.on_error()
+            if window.retire():
+                return  # the senders still running take its parts
+            raise
+        self.senders.append(sender)
+        await self._run_download_sender(sender, parts, window, controller)
+
+    async def _control(self, file: TypeLocation, parts: PartScheduler, window: ReassemblyWindow,
+                       controller: AdaptiveController) -> None:
+        while True:
+            await asyncio.sleep(controller.interval)
+            target = controller.tick()
+            while controller.active < target and parts.pending:
+                self._add_download_sender(file, parts, window, controller)
+
+    async def _iter_window(self, file: TypeLocation, file_size: int, part_size_kb: Optional[float],
+                           connection_count: Optional[int], window_size: Optional[int], ordered: bool,
+                           skip: Container[int] = (), sink: Optional[DownloadSink] = None,
+                           on_part: Optional[Callable[[int, memoryview], None]] = None
+                           ) -> AsyncGenerator[Tuple[int, Union[bytes, int]], None]:
+        part_size_kb = part_size_kb or self.stats.part_size_kb(self.dc_id,
+                                                              utils.get_appropriated_part_size(file_size))
+        part_size = int(part_size_kb * 1024)
         part_count = math.ceil(file_size / part_size)
-        await self._init_download(connection_count, file, part_count, part_size)
-
-        part = 0
-        while part < part_count:
-            tasks = [self.loop.create_task(sender.next()) for sender in self.senders]
-            for task in tasks:
-                data = await task
-                if not data:
+        parts = PartScheduler([i for i in range(part_count) if i not in skip], part_size)
+
+        # Start where this DC did best last time; a fixed connection_count turns tuning off
+        size_cap = max(1, self._get_connection_count(file_size))
+        start = connection_count or min(self.stats.connections(self.dc_id, size_cap), size_cap)
+        controller = AdaptiveController(start, max_count=connection_count or size_cap,
+                                        fixed=connection_count is not None)
+
+        # Senders keep taking the lowest pending part; the window only holds
+        # back a sender that is more than window_size parts ahead of the reader.
+        window = ReassemblyWindow(window_size or controller.max_count * 2, ordered, sink, part_size, on_part)
+        self.senders, self.tasks = [], []
+        expected = len(parts.pending)
+        served = 0
+        control = self.loop.create_task(self._control(file, parts, window, controller))
+        try:
+            for _ in range(min(start, len(parts.pending))):
+                self._add_download_sender(file, parts, window, controller)
+            while True:
+                item = await window.get()
+                if not item:
+                    if served < expected:
+                        # Every sender is gone with parts left: never pass a short file off as whole
+                        raise IOError(f"Download stopped after {served} of {expected} parts")
                     break
-                yield data
-                part += 1
-        await self._cleanup()
+                if not item[1]:
+                    break
+                served += 1
+                yield item
+        finally:
+            control.cancel()
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(control, *self.tasks, return_exceptions=True)
+            self.last_stats = dict(controller.summary(), dc_id=self.dc_id, file_size=file_size,
+                                   part_size_kb=part_size_kb)
+            self.stats.record(self.dc_id, part_size_kb, self.last_stats)
+
+    async def download(self, file: TypeLocation, file_size: int,
+                       part_size_kb: Optional[float] = None,
+                       connection_count: Optional[int] = None,
+                       window_size: Optional[int] = None) -> AsyncGenerator[bytes, None]:
+        async for _, data in self._iter_window(file, file_size, part_size_kb, connection_count,
+                                               window_size, ordered=True):
+            yield data
+
+    async def init_upload(self, file_id: int, file_size: int,
+                          part_size_kb: Optional[float] = None,
+                          connection_count: Optional[int] = None) -> Tuple[int, int, bool]:
+        part_size = int((part_size_kb or utils.get_appropriated_part_size(file_size)) * 1024)
+        part_count = max(1, (file_size + part_size - 1) // part_size)
+        # Part i goes to sender i % connections, so every sender strides over the file
+        connection_count = connection_count or min(part_count, MAX_UPLOAD_CONNECTIONS)
+        is_large = file_size > BIG_FILE_SIZE
+        await self._init_upload(connection_count, file_id, part_count, is_large)
+        return part_size, part_count, is_large
 
+    async def upload(self, part: bytes) -> None:
+        # Waits only for this sender's previous part, so every connection keeps one part in flight
+        await self.senders[self.upload_ticker].next(part)
+        self.upload_ticker = (self.upload_ticker + 1) % len(self.senders)
 
-parallel_transfer_locks: DefaultDict[int, asyncio.Lock] = defaultdict(lambda: asyncio.Lock())
+    async def finish_upload(self, healthy: bool = True) -> None:
+        await self._cleanup(healthy)
+
+    async def upload_file(self, file: BinaryIO, file_size: int, name: str,
+                          progress_callback: callable = None,
+                          part_size_kb: Optional[float] = None,
+                          connection_count: Optional[int] = None) -> TypeInputFile:
+        file_id = helpers.generate_random_long()
+        part_size, part_count, is_large = await self.init_upload(file_id, file_size, part_size_kb,
+                                                                  connection_count)
+        hash_md5 = hashlib.md5()
+        sent = 0
+        try:
+            for data in stream_file(file, part_size):
+                if not is_large:
+                    hash_md5.update(data)
+                await self.upload(data)
+                sent += len(data)
+                if progress_callback:
+                    r = progress_callback(sent, file_size)
+                    if inspect.isawaitable(r):
+                        await r
+        except BaseException:
+            await self.finish_upload(healthy=False)
+            raise
+        await self.finish_upload()
+        if is_large:
+            return InputFileBig(file_id, part_count, name)
+        return InputFile(file_id, part_count, name, hash_md5.hexdigest())
+
+    async def download_parts(self, file: TypeLocation, file_size: int,
+                             part_size_kb: Optional[float] = None,
+                             connection_count: Optional[int] = None,
+                             skip: Container[int] = ()) -> AsyncGenerator[Tuple[int, bytes], None]:
+        """Yields (part_index, data) as parts arrive, leaving out the indices in skip."""
+        async for item in self._iter_window(file, file_size, part_size_kb, connection_count,
+                                            None, ordered=False, skip=skip):
+            yield item
+
+    async def download_into(self, file: TypeLocation, file_size: int, sink: DownloadSink,
+                            progress_callback: callable = None,
+                            part_size_kb: Optional[float] = None,
+                            connection_count: Optional[int] = None,
+                            skip: Container[int] = (),
+                            on_part: Optional[Callable[[int, memoryview], None]] = None) -> None:
+        """
+        Each sender writes its part to sink as a memoryview the moment it
+        arrives, so parts are never queued, reordered or copied in Python
+        and are freed right after the write. on_part sees the same view;
+        progress comes from sink.received rather than a tell() per part.
+        """
+        async for _ in self._iter_window(file, file_size, part_size_kb, connection_count, None,
+                                         ordered=False, skip=skip, sink=sink, on_part=on_part):
+            if progress_callback:
+                r = progress_callback(sink.received, file_size)
+                if inspect.isawaitable(r):
+                    await r
+
+
+JOURNAL_SUFFIX = ".journal"
 
 
 def stream_file(file_to_stream: BinaryIO, chunk_size=1024):
@@ -172,19 +620,113 @@ def stream_file(file_to_stream: BinaryIO, chunk_size=1024):
         yield data_read
 
 
+async def iter_download(client: TelegramClient,
+                        location: TypeLocation,
+                        part_size_kb: Optional[float] = None,
+                        connection_count: Optional[int] = None
+                        ) -> AsyncGenerator[bytes, None]:
+    size = location.size
+    dc_id, location = utils.get_input_location(location)
+    downloader = ParallelTransferrer(client, dc_id)
+    async for x in downloader.download(location, size, part_size_kb, connection_count):
+        yield x
+
+
+async def download_to_path(client: TelegramClient,
+                           location: TypeLocation,
+                           path: str,
+                           progress_callback: callable = None,
+                           part_size_kb: Optional[float] = None,
+                           connection_count: Optional[int] = None,
+                           sink: str = DOWNLOAD_SINK
+                           ) -> str:
+    """
+    Downloads into a preallocated file, written through a PwriteSink or,
+    with sink="mmap", an MmapSink, keeping a part journal at path +
+    ".journal" so an interrupted download only fetches the parts it is
+    missing when called again.
+    """
+    size = location.size
+    dc_id, location = utils.get_input_location(location)
+    # Resume with the part size the journal was written with
+    part_size_kb = (part_size_kb or PartJournal.saved_part_size(path + JOURNAL_SUFFIX, size) / 1024
+                    or dc_stats.part_size_kb(dc_id, utils.get_appropriated_part_size(size)))
+    journal = PartJournal(path + JOURNAL_SUFFIX, size, int(part_size_kb * 1024))
+
+    with open(path, "r+b" if os.path.exists(path) else "w+b") as out:
+        fd = out.fileno()
+        if os.path.exists(journal.path):
+            journal.load()
+            journal.verify(fd)
+        else:
+            out.truncate(0)
+        out.truncate(size)
+
+        if not journal.complete:
+            target = MmapSink(fd, size) if sink == "mmap" else PwriteSink(fd, size)
+            target.received = sum(journal.part_length(i) for i in journal.done)
+            journal.start()
+            try:
+                downloader = ParallelTransferrer(client, dc_id)
+                await downloader.download_into(location, size, target, progress_callback, part_size_kb,
+                                               connection_count, skip=journal.done, on_part=journal.record)
+            finally:
+                target.close()
+                journal.close()
+        if not journal.complete:
+            raise IOError(f"Download of {path} stopped at {len(journal.done)}/{journal.part_count} parts")
+    journal.close(remove=True)
+    return path
+
+
+async def upload_file(client: TelegramClient,
+                      file: BinaryIO,
+                      name: str,
+                      progress_callback: callable = None,
+                      part_size_kb: Optional[float] = None,
+                      connection_count: Optional[int] = None
+                      ) -> TypeInputFile:
+    """
+    Uploads over several pooled connections at once and returns the
+    InputFile to pass to client.send_file(). file must be seekable.
+    """
+    size = file.seek(0, os.SEEK_END)
+    file.seek(0)
+    uploader = ParallelTransferrer(client)
+    return await uploader.upload_file(file, size, name, progress_callback, part_size_kb, connection_count)
+
+
 async def download_file(client: TelegramClient,
                         location: TypeLocation,
                         out: BinaryIO,
                         progress_callback: callable = None
                         ) -> BinaryIO:
+    """
+    Writes to out's file descriptor at its current position when it has
+    one, leaving out positioned after the download; streams without one
+    (BytesIO, pipes, append mode) are written in order.
+    """
     size = location.size
     dc_id, location = utils.get_input_location(location)
     downloader = ParallelTransferrer(client, dc_id)
-    downloaded = downloader.download(location, size)
-    async for x in downloaded:
+    try:
+        fd = None if "a" in getattr(out, "mode", "") else out.fileno()
+        base = out.tell()
+    except (AttributeError, OSError):  # io.UnsupportedOperation is an OSError too
+        fd = None
+
+    if fd is not None:
+        out.flush()
+        await downloader.download_into(location, size, PwriteSink(fd, size, base), progress_callback)
+        out.seek(base + size)
+        return out
+
+    received = 0
+    async for x in downloader.download(location, size):
         out.write(x)
+        received += len(x)
         if progress_callback:
-            r = progress_callback(out.tell(), size)
+            r = progress_callback(received, size)
             if inspect.isawaitable(r):
                 await r
-    return out
\ No newline at end of file
+    return out
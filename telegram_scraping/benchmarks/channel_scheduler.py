@@ -0,0 +1,76 @@
+# benchmarks/channel_scheduler.py
+# One busy channel with a long backlog and a big download budget shares a
+# few download slots with quiet channels that have a budget of one. Compares
+# when the quiet channels finish with a plain FIFO semaphore and with the
+# round-robin FairScheduler, and shows a FLOOD_WAIT pausing all channels.
+#
+#   cd telegram_scraping && python -m benchmarks.channel_scheduler [quiet_channels] [backlog]
+
+import asyncio
+import sys
+import time
+
+from channel_scheduler import FairScheduler, FloodGate
+
+SLOTS = 4
+BUSY_BUDGET = 8          # download workers per channel
+QUIET_BUDGET = 1
+DOWNLOAD_SECONDS = 0.02
+QUIET_BACKLOG = 10
+
+
+async def run_channel(channel, backlog, budget, slot, done_at, start):
+    queue = asyncio.Queue()
+    for i in range(backlog):
+        queue.put_nowait(i)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            async with slot(channel):
+                await asyncio.sleep(DOWNLOAD_SECONDS)
+        done_at[channel] = time.perf_counter() - start
+
+    await asyncio.gather(*[worker() for _ in range(budget)])
+
+
+async def scenario(quiet, backlog, fair):
+    start = time.perf_counter()
+    done_at = {}
+    if fair:
+        slot = FairScheduler(SLOTS, FloodGate()).slot
+    else:
+        semaphore = asyncio.Semaphore(SLOTS)
+        slot = lambda channel: semaphore
+    channels = [("busy", backlog, BUSY_BUDGET)] + [(f"quiet{i}", QUIET_BACKLOG, QUIET_BUDGET) for i in range(quiet)]
+    tasks = [asyncio.ensure_future(run_channel(channel, n, budget, slot, done_at, start))
+             for channel, n, budget in channels]
+    await asyncio.gather(*tasks)
+    quiet_done = [t for channel, t in done_at.items() if channel != "busy"]
+    return max(quiet_done), done_at["busy"]
+
+
+async def flood(channels=5):
+    gate = FloodGate()
+    scheduler = FairScheduler(SLOTS, gate)
+    start = time.perf_counter()
+    gate.trip(0.5)
+
+    async def one(channel):
+        async with scheduler.slot(channel):
+            return time.perf_counter() - start
+
+    started = await asyncio.gather(*[one(i) for i in range(channels)])
+    return min(started)
+
+
+async def main(quiet: int = 8, backlog: int = 200):
+    for fair in (False, True):
+        quiet_done, busy_done = await scenario(quiet, backlog, fair)
+        label = "round-robin" if fair else "FIFO"
+        print(f"  {label:>11}: quiet channels done after {quiet_done:5.2f}s, busy channel after {busy_done:5.2f}s")
+    print(f"  FLOOD_WAIT of 0.5s: first download on any channel started after {await flood():.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*[int(a) for a in sys.argv[1:3]]))
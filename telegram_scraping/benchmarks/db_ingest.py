@@ -0,0 +1,81 @@
+# benchmarks/db_ingest.py
+# Inserts synthetic transcripts into a SQLite stand-in for the Question table:
+# once row-by-row with a commit each (the old db_import loop), then through
+# TranscriptWriter, then a second TranscriptWriter pass that should be a no-op.
+#
+#   cd telegram_scraping && python -m benchmarks.db_ingest [rows]
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+import db_import
+from db_import import TranscriptWriter
+
+OLD_LOOP_MAX_ROWS = 10000  # one commit per row is too slow to run at full size
+
+WORDS = "the a prayer fasting question answer brother sister quran hadith marriage work salah".split()
+
+
+def synthetic(n, seed=0):
+    rng = random.Random(seed)
+    for i in range(n):
+        title = " ".join(rng.choices(WORDS, k=6)) + f" {i}"
+        text = " ".join(rng.choices(WORDS, k=rng.randint(80, 400)))
+        yield f"transcripts/2024-{i % 28 + 1:02d}-01_-_q{i}-{i}.json", f"etag{i}", title, "2024-01-01", text
+
+
+def connect(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS Question ("
+                 "ID INTEGER PRIMARY KEY AUTOINCREMENT, Title TEXT, Date TEXT, Transcription TEXT)")
+    conn.commit()
+    return conn
+
+
+def old_loop(conn, rows):
+    cursor = conn.cursor()
+    for _, _, title, date, text in rows:
+        cursor.execute("INSERT INTO Question (Title, Date, Transcription) VALUES (?, ?, ?)", (title, date, text))
+        conn.commit()
+
+
+def writer_pass(conn, rows):
+    writer = TranscriptWriter(conn, dialect="sqlite")
+    for key, etag, title, date, text in rows:
+        if not writer.is_imported(key, etag):
+            writer.add(key, etag, title, date, text)
+    writer.flush()
+    return writer
+
+
+def main(n: int = 100000):
+    db_import.log = lambda *a, **k: None  # keep per-batch logging out of the timings
+    rows = list(synthetic(n))
+    with tempfile.TemporaryDirectory() as folder:
+        old_n = min(n, OLD_LOOP_MAX_ROWS)
+        conn = connect(os.path.join(folder, "old.db"))
+        start = time.perf_counter()
+        old_loop(conn, rows[:old_n])
+        old_rate = old_n / (time.perf_counter() - start)
+        print(f"  row-by-row: {old_rate:10.0f} rows/s  ({old_n} rows)")
+
+        conn = connect(os.path.join(folder, "new.db"))
+        start = time.perf_counter()
+        writer = writer_pass(conn, rows)
+        elapsed = time.perf_counter() - start
+        print(f"     batched: {n / elapsed:10.0f} rows/s  ({writer.inserted} inserted in {elapsed:.2f}s)")
+
+        start = time.perf_counter()
+        writer = writer_pass(conn, rows)
+        elapsed = time.perf_counter() - start
+        count = conn.execute("SELECT COUNT(*) FROM Question").fetchone()[0]
+        print(f"      re-run: {elapsed:10.2f}s  ({writer.inserted} inserted, {writer.skipped} skipped, "
+              f"{count} rows in Question)")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]])
@@ -0,0 +1,105 @@
+# benchmarks/download_sink.py
+# Profiles a large synthetic download written three ways: the old
+# download_file loop (ordered parts, out.write + out.tell per part), a
+# PwriteSink and an MmapSink. Each runs in its own process so peak RSS and
+# CPU time are its own; a second run under tracemalloc reports the peak of
+# Python allocations. The written file is checked against the payload.
+#
+#   cd telegram_scraping && python -m benchmarks.download_sink [size_mb] [connections]
+
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from FastTelethon import MmapSink, PwriteSink
+from benchmarks.fakes import FakeTelegramClient, FakeTransferrer, SyntheticPayload, fake_location
+
+PART_SIZE_KB = 512
+VARIANTS = ("write+tell", "pwrite", "mmap")
+
+
+async def legacy(transferrer, location, size, out, connections):
+    # download_file as it was before the sinks
+    async for x in transferrer.download(location, size, PART_SIZE_KB, connections):
+        out.write(x)
+        out.tell()
+
+
+async def into(transferrer, location, size, sink, connections):
+    try:
+        await transferrer.download_into(location, size, sink, part_size_kb=PART_SIZE_KB,
+                                        connection_count=connections)
+    finally:
+        sink.close()
+
+
+def verify(path, payload):
+    with open(path, "rb") as f:
+        for offset in range(0, payload.size, payload.period):
+            if f.read(payload.period) != payload[offset:offset + payload.period]:
+                return False
+        return not f.read(1)
+
+
+async def run(variant, payload, size, connections, path):
+    client = FakeTelegramClient(payload, latency=0.02, jitter=0.03, bandwidth=8 * 1024 * 1024)
+    transferrer = FakeTransferrer(client)
+    location = fake_location(size)
+    with open(path, "w+b") as out:
+        if variant == "write+tell":
+            await legacy(transferrer, location, size, out, connections)
+        elif variant == "pwrite":
+            await into(transferrer, location, size, PwriteSink(out.fileno(), size), connections)
+        else:
+            await into(transferrer, location, size, MmapSink(out.fileno(), size), connections)
+
+
+def child(variant, size, connections, traced):
+    path = os.path.join(tempfile.gettempdir(), f"download_sink_{os.getpid()}.bin")
+    payload = SyntheticPayload(size)
+    if traced:
+        tracemalloc.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        asyncio.run(run(variant, payload, size, connections, path))
+        result = {"wall": time.perf_counter() - wall, "cpu": time.process_time() - cpu,
+                  "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+        if traced:
+            result["traced_peak_mb"] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            tracemalloc.stop()
+        else:
+            result["ok"] = verify(path, payload)
+    finally:
+        os.remove(path)
+    print(json.dumps(result))
+
+
+def spawn(variant, size, connections, traced):
+    out = subprocess.run([sys.executable, "-m", "benchmarks.download_sink", "--child", variant,
+                          str(size), str(connections), "1" if traced else "0"],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(size_mb: int = 1024, connections: int = 20):
+    size = size_mb * 1024 * 1024
+    print(f"  {size_mb} MB, {PART_SIZE_KB} KB parts, {connections} connections")
+    for variant in VARIANTS:
+        plain = spawn(variant, size, connections, traced=False)
+        traced = spawn(variant, size, connections, traced=True)
+        print(f"  {variant:>10}: {size_mb / plain['wall']:7.1f} MB/s, cpu {plain['cpu']:5.2f}s, "
+              f"peak rss {plain['rss_mb']:7.1f} MB, peak python allocations {traced['traced_peak_mb']:6.1f} MB, "
+              f"{'ok' if plain['ok'] else 'CORRUPT'}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), sys.argv[5] == "1")
+    else:
+        main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,101 @@
+# benchmarks/download_window.py
+# Compares the sliding-window ParallelTransferrer.download against the old
+# round-based loop on fake connections with latency jitter and a few slow links.
+# A last, bandwidth-limited transfer starts from a remembered count of
+# LONG_START connections and lasts several controller ticks, so senders get
+# added and retired while parts are in flight.
+#
+#   cd telegram_scraping && python -m benchmarks.download_window [size_mb] [connections] [long_size_mb]
+
+import asyncio
+import hashlib
+import math
+import sys
+import time
+
+from benchmarks.fakes import FakeTelegramClient, FakeTransferrer, SyntheticPayload, fake_location
+from transfer_tuning import TICK_SECONDS, DcStats
+
+PART_SIZE_KB = 512
+LONG_START = 2
+LONG_BANDWIDTH = 4 * 1024 * 1024  # bytes/sec per connection
+
+
+async def round_based(transferrer, location, size, connections):
+    # The loop ParallelTransferrer.download used before the reassembly window
+    part_size = PART_SIZE_KB * 1024
+    part_count = math.ceil(size / part_size)
+    await transferrer._init_download(connections, location, part_count, part_size)
+    part = 0
+    while part < part_count:
+        tasks = [transferrer.loop.create_task(sender.next()) for sender in transferrer.senders]
+        for task in tasks:
+            data = await task
+            if not data:
+                break
+            yield data
+            part += 1
+    await transferrer._cleanup()
+
+
+async def measure(name, make_stream, expected):
+    digest = hashlib.sha1()
+    total = 0
+    start = time.perf_counter()
+    async for chunk in make_stream():
+        digest.update(chunk)
+        total += len(chunk)
+    elapsed = time.perf_counter() - start
+    ok = "ok" if digest.hexdigest() == expected else "MISMATCH"
+    print(f"{name:>14}: {total / elapsed / 1024 / 1024:8.1f} MB/s  ({elapsed:.2f}s, {ok})")
+    return elapsed
+
+
+def synthetic_sha1(payload, part_size):
+    digest = hashlib.sha1()
+    for offset in range(0, len(payload), part_size):
+        digest.update(payload[offset:offset + part_size])
+    return digest.hexdigest()
+
+
+async def main(size_mb: int = 64, connections: int = 20, long_size_mb: int = 160):
+    payload = bytes(range(256)) * (size_mb * 4096)
+    expected = hashlib.sha1(payload).hexdigest()
+    size = len(payload)
+    location = fake_location(size)
+
+    def client():
+        # Same seed for both runs so they see identical connection latencies
+        return FakeTelegramClient(payload, latency=0.02, jitter=0.08, slow_fraction=0.15, seed=7)
+
+    old = await measure("round-based", lambda: round_based(FakeTransferrer(client()), location, size, connections),
+                        expected)
+    new = await measure("sliding window", lambda: FakeTransferrer(client()).download(location, size, PART_SIZE_KB,
+                                                                                        connections), expected)
+    print(f"{'speedup':>14}: {old / new:.2f}x")
+
+    # Let the controller pick the connection count
+    transferrer = FakeTransferrer(client())
+    await measure("adaptive", lambda: transferrer.download(location, size, PART_SIZE_KB), expected)
+    stats = transferrer.last_stats
+    print(f"{'connections':>14}: started {stats['history'][0][1] if stats['history'] else '-'}, "
+          f"peak {stats['connections_peak']}, best {stats['connections_best']}")
+
+    size = long_size_mb * 1024 * 1024
+    payload = SyntheticPayload(size)
+    stats = DcStats(path=None, log_path=None)
+    stats.data = {"2": {"connections": LONG_START}}
+    transferrer = FakeTransferrer(FakeTelegramClient(payload, latency=0.02, jitter=0.02, bandwidth=LONG_BANDWIDTH,
+                                                     seed=7), stats=stats)
+    # A controller that stops the loop shows up here as a timeout, not a hung run
+    elapsed = await asyncio.wait_for(
+        measure("adaptive, long", lambda: transferrer.download(fake_location(size), size, PART_SIZE_KB),
+                synthetic_sha1(payload, PART_SIZE_KB * 1024)),
+        timeout=size / (LONG_BANDWIDTH * LONG_START) + 30)
+    stats = transferrer.last_stats
+    print(f"{'connections':>14}: started {LONG_START}, peak {stats['connections_peak']}, "
+          f"final {stats['connections_final']} over {elapsed / TICK_SECONDS:.0f} ticks")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*[int(a) for a in sys.argv[1:4]]))
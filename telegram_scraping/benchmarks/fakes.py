@@ -0,0 +1,371 @@
+# benchmarks/fakes.py
+# Local stand-ins for the services the scraper talks to, so transfers can be
+# measured without Telegram.
+
+import asyncio
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+from telethon import utils
+from telethon.tl.types import Document, PeerChannel
+
+from FastTelethon import ParallelTransferrer
+from mp3frames import iter_frames
+from sender_pool import SenderPool
+from transfer_tuning import DcStats
+
+
+class FakeMTProtoSender:
+    """One fake connection with its own base latency, per-request jitter and bandwidth."""
+
+    def __init__(self, latency: float, jitter: float, bandwidth: Optional[float], rng: random.Random) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth  # bytes/sec, None = unlimited
+        self.rng = rng
+        self.auth_key = object()
+        self.requests = 0
+        self.connected = True
+
+    def delay(self, nbytes: int) -> float:
+        delay = self.latency + self.rng.uniform(0, self.jitter)
+        if self.bandwidth:
+            delay += nbytes / self.bandwidth
+        return delay
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    async def disconnect(self) -> None:
+        self.connected = False
+
+
+class SyntheticPayload:
+    """
+    A file of any size that is never held in memory: byte i is block[i % period].
+    Slicing returns fresh bytes, like a GetFileRequest result does.
+    """
+
+    def __init__(self, size: int, period: int = 1024 * 1024, seed: int = 0) -> None:
+        self.size = size
+        self.period = period
+        self.block = random.Random(seed).randbytes(2 * period)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, part: slice) -> bytes:
+        start, stop = part.start, min(part.stop, self.size)
+        if stop - start > self.period:
+            raise ValueError("slices are limited to one period")
+        offset = start % self.period
+        return self.block[offset:offset + max(0, stop - start)]
+
+
+class FakeTelegramClient:
+    """
+    Enough of TelegramClient for ParallelTransferrer: serves GetFileRequest from an
+    in-memory payload and accepts upload parts, sleeping for each sender's latency.
+    """
+
+    def __init__(self, payload: bytes = b"", latency: float = 0.02, jitter: float = 0.05,
+                 bandwidth: Optional[float] = None, slow_fraction: float = 0.1,
+                 slow_factor: float = 5.0, seed: int = 0) -> None:
+        self.loop = asyncio.get_event_loop()
+        self.session = SimpleNamespace(dc_id=2, auth_key=object())
+        self.payload = payload
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.slow_fraction = slow_fraction
+        self.slow_factor = slow_factor
+        self.rng = random.Random(seed)
+        self.uploaded = {}
+        self.files: Dict[int, bytes] = {}  # document id -> payload, for clients serving several files
+
+    def new_sender(self) -> FakeMTProtoSender:
+        latency = self.latency
+        if self.rng.random() < self.slow_fraction:
+            latency *= self.slow_factor
+        return FakeMTProtoSender(latency, self.jitter, self.bandwidth, random.Random(self.rng.random()))
+
+    async def _call(self, sender: FakeMTProtoSender, request):
+        sender.requests += 1
+        if hasattr(request, "offset"):
+            payload = self.files.get(getattr(request.location, "id", None), self.payload)
+            # The part only exists in memory once its response has arrived
+            length = max(0, min(request.limit, len(payload) - request.offset))
+            await asyncio.sleep(sender.delay(length))
+            return SimpleNamespace(bytes=payload[request.offset:request.offset + request.limit])
+        await asyncio.sleep(sender.delay(len(request.bytes)))
+        self.uploaded[request.file_part] = bytes(request.bytes)
+        return True
+
+
+class FakeSenderPool(SenderPool):
+    def __init__(self, client: FakeTelegramClient, connect_delay: float = 0.0, **kwargs) -> None:
+        super().__init__(client, **kwargs)
+        self.connect_delay = connect_delay  # stands in for the TCP + auth handshake
+
+    async def _connect(self, dc_id: int) -> FakeMTProtoSender:
+        await asyncio.sleep(self.connect_delay)
+        return self.client.new_sender()
+
+
+class FakeTransferrer(ParallelTransferrer):
+    def __init__(self, client: FakeTelegramClient, dc_id: Optional[int] = None,
+                 stats: Optional[DcStats] = None, pool: Optional[SenderPool] = None) -> None:
+        super().__init__(client, dc_id, stats or DcStats(path=None, log_path=None),
+                         pool or FakeSenderPool(client))
+
+
+def fake_location(size: int):
+    return SimpleNamespace(size=size)
+
+
+# MPEG-1 Layer III at 32 kHz: frames of 36 ms, 144 bytes per 32 kbps
+MP3_FRAME_MS = 36.0
+_MP3_BITRATE_INDEX = {32: 1, 64: 5, 128: 9, 256: 13}
+
+
+def _mp3_frame(kbps: int) -> bytes:
+    return bytes([0xFF, 0xFB, _MP3_BITRATE_INDEX[kbps] << 4 | 0x08, 0xC4]) + bytes(144 * kbps // 32 - 4)
+
+
+def fake_mp3(seconds: float, kbps: int = 32) -> bytes:
+    """Silent frames mp3frames can scan and cut; no decoder needed."""
+    return _mp3_frame(kbps) * int(round(seconds * 1000 / MP3_FRAME_MS))
+
+
+class Mp3Payload:
+    """fake_mp3(seconds, kbps) that is never held in memory; slicing builds just the bytes asked for."""
+
+    def __init__(self, seconds: float, kbps: int = 32) -> None:
+        self.frame = _mp3_frame(kbps)
+        self.size = len(self.frame) * int(round(seconds * 1000 / MP3_FRAME_MS))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, part: slice) -> bytes:
+        start, stop = part.start, min(part.stop, self.size)
+        if stop <= start:
+            return b""
+        n = len(self.frame)
+        first = start // n
+        return (self.frame * (-(-stop // n) - first))[start - first * n:stop - first * n]
+
+
+class FakeChannelClient(FakeTelegramClient):
+    """
+    FakeTelegramClient plus the TelegramClient calls scraping.py makes for
+    channels: get_entity, iter_messages, get_messages, event handlers and
+    send_file. Posts are added with post_audio(); each history page of 100
+    messages costs one round trip of `latency`.
+    """
+
+    PAGE_SIZE = 100
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.channels: Dict[str, PeerChannel] = {}
+        self.messages: Dict[int, List[SimpleNamespace]] = {}  # marked channel id -> posts in id order
+        self.handlers = []
+        self.sent = []
+
+    def channel(self, url: str) -> PeerChannel:
+        if url not in self.channels:
+            peer = self.channels[url] = PeerChannel(1000 + len(self.channels))
+            self.messages[utils.get_peer_id(peer)] = []
+        return self.channels[url]
+
+    def post_audio(self, url: str, text: str, payload, date: Optional[datetime] = None) -> SimpleNamespace:
+        """Adds an MP3 post to the channel at url; the document's bytes are served from payload."""
+        chat_id = utils.get_peer_id(self.channel(url))
+        posts = self.messages[chat_id]
+        document = Document(id=chat_id * -1000 + len(posts) + 1, access_hash=0, file_reference=b"",
+                            date=date or datetime.now(timezone.utc), mime_type="audio/mpeg", size=len(payload),
+                            dc_id=self.session.dc_id, attributes=[])
+        self.files[document.id] = payload
+        message = SimpleNamespace(id=len(posts) + 1, chat_id=chat_id, message=text, document=document,
+                                  audio=SimpleNamespace(mime_type="audio/mpeg"),
+                                  date=date or datetime.now(timezone.utc))
+        posts.append(message)
+        return message
+
+    async def get_entity(self, url: str) -> PeerChannel:
+        await asyncio.sleep(self.latency)
+        return self.channel(url)
+
+    async def iter_messages(self, entity, min_id: int = 0, reverse: bool = False, filter=None, wait_time=None):
+        posts = [m for m in self.messages[utils.get_peer_id(entity)] if m.id > min_id]
+        for start in range(0, len(posts), self.PAGE_SIZE):
+            await asyncio.sleep(self.latency + (wait_time or 0))
+            for message in (posts if reverse else posts[::-1])[start:start + self.PAGE_SIZE]:
+                yield message
+
+    async def get_messages(self, entity, ids: List[int]) -> List[Optional[SimpleNamespace]]:
+        await asyncio.sleep(self.latency)
+        by_id = {m.id: m for m in self.messages[utils.get_peer_id(entity)]}
+        return [by_id.get(i) for i in ids]
+
+    def add_event_handler(self, handler, event=None) -> None:
+        self.handlers.append((handler, event))
+
+    async def send_file(self, entity, file, **kwargs) -> None:
+        await asyncio.sleep(self.latency)
+        self.sent.append((entity, file, kwargs))
+
+
+class ConflictException(Exception):
+    """Raised, like boto3's, when a job name is already taken."""
+
+
+class FakeTranscribeClient:
+    """
+    In-memory Transcribe: jobs finish job_seconds after they start (a share of
+    them fail), and completed jobs write an AWS-shaped transcript JSON to S3
+    when an s3 client is given. Call counts are kept per API.
+
+    Optionally, like the real service, at most max_concurrent jobs run at once
+    (the rest wait QUEUED), and a job also takes realtime_factor seconds per
+    second of audio, as reported by media_seconds(uri). Without media_seconds
+    the length is read from the MP3 in S3, so the generated transcript covers
+    all of it at WORDS_PER_SECOND (10 s when there is no media). transcript_for(job_name, uri) replaces the
+    generated transcript.
+    """
+
+    WORDS_PER_SECOND = 2.0
+
+    def __init__(self, s3=None, job_seconds: float = 1.0, failure_rate: float = 0.0, seed: int = 0,
+                 max_concurrent: Optional[int] = None, realtime_factor: float = 0.0,
+                 media_seconds: Optional[Callable[[str], float]] = None,
+                 transcript_for: Optional[Callable[[str, str], dict]] = None) -> None:
+        self.s3 = s3
+        self.job_seconds = job_seconds
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.max_concurrent = max_concurrent
+        self.realtime_factor = realtime_factor
+        self.media_seconds = media_seconds
+        self.transcript_for = transcript_for
+        self.jobs = {}
+        self.calls = {}
+        self.completed_at = {}
+        self.exceptions = SimpleNamespace(ConflictException=ConflictException)
+        self.lock = threading.Lock()  # scraping.py calls in from worker threads
+
+    def _count(self, api: str) -> None:
+        self.calls[api] = self.calls.get(api, 0) + 1
+
+    def _media_length(self, uri: str) -> float:
+        if self.media_seconds:
+            return self.media_seconds(uri)
+        if not self.s3:
+            return 0.0
+        bucket, key = uri[len("s3://"):].split("/", 1)
+        try:
+            body = self.s3.get_object(Bucket=bucket, Key=key)["Body"]
+        except self.s3.exceptions.NoSuchKey:
+            return 0.0  # benchmarks that only time the tracker start jobs without media
+        try:
+            return sum(frame.duration_ms for frame in iter_frames(body)) / 1000
+        finally:
+            body.close()
+
+    @staticmethod
+    def make_transcript(job_name: str, media_uri: str, seconds: float = 10.0, words: int = 20) -> dict:
+        vocab = media_uri.rsplit("/", 1)[-1].replace(".mp3", "").replace("_", " ").split() or ["word"]
+        items = []
+        step = seconds / words
+        for i in range(words):
+            items.append({"type": "pronunciation", "start_time": f"{i * step:.3f}",
+                          "end_time": f"{(i + 0.8) * step:.3f}",
+                          "alternatives": [{"confidence": "0.99", "content": vocab[i % len(vocab)]}]})
+        text = " ".join(item["alternatives"][0]["content"] for item in items)
+        return {"jobName": job_name, "status": "COMPLETED",
+                "results": {"transcripts": [{"transcript": text}], "items": items}}
+
+    def start_transcription_job(self, TranscriptionJobName, Media, OutputBucketName=None, OutputKey=None, **kwargs):
+        with self.lock:
+            return self._start(TranscriptionJobName, Media, OutputBucketName, OutputKey)
+
+    def _start(self, TranscriptionJobName, Media, OutputBucketName, OutputKey):
+        self._count("start_transcription_job")
+        if TranscriptionJobName in self.jobs:
+            raise ConflictException(f"The requested job name already exists: {TranscriptionJobName}")
+        now = datetime.now(timezone.utc)
+        media_seconds = self._media_length(Media["MediaFileUri"])
+        self.jobs[TranscriptionJobName] = {
+            "TranscriptionJobName": TranscriptionJobName, "CreationTime": now,
+            "TranscriptionJobStatus": "QUEUED", "Media": Media,
+            "OutputBucketName": OutputBucketName, "OutputKey": OutputKey,
+            "run_seconds": self.job_seconds * self.rng.uniform(0.5, 1.5) + self.realtime_factor * media_seconds,
+            "media_seconds": media_seconds,
+            "done_at": None,
+        }
+        self._refresh(time.monotonic())
+        return {"TranscriptionJob": self._public(self.jobs[TranscriptionJobName])}
+
+    def _refresh(self, started_at: Optional[float] = None) -> None:
+        # Replays completions in time order, so a queued job starts the moment a slot frees up
+        now = time.monotonic()
+        while True:
+            running = [job for job in self.jobs.values() if job["TranscriptionJobStatus"] == "IN_PROGRESS"]
+            queued = [job for job in self.jobs.values() if job["TranscriptionJobStatus"] == "QUEUED"]
+            if queued and (self.max_concurrent is None or len(running) < self.max_concurrent):
+                job = queued[0]
+                job["TranscriptionJobStatus"] = "IN_PROGRESS"
+                job["done_at"] = (started_at or now) + job["run_seconds"]
+                continue
+            finished = [job for job in running if job["done_at"] <= now]
+            if not finished:
+                return
+            job = min(finished, key=lambda j: j["done_at"])
+            self._finish(job)
+            started_at = job["done_at"]
+
+    def _finish(self, job: dict) -> None:
+        name = job["TranscriptionJobName"]
+        if self.rng.random() < self.failure_rate:
+            job["TranscriptionJobStatus"] = "FAILED"
+            return
+        job["TranscriptionJobStatus"] = "COMPLETED"
+        self.completed_at[name] = job["done_at"]
+        if self.s3 and job["OutputBucketName"]:
+            uri = job["Media"]["MediaFileUri"]
+            if self.transcript_for:
+                transcript = self.transcript_for(name, uri)
+            else:
+                seconds = job["media_seconds"] or 10.0
+                transcript = self.make_transcript(name, uri, seconds, max(1, round(seconds * self.WORDS_PER_SECOND)))
+            self.s3.put_object(Bucket=job["OutputBucketName"], Key=job["OutputKey"],
+                               Body=json.dumps(transcript).encode())
+
+    @staticmethod
+    def _public(job: dict) -> dict:
+        return {k: v for k, v in job.items() if k not in ("done_at", "run_seconds", "media_seconds")}
+
+    def list_transcription_jobs(self, Status=None, MaxResults=100, NextToken=None, **kwargs):
+        with self.lock:
+            self._count("list_transcription_jobs")
+            self._refresh()
+            jobs = sorted((j for j in self.jobs.values() if not Status or j["TranscriptionJobStatus"] == Status),
+                          key=lambda j: j["CreationTime"], reverse=True)
+            start = int(NextToken or 0)
+            page = jobs[start:start + MaxResults]
+            result = {"TranscriptionJobSummaries": [self._public(j) for j in page]}
+        if start + MaxResults < len(jobs):
+            result["NextToken"] = str(start + MaxResults)
+        return result
+
+    def get_transcription_job(self, TranscriptionJobName):
+        with self.lock:
+            self._count("get_transcription_job")
+            self._refresh()
+            return {"TranscriptionJob": self._public(self.jobs[TranscriptionJobName])}
@@ -0,0 +1,87 @@
+# benchmarks/message_scan.py
+# Backfill scan of a large channel where only a small share of posts are
+# audio: walking the full history versus asking for audio posts only, as
+# scraping.py does with SCAN_FILTER=all and SCAN_FILTER=music. Every history
+# request costs a fake round trip; each returned message gets the Q&A check.
+#
+#   cd telegram_scraping && python -m benchmarks.message_scan [messages] [audio_percent]
+
+import asyncio
+import random
+import re
+import sys
+import time
+from types import SimpleNamespace
+
+PAGE_SIZE = 100          # messages per GetHistory/Search request
+ROUND_TRIP = 0.004
+QNA_TEXT = "Livestream Counselling Q&A Timestamps\nJanuary 5th, 2025\n0:00 - Intro\n12:30 - Question"
+
+
+def make_channel(count, audio_percent, seed=1):
+    rng = random.Random(seed)
+    messages = []
+    for msg_id in range(1, count + 1):
+        audio = rng.random() * 100 < audio_percent
+        text = QNA_TEXT if audio and rng.random() < 0.5 else f"Post {msg_id} https://t.me/c/1/{msg_id} reminder"
+        messages.append(SimpleNamespace(id=msg_id, audio=SimpleNamespace(mime_type="audio/mpeg") if audio else None,
+                                        message=text))
+    return messages
+
+
+async def iter_history(messages, audio_only):
+    source = [m for m in messages if m.audio] if audio_only else messages
+    for start in range(0, len(source), PAGE_SIZE):
+        await asyncio.sleep(ROUND_TRIP)
+        for message in source[start:start + PAGE_SIZE]:
+            yield message
+
+
+def inline_is_qna(text):
+    if not text:
+        return False
+    cleaned = re.sub(r"https?://t\.me/\S+", "", text, flags=re.IGNORECASE)
+    cleaned = re.sub(r"\s+", " ", cleaned).strip()
+    return "livestream counselling q&a timestamps" in cleaned.lower()
+
+
+TME_LINK = re.compile(r"https?://t\.me/\S+", re.IGNORECASE)
+WHITESPACE = re.compile(r"\s+")
+
+
+def compiled_is_qna(text):
+    if not text or "&" not in text:
+        return False
+    cleaned = WHITESPACE.sub(" ", TME_LINK.sub("", text)).strip()
+    return "livestream counselling q&a timestamps" in cleaned.lower()
+
+
+async def scan(messages, audio_only, is_qna):
+    start = time.perf_counter()
+    scanned = found = 0
+    async for message in iter_history(messages, audio_only):
+        scanned += 1
+        if message.audio and message.audio.mime_type == "audio/mpeg" and is_qna(message.message):
+            found += 1
+    return scanned, found, time.perf_counter() - start
+
+
+async def main(count: int = 100000, audio_percent: float = 1.0):
+    messages = make_channel(count, audio_percent)
+    total = len(messages)
+    for label, audio_only, is_qna in [("full walk", False, inline_is_qna),
+                                      ("audio-only filter", True, compiled_is_qna)]:
+        scanned, found, elapsed = await scan(messages, audio_only, is_qna)
+        print(f"  {label:>17}: {scanned:7d} fetched, {found} Q&A posts, {elapsed:6.2f}s "
+              f"({total / elapsed:,.0f} channel messages/s)")
+    checks = [m.message for m in messages]
+    for label, is_qna in [("inline regex", inline_is_qna), ("precompiled", compiled_is_qna)]:
+        start = time.perf_counter()
+        for text in checks:
+            is_qna(text)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:>17}: Q&A check {len(checks) / elapsed:,.0f} msg/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*[float(a) if i else int(a) for i, a in enumerate(sys.argv[1:3])]))
@@ -0,0 +1,289 @@
+# benchmarks/pipeline.py
+# The whole scraper, offline: scraping.main() runs against a fake channel of
+# Q&A posts with generated MP3s, fake MTProto senders (latency and bandwidth
+# per connection) under FastTelethon, moto S3, the fake Transcribe client and
+# a SQLite file standing in for the Question table. The run ends when every
+# clip's transcript is imported. It reports wall time, CPU, peak RSS and
+# per-stage throughput. Seeds and sizes are fixed so runs can be compared:
+# --save keeps the results, and --baseline compares against saved ones and
+# exits 1 on anything worse by more than BENCH_TOLERANCE (timings must also be
+# BENCH_NOISE_SECONDS worse, so short stages don't flap). Peak RSS includes
+# moto's in-memory bucket.
+#
+# The default posts download in well under a controller tick. --long instead
+# downloads one long recording over slow connections, starting from a
+# remembered count of LONG_START, so the connection controller adds senders
+# while parts are in flight. A run that stops making progress is stopped
+# after BENCH_TIMEOUT seconds with every thread's stack.
+#
+#   cd telegram_scraping && python -m benchmarks.pipeline [posts] [minutes] [--long] [--save FILE] [--baseline FILE]
+#
+#   BENCH_QUESTIONS=8 BENCH_KBPS=64 BENCH_LATENCY=0.02 BENCH_BANDWIDTH_MB=4 BENCH_S3_LATENCY=0.005
+#   BENCH_TRANSCRIBE_SECONDS=1 BENCH_TRANSCRIBE_CONCURRENCY=10 BENCH_TOLERANCE=0.25
+#   BENCH_NOISE_SECONDS=0.05 BENCH_TIMEOUT=600
+#   BENCH_LONG_MINUTES=120 BENCH_LONG_KBPS=128 BENCH_LONG_BANDWIDTH_MB=1
+#
+# Scraper settings (SPLIT_MODE, VIRTUAL_CLIPS, TRANSCRIBE_BATCH_SECONDS, ...)
+# are read from the environment as usual.
+
+import asyncio
+import contextlib
+import faulthandler
+import importlib
+import json
+import os
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+
+import boto3
+from moto import mock_aws
+
+QUESTIONS = int(os.getenv("BENCH_QUESTIONS", 8))
+KBPS = int(os.getenv("BENCH_KBPS", 64))
+LATENCY = float(os.getenv("BENCH_LATENCY", 0.02))
+BANDWIDTH_MB = float(os.getenv("BENCH_BANDWIDTH_MB", 4))
+S3_LATENCY = float(os.getenv("BENCH_S3_LATENCY", 0.005))
+TRANSCRIBE_SECONDS = float(os.getenv("BENCH_TRANSCRIBE_SECONDS", 1))
+TRANSCRIBE_CONCURRENCY = int(os.getenv("BENCH_TRANSCRIBE_CONCURRENCY", 10))
+TOLERANCE = float(os.getenv("BENCH_TOLERANCE", 0.25))
+NOISE_SECONDS = float(os.getenv("BENCH_NOISE_SECONDS", 0.05))
+TIMEOUT = float(os.getenv("BENCH_TIMEOUT", 600))
+LONG_MINUTES = int(os.getenv("BENCH_LONG_MINUTES", 120))
+LONG_KBPS = int(os.getenv("BENCH_LONG_KBPS", 128))
+LONG_BANDWIDTH_MB = float(os.getenv("BENCH_LONG_BANDWIDTH_MB", 1))
+LONG_START = 2
+
+CHANNEL_URL = "https://t.me/benchchannel"
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October",
+          "November", "December"]
+MB = 1024 * 1024
+
+# Read by the scraper's modules when they are imported, so set before load()
+SCRAPER_ENV = {
+    "TELEGRAM_CHANNEL_URLS": CHANNEL_URL,
+    "WAIT_FOR_TRANSCRIPTS": "1",
+    "TRANSCRIBE_POLL_MIN": "0.2",
+    "TRANSCRIBE_POLL_MAX": "1",
+    "TRANSCRIBE_LIST_RATE": "20",
+    "METRICS_FILE": "",
+    "METRICS_PORT": "0",
+    "DB_SQLITE": "questions.db",
+    "AWS_DEFAULT_REGION": "us-east-1",
+}
+
+
+def _timestamp(seconds):
+    h, rest = divmod(seconds, 3600)
+    return f"{h}:{rest // 60:02d}:{rest % 60:02d}" if h else f"{rest // 60}:{rest % 60:02d}"
+
+
+def post_text(index, minutes, rng):
+    # Questions start on a 10 s grid, so no clip is under MIN_CLIP_MS
+    starts = [0] + sorted(rng.sample(range(1, minutes * 6), QUESTIONS - 1))
+    lines = ["Livestream Counselling Q&A Timestamps",
+             f"{MONTHS[index // 28 % 12]} {index % 28 + 1}th, {2025 + index // 336}"]
+    lines += [f"{_timestamp(start * 10)} - Post {index} question {i} on topic {rng.randrange(1000)}"
+              for i, start in enumerate(starts)]
+    return "\n".join(lines)
+
+
+def load():
+    """Imports the scraper after SCRAPER_ENV is in place; anything already set in the environment wins."""
+    for key, value in SCRAPER_ENV.items():
+        os.environ.setdefault(key, value)
+    scraping = importlib.import_module("scraping")
+    return scraping
+
+
+def add_s3_latency(s3):
+    def before_send(request, **kwargs):
+        time.sleep(S3_LATENCY)
+
+    s3.meta.events.register_first("before-send.s3.*", before_send)
+
+
+def stage_report(snapshot):
+    timings = {(t["name"], t["labels"].get("stage")): t for t in snapshot["timings"]}
+    items = {}
+    for c in snapshot["counters"]:
+        if c["name"] == "stage_items_total":
+            items.setdefault(c["labels"]["stage"], {})[c["labels"]["outcome"]] = c["value"]
+    stages = {}
+    for (name, stage), t in timings.items():
+        if name != "stage_seconds":
+            continue
+        done = items.get(stage, {})
+        stages[stage] = {"items": int(done.get("ok", 0)), "failed": int(done.get("failed", 0)),
+                         "mean_seconds": t["sum"] / t["count"], "max_seconds": t["max"],
+                         "busy_seconds": t["sum"]}
+    return stages
+
+
+def counter(snapshot, name):
+    return sum(c["value"] for c in snapshot["counters"] if c["name"] == name)
+
+
+def timing(snapshot, name):
+    # (count, sum) over every label set
+    found = [t for t in snapshot["timings"] if t["name"] == name]
+    return sum(t["count"] for t in found), sum(t["sum"] for t in found)
+
+
+async def run(posts, minutes, kbps=KBPS, bandwidth_mb=BANDWIDTH_MB, start_connections=None):
+    scraping = load()
+    import FastTelethon
+    import sender_pool
+    from benchmarks.fakes import FakeChannelClient, FakeSenderPool, FakeTranscribeClient, Mp3Payload
+    from metrics import metrics
+    from transfer_tuning import DcStats
+
+    rng = random.Random(1)
+    client = FakeChannelClient(latency=LATENCY, jitter=LATENCY, bandwidth=bandwidth_mb * MB, slow_fraction=0.1,
+                               seed=2)
+    for index in range(posts):
+        client.post_audio(CHANNEL_URL, post_text(index, minutes, rng), Mp3Payload(minutes * 60, kbps))
+    sender_pool._pools[client] = FakeSenderPool(client, connect_delay=LATENCY * 3)
+    # Nothing learned from earlier runs, so every run starts from the same defaults
+    FastTelethon.dc_stats = DcStats(path=None, log_path=None)
+    if start_connections:
+        FastTelethon.dc_stats.data[str(client.session.dc_id)] = {"connections": start_connections}
+
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=scraping.s3_bucket)
+    add_s3_latency(s3)
+    transcribe = FakeTranscribeClient(s3, job_seconds=TRANSCRIBE_SECONDS, max_concurrent=TRANSCRIBE_CONCURRENCY,
+                                      seed=3)
+    db = sqlite3.connect(os.environ["DB_SQLITE"])
+    db.execute("CREATE TABLE Question (ID INTEGER PRIMARY KEY, Title TEXT, Date TEXT, Transcription TEXT)")
+    db.commit()
+    scraping.setup(client, s3, transcribe)
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+        await scraping.main()
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+
+    snapshot = metrics.snapshot()
+    rows = db.execute("SELECT COUNT(*) FROM Question").fetchone()[0]
+    db.close()
+    downloads, download_rates = timing(snapshot, "download_bytes_per_second")
+    uploads, upload_seconds = timing(snapshot, "s3_upload_seconds")
+    uploaded = counter(snapshot, "s3_upload_bytes_total")
+    audio_bytes = posts * len(Mp3Payload(minutes * 60, kbps))
+    return {
+        "settings": {"posts": posts, "minutes": minutes, "questions": QUESTIONS, "kbps": kbps, "latency": LATENCY,
+                     "bandwidth_mb": bandwidth_mb, "start_connections": start_connections, "s3_latency": S3_LATENCY,
+                     "transcribe_seconds": TRANSCRIBE_SECONDS, "transcribe_concurrency": TRANSCRIBE_CONCURRENCY},
+        "wall_seconds": wall,
+        "cpu_seconds": cpu,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "stages": stage_report(snapshot),
+        "audio_mb_per_second": audio_bytes / MB / wall,
+        "download_mb_per_second": download_rates / max(downloads, 1) / MB,
+        "upload_mb_per_second": uploaded / max(upload_seconds, 1e-9) / MB,
+        "uploaded_mb": uploaded / MB,
+        "uploads": int(uploads),
+        "transcribe_jobs": transcribe.calls.get("start_transcription_job", 0),
+        "rows": rows,
+        "expected_rows": posts * QUESTIONS,
+        "audio_mb": audio_bytes / MB,
+        "connections_learned": FastTelethon.dc_stats.connections(client.session.dc_id, None),
+    }
+
+
+def print_report(r):
+    s = r["settings"]
+    print(f"  {s['posts']} posts x {s['minutes']} min at {s['kbps']} kbps ({r['audio_mb']:.0f} MB, "
+          f"{s['posts'] * s['questions']} clips): {r['wall_seconds']:.2f}s wall, {r['cpu_seconds']:.2f}s CPU, "
+          f"peak RSS {r['peak_rss_mb']:.0f} MB")
+    print(f"  {r['audio_mb_per_second']:.2f} MB/s of audio end to end; downloads {r['download_mb_per_second']:.1f} "
+          f"MB/s each, {r['uploads']} S3 uploads ({r['uploaded_mb']:.0f} MB) at {r['upload_mb_per_second']:.1f} MB/s; "
+          f"{r['transcribe_jobs']} Transcribe jobs, {r['rows']}/{r['expected_rows']} transcripts imported")
+    if s["start_connections"]:
+        print(f"  download connections: started at {s['start_connections']}, "
+              f"best {r['connections_learned']} (kept for the next download)")
+    print(f"  {'stage':>10}  {'items':>5}  {'failed':>6}  {'mean s':>7}  {'max s':>7}  {'busy s':>7}  "
+          f"{'items/busy s':>12}")
+    for name, st in r["stages"].items():
+        print(f"  {name:>10}  {st['items']:5d}  {st['failed']:6d}  {st['mean_seconds']:7.3f}  "
+              f"{st['max_seconds']:7.3f}  {st['busy_seconds']:7.2f}  "
+              f"{(st['items'] + st['failed']) / max(st['busy_seconds'], 1e-9):12.1f}")
+
+
+def compare(result, baseline):
+    """Prints the change of each measure against baseline; returns the ones worse than TOLERANCE."""
+    if result["settings"] != baseline["settings"]:
+        print(f"  ⚠️ baseline was run with different settings: {baseline['settings']}")
+    # (label, new, old, higher is better, smallest change that counts)
+    checks = [("wall seconds", result["wall_seconds"], baseline["wall_seconds"], False, NOISE_SECONDS),
+              ("CPU seconds", result["cpu_seconds"], baseline["cpu_seconds"], False, NOISE_SECONDS),
+              ("peak RSS MB", result["peak_rss_mb"], baseline["peak_rss_mb"], False, 0),
+              ("audio MB/s", result["audio_mb_per_second"], baseline["audio_mb_per_second"], True, 0)]
+    for name, st in result["stages"].items():
+        old = baseline["stages"].get(name)
+        if old:
+            checks.append((f"{name} mean s", st["mean_seconds"], old["mean_seconds"], False, NOISE_SECONDS))
+    worse = []
+    for label, new, old, higher_is_better, floor in checks:
+        change = (new - old) / old if old else 0.0
+        regressed = (-change if higher_is_better else change) > TOLERANCE and abs(new - old) > floor
+        print(f"  {label:>16}: {old:9.3f} -> {new:9.3f} ({change:+.0%}){'  REGRESSION' if regressed else ''}")
+        if regressed:
+            worse.append(label)
+    return worse
+
+
+def main(argv):
+    save = baseline = None
+    long = False
+    args = []
+    it = iter(argv)
+    for arg in it:
+        if arg == "--long":
+            long = True
+        elif arg == "--save":
+            save = os.path.abspath(next(it))
+        elif arg == "--baseline":
+            baseline = os.path.abspath(next(it))
+        else:
+            args.append(int(arg))
+    if long:
+        posts, minutes = (args + [1, LONG_MINUTES][len(args):])[:2]
+        scenario = run(posts, minutes, LONG_KBPS, LONG_BANDWIDTH_MB, LONG_START)
+    else:
+        posts, minutes = (args + [6, 20][len(args):])[:2]
+        scenario = run(posts, minutes)
+
+    cwd = os.getcwd()
+    # A watchdog thread, since a stuck event loop can't time itself out
+    faulthandler.dump_traceback_later(TIMEOUT, exit=True)
+    with tempfile.TemporaryDirectory() as folder, mock_aws():
+        os.chdir(folder)  # state, caches, downloads and splits all land here
+        try:
+            result = asyncio.run(scenario)
+        finally:
+            os.chdir(cwd)
+    faulthandler.cancel_dump_traceback_later()
+    print_report(result)
+    if save:
+        with open(save, "w") as f:
+            json.dump(result, f, indent=2)
+    if result["rows"] != result["expected_rows"]:
+        print("  MISSING TRANSCRIPTS")
+        sys.exit(1)
+    if baseline:
+        with open(baseline) as f:
+            worse = compare(result, json.load(f))
+        if worse:
+            print(f"  {len(worse)} measure(s) regressed by more than {TOLERANCE:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
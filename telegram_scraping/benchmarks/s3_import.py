@@ -0,0 +1,49 @@
+# benchmarks/s3_import.py
+# Puts synthetic Transcribe outputs into a moto bucket (more than one listing
+# page) and imports them into SQLite with different fetch worker counts.
+# Each S3 request gets an injected latency, as a real bucket would.
+#
+#   cd telegram_scraping && python -m benchmarks.s3_import [objects]
+
+import json
+import sqlite3
+import sys
+import time
+
+import boto3
+from moto import mock_aws
+
+import db_import
+from db_import import TranscriptWriter, import_transcripts
+
+BUCKET = "telegram-qna-splits"
+LATENCY_SECONDS = 0.02
+
+
+def transcript(i):
+    return {"jobName": f"job-{i}", "results": {"transcripts": [{"transcript": f"answer number {i} " * 50}]}}
+
+
+@mock_aws
+def main(n: int = 2500):
+    db_import.log = lambda *a, **k: None
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=BUCKET)
+    for i in range(n):
+        s3.put_object(Bucket=BUCKET, Key=f"transcripts/2024-01-01_-_Question_{i}-{i}.json",
+                      Body=json.dumps(transcript(i)).encode())
+    s3.meta.events.register_first("before-send.s3.*", lambda **kwargs: time.sleep(LATENCY_SECONDS))
+
+    for workers in (1, 4, 16, 32):
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE Question (ID INTEGER PRIMARY KEY, Title TEXT, Date TEXT, Transcription TEXT)")
+        writer = TranscriptWriter(conn, dialect="sqlite")
+        start = time.perf_counter()
+        failed = import_transcripts(s3, writer, BUCKET, workers=workers)
+        elapsed = time.perf_counter() - start
+        print(f"{workers:3d} workers: {writer.inserted / elapsed:8.0f} transcripts/s "
+              f"({writer.inserted}/{n} imported, {failed} failed, {elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]])
@@ -0,0 +1,82 @@
+# benchmarks/s3_upload.py
+# Uploads a batch of fake clips to a moto S3 bucket, one at a time as
+# upload_to_s3 used to and then through AsyncUploader. Every request gets an
+# injected latency and a share of them fail, to exercise the retries.
+#
+#   cd telegram_scraping && python -m benchmarks.s3_upload [clips] [clip_kb]
+
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+import boto3
+from moto import mock_aws
+
+import s3_uploader
+from s3_uploader import AsyncUploader
+
+BUCKET = "telegram-qna-splits"
+LATENCY_SECONDS = 0.05
+FAILURE_RATE = 0.05
+
+
+def add_latency_and_failures(s3, rng):
+    def before_send(request, **kwargs):
+        time.sleep(LATENCY_SECONDS)
+        if rng.random() < FAILURE_RATE:
+            raise ConnectionError("injected failure")
+
+    # Registered before moto's handler, so the delay applies to every request
+    s3.meta.events.register_first("before-send.s3.*", before_send)
+
+
+def make_clips(folder, count, size):
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"clip-{i}.mp3")
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        paths.append(path)
+    return paths
+
+
+@mock_aws
+def main(count: int = 40, clip_kb: int = 256):
+    s3_uploader.RETRY_BASE_SECONDS = 0.05
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=BUCKET)
+    add_latency_and_failures(s3, random.Random(1))
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = make_clips(folder, count, clip_kb * 1024)
+
+        start = time.perf_counter()
+        ok = 0
+        for path in paths:
+            try:
+                s3.upload_file(path, BUCKET, f"sequential/{os.path.basename(path)}")
+                ok += 1
+            except Exception:
+                pass
+        sequential = time.perf_counter() - start
+        print(f"sequential: {sequential:6.2f}s, {ok}/{count} uploaded")
+
+        uploader = AsyncUploader(s3, BUCKET, concurrency=8)
+        start = time.perf_counter()
+        results = asyncio.run(uploader.upload_many(
+            (path, f"async/{os.path.basename(path)}") for path in paths))
+        concurrent = time.perf_counter() - start
+        uploader.close()
+        retried = sum(1 for r in results if r.attempts > 1)
+        print(f"     async: {concurrent:6.2f}s, {sum(r.ok for r in results)}/{count} uploaded, "
+              f"{retried} needed retries")
+
+        listed = s3.list_objects_v2(Bucket=BUCKET, Prefix="async/").get("KeyCount", 0)
+        print(f"   in moto: {listed} objects under async/, speedup {sequential / concurrent:.1f}x")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,96 @@
+# benchmarks/search_index.py
+# Imports synthetic English/Arabic transcripts through TranscriptWriter with
+# and without a SearchIndex, then times the app's LIKE scan against an index
+# search for the same queries at each table size.
+#
+#   cd telegram_scraping && python -m benchmarks.search_index [rows ...]
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from itertools import accumulate
+
+import db_import
+from benchmarks.db_ingest import connect, writer_pass
+from search_index import SearchIndex
+
+ENGLISH = ("prayer fasting question answer brother sister quran hadith marriage work salah zakat gold "
+           "parents divorce travelling mosque charity ramadan loan business wife husband children dua").split()
+RARE = "inheritance umrah sadaqah wudu repentance".split()
+ARABIC = "الصلاة الزكاة الصيام الحج الطلاق الميراث الربا الدعاء التوبة المسجد".split()
+FILLER = [f"w{i}" for i in range(5000)]
+# Ordered by frequency (Zipf): common words near the top, Arabic mid-table, rare words in the tail
+VOCAB = FILLER[:20] + ENGLISH + FILLER[20:200] + ARABIC + FILLER[200:2000] + RARE + FILLER[2000:]
+CUM_WEIGHTS = list(accumulate(1 / (rank + 1) for rank in range(len(VOCAB))))
+
+QUERIES = [
+    ("common word", "prayer"),
+    ("rare word", "sadaqah"),
+    ("two words", "zakat gold"),  # LIKE only finds them as a phrase
+    ("arabic", "الصلاة"),
+    ("arabic, voweled", "الصَّلَاة"),
+]
+REPEATS = 5
+
+
+def synthetic(n, seed=0):
+    rng = random.Random(seed)
+    for i in range(n):
+        title = " ".join(rng.choices(VOCAB, cum_weights=CUM_WEIGHTS, k=6))
+        text = " ".join(rng.choices(VOCAB, cum_weights=CUM_WEIGHTS, k=rng.randint(30, 90)))
+        yield f"transcripts/2024-{i % 28 + 1:02d}-01_-_q{i}-{i}.json", f"etag{i}", title, f"q{i}", text
+
+
+def like_scan(conn, text):
+    pattern = f"%{text}%"
+    return conn.execute("SELECT Title, Date FROM Question WHERE Title LIKE ? OR Transcription LIKE ?",
+                        (pattern, pattern)).fetchall()
+
+
+def timed(fn):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000, result
+
+
+def run(n, folder):
+    conn = connect(os.path.join(folder, f"plain_{n}.db"))
+    start = time.perf_counter()
+    writer_pass(conn, synthetic(n))
+    plain = time.perf_counter() - start
+
+    conn = connect(os.path.join(folder, f"indexed_{n}.db"))
+    index = SearchIndex(os.path.join(folder, f"index_{n}.db"))
+    start = time.perf_counter()
+    writer = db_import.TranscriptWriter(conn, dialect="sqlite", index=index)
+    for key, etag, title, date, text in synthetic(n):
+        writer.add(key, etag, title, date, text)
+    writer.flush()
+    indexed = time.perf_counter() - start
+    print(f"  {n:>9,} rows: import {n / plain:8,.0f} rows/s plain, {n / indexed:8,.0f} rows/s with the index")
+
+    for label, text in QUERIES:
+        like_ms, like_rows = timed(lambda: like_scan(conn, text))
+        index_ms, hits = timed(lambda: index.search(text))
+        print(f"    {label:>16}: LIKE {like_ms:9.1f} ms ({len(like_rows):7,} rows)   "
+              f"index {index_ms:7.2f} ms (top {len(hits)} of {index.count(text):7,})   "
+              f"{like_ms / index_ms:7.0f}x")
+    index.close()
+    conn.close()
+
+
+def main(sizes=(10000, 100000, 1000000)):
+    db_import.log = lambda *a, **k: None  # keep per-batch logging out of the timings
+    with tempfile.TemporaryDirectory() as folder:
+        for n in sizes:
+            run(n, folder)
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or (10000, 100000, 1000000))
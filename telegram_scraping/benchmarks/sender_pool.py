@@ -0,0 +1,45 @@
+# benchmarks/sender_pool.py
+# Downloads a batch of files with and without a shared SenderPool, where
+# every new connection pays a fake handshake delay.
+#
+#   cd telegram_scraping && python -m benchmarks.sender_pool [files] [size_mb]
+
+import asyncio
+import sys
+import time
+
+from benchmarks.fakes import FakeSenderPool, FakeTelegramClient, FakeTransferrer, fake_location
+
+HANDSHAKE_SECONDS = 0.3
+
+
+async def backfill(client, files, size, shared_pool):
+    start = time.perf_counter()
+    created = 0
+    for _ in range(files):
+        pool = shared_pool or FakeSenderPool(client, connect_delay=HANDSHAKE_SECONDS)
+        async for _ in FakeTransferrer(client, pool=pool).download(fake_location(size), size, 512, 8):
+            pass
+        if not shared_pool:
+            created += pool.created
+            await pool.close()
+    if shared_pool:
+        created = shared_pool.created
+    return time.perf_counter() - start, created
+
+
+async def main(files: int = 10, size_mb: int = 8):
+    payload = bytes(size_mb * 1024 * 1024)
+    size = len(payload)
+    client = FakeTelegramClient(payload, latency=0.01, jitter=0.02, slow_fraction=0)
+
+    elapsed, created = await backfill(client, files, size, None)
+    print(f"  fresh senders: {elapsed:6.2f}s, {created} connections opened")
+    pool = FakeSenderPool(client, connect_delay=HANDSHAKE_SECONDS)
+    elapsed, created = await backfill(client, files, size, pool)
+    print(f"    shared pool: {elapsed:6.2f}s, {created} connections opened, {pool.reused} reused")
+    await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*[int(a) for a in sys.argv[1:3]]))
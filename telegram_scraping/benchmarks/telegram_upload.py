@@ -0,0 +1,45 @@
+# benchmarks/telegram_upload.py
+# Uploads clips through ParallelTransferrer.upload_file against the fake
+# client, one connection (what stock Telethon does) versus the parallel
+# default, and checks that the parts received add up to the original file.
+#
+#   cd telegram_scraping && python -m benchmarks.telegram_upload [size_mb ...]
+
+import asyncio
+import io
+import os
+import sys
+import time
+
+from telethon.tl.types import InputFileBig
+
+from benchmarks.fakes import FakeTelegramClient, FakeTransferrer
+
+
+async def upload(client, payload, connections):
+    client.uploaded.clear()
+    start = time.perf_counter()
+    input_file = await FakeTransferrer(client).upload_file(io.BytesIO(payload), len(payload), "clip.mp3",
+                                                           connection_count=connections)
+    elapsed = time.perf_counter() - start
+    received = b"".join(client.uploaded[i] for i in sorted(client.uploaded))
+    ok = received == payload and input_file.parts == len(client.uploaded)
+    return elapsed, ok, input_file
+
+
+async def main(sizes_mb=(4, 24)):
+    client = FakeTelegramClient(latency=0.03, jitter=0.02, bandwidth=4 * 1024 * 1024, slow_fraction=0)
+    for size_mb in sizes_mb:
+        payload = os.urandom(int(size_mb * 1024 * 1024))
+        single, ok_single, _ = await upload(client, payload, 1)
+        parallel, ok_parallel, input_file = await upload(client, payload, None)
+        kind = "big" if isinstance(input_file, InputFileBig) else "small"
+        mb = len(payload) / 1024 / 1024
+        print(f"  {size_mb:>5} MB ({kind}, {input_file.parts} parts): "
+              f"1 connection {mb / single:6.1f} MB/s ({'ok' if ok_single else 'CORRUPT'}), "
+              f"parallel {mb / parallel:6.1f} MB/s ({'ok' if ok_parallel else 'CORRUPT'}), "
+              f"speedup {single / parallel:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main([float(a) for a in sys.argv[1:]] or (4, 24)))
@@ -0,0 +1,156 @@
+# benchmarks/transcribe_batch.py
+# Several livestreams' worth of clips sent to the fake Transcribe client, one
+# job per clip and then joined into TRANSCRIBE_BATCH_SECONDS-long jobs, with
+# the account's concurrent-job limit in place. Each run ends when every clip's
+# transcript is imported into SQLite; every imported row is checked to hold
+# only its own clip's words. Times are scaled: 1 s here stands for ~30 s.
+#
+#   cd telegram_scraping && python -m benchmarks.transcribe_batch [streams] [clips_per_stream] [batch_seconds]
+
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+import boto3
+from moto import mock_aws
+
+import db_import
+import transcribe_batch
+import transcribe_tracker
+from benchmarks.fakes import FakeTranscribeClient, fake_mp3
+from transcribe_batch import batch_job_name, batch_media_key, batch_transcript_key, concat_clips, make_parts, \
+    plan_batches
+from transcribe_tracker import JobStore, TranscribeTracker
+
+BUCKET = "telegram-qna-splits"
+JOB_OVERHEAD = 1.0       # ~30 s of queueing and setup per job
+REALTIME_FACTOR = 0.008  # ~0.25x realtime once running
+MAX_CONCURRENT = 10
+WORD_SECONDS = 0.5
+
+
+def make_streams(folder, streams, clips_per_stream, seed=5):
+    rng = random.Random(seed)
+    result = []
+    for s in range(streams):
+        clips = []
+        for c in range(clips_per_stream):
+            i = s * clips_per_stream + c
+            seconds = rng.uniform(20, 120)
+            path = os.path.join(folder, f"clip{i}.mp3")
+            with open(path, "wb") as f:
+                f.write(fake_mp3(seconds))
+            clips.append((i, path, seconds))
+        result.append(clips)
+    return result
+
+
+def words_for(segments):
+    # segments: (token, start, end) in the job's audio -> AWS-shaped items, a full stop every 8 words
+    items = []
+    for token, start, end in segments:
+        t = start
+        n = 0
+        while t + WORD_SECONDS <= end:
+            items.append({"type": "pronunciation", "start_time": f"{t + 0.05:.3f}",
+                          "end_time": f"{t + WORD_SECONDS - 0.05:.3f}",
+                          "alternatives": [{"confidence": "0.99", "content": token}]})
+            n += 1
+            if n % 8 == 0:
+                items.append({"type": "punctuation", "alternatives": [{"confidence": "0.0", "content": "."}]})
+            t += WORD_SECONDS
+    return items
+
+
+async def run(streams, batch_seconds, folder, label):
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=BUCKET)
+    media = {}      # uri -> (seconds, [(token, start, end)])
+
+    def transcript_for(job_name, uri):
+        items = words_for(media[uri][1])
+        text = db_import.clean_transcription_text(
+            {"results": {"transcripts": [{"transcript": transcribe_batch._rebuild_text(items)}]}})
+        return {"jobName": job_name, "status": "COMPLETED",
+                "results": {"transcripts": [{"transcript": text}], "items": items}}
+
+    transcribe = FakeTranscribeClient(s3, job_seconds=JOB_OVERHEAD, max_concurrent=MAX_CONCURRENT,
+                                      realtime_factor=REALTIME_FACTOR, media_seconds=lambda uri: media[uri][0],
+                                      transcript_for=transcript_for)
+    store = JobStore(os.path.join(folder, f"jobs_{label}.db"))
+    conn = sqlite3.connect(os.path.join(folder, f"questions_{label}.db"), check_same_thread=False)
+    conn.execute("CREATE TABLE Question (ID INTEGER PRIMARY KEY, Title TEXT, Date TEXT, Transcription TEXT)")
+
+    def import_now(completed):
+        keys = transcribe_batch.expand_batches(s3, BUCKET, store, completed)
+        writer = db_import.TranscriptWriter(conn, dialect="sqlite")
+        db_import.import_keys(s3, writer, keys, BUCKET)
+        return [name for name, _ in completed]
+
+    async def on_complete(completed):
+        return await asyncio.to_thread(import_now, completed)
+
+    start = time.monotonic()
+    jobs = 0
+    for clips in streams:
+        for batch in plan_batches([(clip, clip[2]) for clip in clips], batch_seconds):
+            names = [f"2024-01-01_-_Question_{i}-{i:010d}" for i, _, _ in batch]
+            if len(batch) == 1:
+                (i, path, seconds), name = batch[0], names[0]
+                key = f"initial-splits/{name}.mp3"
+                s3.upload_file(path, BUCKET, key)
+                media[f"s3://{BUCKET}/{key}"] = (seconds, [(f"token{i}", 0.0, seconds)])
+                transcribe.start_transcription_job(TranscriptionJobName=name,
+                                                   Media={"MediaFileUri": f"s3://{BUCKET}/{key}"},
+                                                   OutputBucketName=BUCKET, OutputKey=f"transcripts/{name}.json")
+                store.add(name, key, f"transcripts/{name}.json")
+            else:
+                name = batch_job_name(names)
+                joined = os.path.join(folder, f"{name}.mp3")
+                spans = concat_clips([path for _, path, _ in batch], joined)
+                key = batch_media_key(name)
+                s3.upload_file(joined, BUCKET, key)
+                os.remove(joined)
+                media[f"s3://{BUCKET}/{key}"] = (spans[-1][1] / 1000, [
+                    (f"token{i}", s / 1000, e / 1000) for (i, _, _), (s, e) in zip(batch, spans)])
+                parts = make_parts(names, [f"initial-splits/{n}.mp3" for n in names], spans)
+                transcribe.start_transcription_job(TranscriptionJobName=name,
+                                                   Media={"MediaFileUri": f"s3://{BUCKET}/{key}"},
+                                                   OutputBucketName=BUCKET, OutputKey=batch_transcript_key(name))
+                store.add_batch(name, key, batch_transcript_key(name), parts)
+            jobs += 1
+
+    tracker = TranscribeTracker(transcribe, store, on_complete, min_interval=0.1, max_interval=0.5,
+                                calls_per_second=50)
+    await tracker.run(until_idle=True)
+    elapsed = time.monotonic() - start
+
+    rows = conn.execute("SELECT Title, Transcription FROM Question").fetchall()
+    clean = all(set(text.replace(".", "").split()) == {"token" + title.split()[-1]} for title, text in rows)
+    return jobs, elapsed, len(rows), clean
+
+
+async def main(streams: int = 5, clips_per_stream: int = 40, batch_seconds: float = 900):
+    db_import.log = lambda *a, **k: None
+    transcribe_batch.log = lambda *a, **k: None
+    transcribe_tracker.log = lambda *a, **k: None
+    with tempfile.TemporaryDirectory() as folder, mock_aws():
+        clips = make_streams(folder, streams, clips_per_stream)
+        total = streams * clips_per_stream
+        results = {}
+        for label, seconds in [("one job per clip", 0), (f"batched ({batch_seconds:.0f}s)", batch_seconds)]:
+            jobs, elapsed, rows, clean = await run(clips, seconds, folder, "batched" if seconds else "single")
+            results[label] = (jobs, elapsed)
+            print(f"  {label:>18}: {jobs:4d} jobs, all {total} clips imported in {elapsed:6.2f}s "
+                  f"({rows} rows, {'each holds only its own words' if clean and rows == total else 'MISMATCH'})")
+        (single_jobs, single_time), (batched_jobs, batched_time) = results.values()
+        print(f"  {single_jobs / batched_jobs:.1f}x fewer jobs, end to end {single_time / batched_time:.1f}x faster "
+              f"(limit of {MAX_CONCURRENT} concurrent jobs)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*[float(a) if i == 2 else int(a) for i, a in enumerate(sys.argv[1:4])]))
@@ -0,0 +1,76 @@
+# benchmarks/transcribe_tracker.py
+# Starts a batch of jobs on the fake Transcribe client, tracks them with
+# TranscribeTracker and imports each finished transcript into SQLite through
+# db_import, reporting how long transcripts wait between finishing and
+# becoming searchable, and how many status calls that took.
+#
+#   cd telegram_scraping && python -m benchmarks.transcribe_tracker [jobs] [job_seconds]
+
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import boto3
+from moto import mock_aws
+
+import db_import
+from benchmarks.fakes import FakeTranscribeClient
+from transcribe_tracker import JobStore, TranscribeTracker
+
+BUCKET = "telegram-qna-splits"
+
+
+async def run(n, job_seconds, folder):
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=BUCKET)
+    transcribe = FakeTranscribeClient(s3, job_seconds=job_seconds, failure_rate=0.02)
+    store = JobStore(os.path.join(folder, "jobs.db"))
+    conn = sqlite3.connect(os.path.join(folder, "questions.db"), check_same_thread=False)
+    conn.execute("CREATE TABLE Question (ID INTEGER PRIMARY KEY, Title TEXT, Date TEXT, Transcription TEXT)")
+    imported_at = {}
+
+    def import_now(completed):
+        writer = db_import.TranscriptWriter(conn, dialect="sqlite")
+        db_import.import_keys(s3, writer, [key for _, key in completed], BUCKET)
+        now = time.monotonic()
+        for name, _ in completed:
+            imported_at[name] = now
+        return [name for name, _ in completed]
+
+    async def on_complete(completed):
+        return await asyncio.to_thread(import_now, completed)
+
+    for i in range(n):
+        name = f"2024-01-01_-_Question_{i}-{i}"
+        key = f"initial-splits/{name}.mp3"
+        transcribe.start_transcription_job(TranscriptionJobName=name, Media={"MediaFileUri": f"s3://{BUCKET}/{key}"},
+                                           OutputBucketName=BUCKET, OutputKey=f"transcripts/{name}.json")
+        store.add(name, key, f"transcripts/{name}.json")
+
+    tracker = TranscribeTracker(transcribe, store, on_complete, min_interval=0.2, max_interval=2,
+                                calls_per_second=20)
+    start = time.monotonic()
+    await tracker.run(until_idle=True)
+    elapsed = time.monotonic() - start
+
+    lags = [imported_at[name] - done for name, done in transcribe.completed_at.items() if name in imported_at]
+    rows = conn.execute("SELECT COUNT(*) FROM Question").fetchone()[0]
+    print(f"jobs: {store.counts()}, {rows} rows imported in {elapsed:.1f}s")
+    print(f"finished -> searchable: avg {sum(lags) / len(lags):.2f}s, max {max(lags):.2f}s")
+    print(f"status calls: {tracker.list_calls} list_transcription_jobs "
+          f"(per-job polling would need ~{n} get_transcription_job calls per round)")
+
+
+@mock_aws
+def main(n: int = 300, job_seconds: float = 3.0):
+    db_import.log = lambda *a, **k: None
+    with tempfile.TemporaryDirectory() as folder:
+        asyncio.run(run(n, job_seconds, folder))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:3]
+    main(int(args[0]) if args else 300, float(args[1]) if len(args) > 1 else 3.0)
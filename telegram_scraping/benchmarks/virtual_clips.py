@@ -0,0 +1,140 @@
+# benchmarks/virtual_clips.py
+# One livestream recording split into question clips two ways and sent to a
+# moto S3 bucket: frame-copy clip files (SPLIT_MODE=copy, one upload per
+# clip) versus virtual clips (the recording plus a manifest, one upload).
+# Reports the CPU time of the split, bytes written locally and uploaded,
+# what stays in S3, and checks that the media cut out in S3 for Transcribe
+# is byte for byte the clip file.
+#
+#   cd telegram_scraping && python -m benchmarks.virtual_clips [hours] [questions] [kbps]
+
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import boto3
+from moto import mock_aws
+
+import s3_uploader
+import splitter
+import virtual_clips
+from benchmarks.fakes import fake_mp3
+from s3_uploader import AsyncUploader
+from splitter import split_file
+
+BUCKET = "telegram-qna-splits"
+MIN_CLIP_MS = 5000
+MB = 1024 * 1024
+
+
+def make_recording(folder, hours, questions, kbps, seed=11):
+    rng = random.Random(seed)
+    seconds = hours * 3600
+    path = os.path.join(folder, "stream.mp3")
+    with open(path, "wb") as f:
+        f.write(fake_mp3(seconds, kbps))
+    # A minute of intro before the first question
+    starts = sorted(rng.sample(range(60, int(seconds) - 60), questions))
+    return path, [(start, f"Question {i}") for i, start in enumerate(starts)]
+
+
+def stored_bytes(s3):
+    pages = s3.get_paginator("list_objects_v2").paginate(Bucket=BUCKET)
+    return sum(obj["Size"] for page in pages for obj in page.get("Contents", []))
+
+
+def empty_bucket(s3):
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=BUCKET):
+        for obj in page.get("Contents", []):
+            s3.delete_object(Bucket=BUCKET, Key=obj["Key"])
+
+
+async def run_copy(s3, src, ts_items, folder):
+    out = os.path.join(folder, "splits")
+    os.makedirs(out, exist_ok=True)
+    cpu = time.process_time()
+    results, _ = split_file(src, ts_items, lambda clip: os.path.join(out, f"{clip.start_ms}.mp3"),
+                            min_clip_ms=MIN_CLIP_MS)
+    cpu = time.process_time() - cpu
+    written = sum(os.path.getsize(path) for _, path in results)
+    uploader = AsyncUploader(s3, BUCKET)
+    uploads = await uploader.upload_many([(path, f"initial-splits/{os.path.basename(path)}")
+                                          for _, path in results])
+    uploader.close()
+    assert all(r.ok for r in uploads)
+    return {"cpu": cpu, "written": written, "uploaded": sum(r.size for r in uploads), "puts": len(uploads),
+            "stored": stored_bytes(s3), "clips": {clip.start_ms: path for clip, path in results}}
+
+
+async def run_virtual(s3, src, ts_items, copy_clips):
+    cpu = time.process_time()
+    clips, duration_ms = virtual_clips.index_clips(src, ts_items, MIN_CLIP_MS)
+    source = virtual_clips.source_key("2024-01-01", 1)
+    manifest = virtual_clips.make_manifest(source, os.path.getsize(src), duration_ms, clips,
+                                           [(f"{clip.start_ms}.mp3", str(clip.start_ms)) for clip in clips])
+    body = json.dumps(manifest, ensure_ascii=False).encode()
+    cpu = time.process_time() - cpu
+
+    uploader = AsyncUploader(s3, BUCKET)
+    result = await uploader.upload(src, source)
+    uploader.close()
+    assert result.ok
+    virtual_clips.put_manifest(s3, BUCKET, manifest)
+    stored = stored_bytes(s3)
+
+    # Media for Transcribe, cut out in S3 and compared with the clip files
+    same = len(clips) == len(copy_clips)
+    keys = {}
+    for clip in clips:
+        key = virtual_clips.media_key(str(clip.start_ms))
+        virtual_clips.cut_media(s3, BUCKET, source, clip.byte_start, clip.byte_end, key)
+        keys[key] = key
+        with open(copy_clips[clip.start_ms], "rb") as f:
+            same = same and s3.get_object(Bucket=BUCKET, Key=key)["Body"].read() == f.read()
+    # A player seeking 30 s into a clip
+    clip = clips[len(clips) // 2]
+    at = virtual_clips.seek_offset(clip.seek, 30000)
+    ranged = s3.get_object(Bucket=BUCKET, Key=source, Range=f"bytes={at}-{clip.byte_end - 1}")["Body"].read()
+    same = same and ranged == virtual_clips.read_range(src, at, clip.byte_end)
+    virtual_clips.drop_media(s3, BUCKET, keys)
+    return {"cpu": cpu, "written": 0, "uploaded": result.size + len(body), "puts": 2, "stored": stored,
+            "after": stored_bytes(s3), "same": same, "copied": sum(c.byte_end - c.byte_start for c in clips),
+            "manifest": len(body), "clips": len(clips)}
+
+
+async def main(hours: float = 2.0, questions: int = 40, kbps: int = 128):
+    splitter.log = virtual_clips.log = lambda *a, **k: None
+    s3_uploader.log = lambda *a, **k: None
+    with tempfile.TemporaryDirectory() as folder, mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket=BUCKET)
+        src, ts_items = make_recording(folder, hours, questions, kbps)
+        size = os.path.getsize(src) / MB
+        print(f"  {hours:g} h recording at {kbps} kbps, {size:.1f} MB, {questions} questions")
+
+        copy = await run_copy(s3, src, ts_items, folder)
+        empty_bucket(s3)
+        virtual = await run_virtual(s3, src, ts_items, copy["clips"])
+
+        for label, r in (("copy clip files", copy), ("virtual clips", virtual)):
+            print(f"  {label:>16}: split CPU {r['cpu'] * 1000:7.1f} ms, written {r['written'] / MB:6.1f} MB, "
+                  f"uploaded {r['uploaded'] / MB:6.1f} MB in {r['puts']:3d} upload(s), in S3 {r['stored'] / MB:6.1f} MB")
+        print(f"  manifest {virtual['manifest'] / 1024:.1f} KB for {virtual['clips']} clips; Transcribe media: "
+              f"{virtual['copied'] / MB:.1f} MB copied inside S3, none uploaded, "
+              f"{'byte-identical to the clip files' if virtual['same'] else 'MISMATCH'}; "
+              f"{virtual['after'] / MB:.1f} MB left in S3 after import")
+        print(f"  split CPU {copy['cpu'] / virtual['cpu']:.1f}x less, {copy['written'] / MB:.1f} MB fewer local "
+              f"writes, {copy['puts']} -> {virtual['puts']} uploads")
+        if shutil.which("ffmpeg") is None:
+            print("  (SPLIT_MODE=reencode not measured: ffmpeg is not installed)")
+        if not virtual["same"]:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*[float(a) if i == 0 else int(a) for i, a in enumerate(sys.argv[1:4])]))
@@ -0,0 +1,89 @@
+# benchmarks/word_timings.py
+# Synthetic Transcribe JSON for a set of clips: the memory it takes to hold
+# the items as Python dicts versus the packed .wt files, and the time to turn
+# a (clip, word) search hit into an audio offset by loading the JSON and
+# scanning its items versus opening the .wt file and bisecting.
+#
+#   cd telegram_scraping && python -m benchmarks.word_timings [clips] [words_per_clip]
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from word_timings import WordTimingStore
+
+VOCAB = [f"word{i}" for i in range(3000)] + ["prayer", "zakat", "الصلاة", "الزكاة"]
+LOOKUPS = 2000
+
+
+def transcript_json(rng, words):
+    items, t = [], 0.0
+    for i in range(words):
+        length = rng.uniform(0.15, 0.6)
+        items.append({"start_time": f"{t:.3f}", "end_time": f"{t + length:.3f}", "type": "pronunciation",
+                      "alternatives": [{"confidence": f"{rng.uniform(0.6, 1):.4f}", "content": rng.choice(VOCAB)}]})
+        t += length + rng.uniform(0, 0.2)
+        if i % 12 == 11:
+            items.append({"type": "punctuation", "alternatives": [{"confidence": "0.0", "content": "."}]})
+    text = " ".join(item["alternatives"][0]["content"] for item in items)
+    return {"results": {"transcripts": [{"transcript": text}], "items": items}}
+
+
+def scan_json(path, word):
+    with open(path, "rb") as f:
+        items = json.loads(f.read())["results"]["items"]
+    for item in items:
+        if item["type"] == "pronunciation" and item["alternatives"][0]["content"] == word:
+            return float(item["start_time"])
+    return None
+
+
+def main(clips: int = 200, words: int = 2000):
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as folder:
+        store = WordTimingStore(os.path.join(folder, "timings"))
+        json_paths = []
+        tracemalloc.start()
+        held = []
+        for i in range(clips):
+            data = transcript_json(rng, words)
+            held.append(data["results"]["items"])
+            path = os.path.join(folder, f"clip{i}.json")
+            with open(path, "w") as f:
+                json.dump(data, f)
+            json_paths.append(path)
+            store.write(f"clip {i}", "2024-01-01", store.encode(data["results"]["transcripts"][0]["transcript"],
+                                                                data["results"]["items"]))
+        dict_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+        tracemalloc.stop()
+        del held
+        json_mb = sum(os.path.getsize(p) for p in json_paths) / 1024 / 1024
+        wt_mb = sum(os.path.getsize(store.path_for(f"clip {i}", "2024-01-01")) for i in range(clips)) / 1024 / 1024
+        print(f"  {clips} clips x {words} words: items as dicts {dict_mb:7.1f} MB, JSON files {json_mb:6.1f} MB, "
+              f".wt files {wt_mb:5.1f} MB ({dict_mb / wt_mb:.0f}x smaller than the dicts)")
+
+        hits = [(rng.randrange(clips), rng.choice(VOCAB)) for _ in range(LOOKUPS)]
+        start = time.perf_counter()
+        expected = [scan_json(json_paths[clip], word) for clip, word in hits]
+        scan = (time.perf_counter() - start) / LOOKUPS
+
+        start = time.perf_counter()
+        got = []
+        for clip, word in hits:
+            with store.open(f"clip {clip}", "2024-01-01") as timings:
+                got.append(timings.offset_of(word))
+        seek = (time.perf_counter() - start) / LOOKUPS
+        # float32 keeps well under a millisecond at these lengths
+        same = all((a is None) == (b is None) and (a is None or abs(a - b) < 1e-3) for a, b in zip(expected, got))
+        print(f"  hit -> offset: JSON load + scan {scan * 1000:7.3f} ms, mmap + bisect {seek * 1000:6.3f} ms "
+              f"({scan / seek:.0f}x), {'same offsets' if same else 'OFFSETS DIFFER'}")
+        if not same:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,96 @@
+# channel_scheduler.py
+# Shares one Telegram client between many channels: download slots are handed
+# out round-robin across channels, and a FLOOD_WAIT seen by any of them pauses
+# all of them.
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque
+
+from metrics import log, metrics
+
+
+class FloodGate:
+    """Closed until the longest FLOOD_WAIT reported so far has passed."""
+
+    def __init__(self) -> None:
+        self.until = 0.0
+        self.trips = 0
+
+    def trip(self, seconds: float) -> None:
+        self.trips += 1
+        metrics.inc("flood_gate_trips_total")
+        until = time.monotonic() + seconds
+        if until > self.until:
+            self.until = until
+            log(f"🚦 FLOOD_WAIT: pausing all channels for {seconds}s", level="warning", seconds=seconds)
+
+    async def wait(self) -> None:
+        while True:
+            remaining = self.until - time.monotonic()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(remaining)
+
+
+class FairScheduler:
+    """
+    A semaphore with `slots` permits that serves waiting channels in turn
+    instead of first come, first served, so a channel with a long backlog
+    cannot starve the others. Each channel's own budget is the number of
+    workers it runs, which bounds how many of its waiters can queue here.
+    """
+
+    def __init__(self, slots: int, gate: FloodGate) -> None:
+        self.free = max(1, slots)
+        self.gate = gate
+        self.waiting: "OrderedDict[Any, Deque[asyncio.Future]]" = OrderedDict()
+        self.granted = 0
+
+    async def acquire(self, channel: Any) -> None:
+        if self.free and not self.waiting:
+            self.free -= 1
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            self.waiting.setdefault(channel, deque()).append(fut)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    self.release()  # granted just as we were cancelled
+                else:
+                    self._forget(channel, fut)
+                raise
+        self.granted += 1
+
+    def _forget(self, channel: Any, fut: asyncio.Future) -> None:
+        queue = self.waiting.get(channel)
+        if queue and fut in queue:
+            queue.remove(fut)
+            if not queue:
+                del self.waiting[channel]
+
+    def release(self) -> None:
+        while self.waiting:
+            # Serve the channel at the front, then send it to the back of the line
+            channel, queue = next(iter(self.waiting.items()))
+            fut = queue.popleft()
+            if queue:
+                self.waiting.move_to_end(channel)
+            else:
+                del self.waiting[channel]
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.free += 1
+
+    @asynccontextmanager
+    async def slot(self, channel: Any) -> AsyncIterator[None]:
+        await self.acquire(channel)
+        try:
+            await self.gate.wait()
+            yield
+        finally:
+            self.release()
@@ -0,0 +1,96 @@
+# clip_cache.py
+# Content-addressed index of clips we have already produced, so re-processing
+# a message (last_id reset, edited post, forwarded repost of the same file)
+# does not download, upload and transcribe the same audio again.
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+CACHE_DB = os.getenv("CLIP_CACHE_DB", "clip_cache.db")
+CACHE_MAX_ENTRIES = int(os.getenv("CLIP_CACHE_MAX_ENTRIES", 200000))
+
+UPLOADED = "uploaded"
+TRANSCRIBED = "transcribed"
+SKIPPED = "skipped"    # too short to become a clip; nothing to redo
+_RANK = {None: 0, UPLOADED: 1, TRANSCRIBED: 2, SKIPPED: 2}
+
+
+def clip_id(document_id: int, start_ms: int, end_ms: Optional[int]) -> str:
+    """
+    A Telegram document never changes, so (document id, range) pins down the
+    exact clip bytes. end_ms is None for the last clip, which runs to the end.
+    """
+    raw = f"{document_id}:{start_ms}:{'end' if end_ms is None else end_ms}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+class ClipCache:
+    """
+    SQLite index of clip id -> state, S3 key and Transcribe job name. Holds
+    at most max_entries rows, evicting the least recently used.
+    """
+
+    def __init__(self, path: str = CACHE_DB, max_entries: int = CACHE_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS clips (
+                    clip_id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    s3_key TEXT,
+                    job_name TEXT,
+                    size INTEGER,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self.db.execute("CREATE INDEX IF NOT EXISTS clips_lru ON clips (last_used)")
+            # Counted once; mark() and _evict() keep it current
+            self.count = self.db.execute("SELECT COUNT(*) FROM clips").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, clip_ids: Iterable[str]) -> Dict[str, dict]:
+        clip_ids = list(clip_ids)
+        if not clip_ids:
+            return {}
+        marks = ",".join("?" * len(clip_ids))
+        with self.lock, self.db:
+            rows = self.db.execute(f"SELECT clip_id, state, s3_key, job_name FROM clips WHERE clip_id IN ({marks})",
+                                   clip_ids).fetchall()
+            self.db.execute(f"UPDATE clips SET last_used = ? WHERE clip_id IN ({marks})", [time.time(), *clip_ids])
+        found = {row[0]: {"state": row[1], "s3_key": row[2], "job_name": row[3]} for row in rows}
+        self.hits += len(found)
+        self.misses += len(clip_ids) - len(found)
+        return found
+
+    def is_done(self, clip_ids: Iterable[str], need: str = TRANSCRIBED) -> bool:
+        clip_ids = list(clip_ids)
+        found = self.lookup(clip_ids)
+        return bool(clip_ids) and all(_RANK[found.get(c, {}).get("state")] >= _RANK[need] for c in clip_ids)
+
+    def mark(self, clip_id_: str, state: str, s3_key: Optional[str] = None, job_name: Optional[str] = None,
+             size: Optional[int] = None) -> None:
+        with self.lock, self.db:
+            new = not self.db.execute("SELECT 1 FROM clips WHERE clip_id = ?", (clip_id_,)).fetchone()
+            self.db.execute("""
+                INSERT INTO clips (clip_id, state, s3_key, job_name, size, last_used) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(clip_id) DO UPDATE SET
+                    state = excluded.state,
+                    s3_key = COALESCE(excluded.s3_key, clips.s3_key),
+                    job_name = COALESCE(excluded.job_name, clips.job_name),
+                    size = COALESCE(excluded.size, clips.size),
+                    last_used = excluded.last_used
+            """, (clip_id_, state, s3_key, job_name, size, time.time()))
+            self._evict(self.count + new)
+
+    def _evict(self, count: int) -> None:
+        if count > self.max_entries:
+            count -= self.db.execute("DELETE FROM clips WHERE clip_id IN (SELECT clip_id FROM clips "
+                                     "ORDER BY last_used LIMIT ?)", (count - self.max_entries,)).rowcount
+        self.count = count
@@ -1,7 +1,16 @@
 import os
 import json
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import boto3
 import pymysql
+from botocore.config import Config
+
+import search_index
+import word_timings
+from metrics import log
 
 # Load environment variables
 DB_HOST = os.getenv("DB_HOST")
@@ -9,14 +18,19 @@ DB_USER = os.getenv("DB_USER")
 DB_PASS = os.getenv("DB_PASS")
 DB_NAME = os.getenv("DB_NAME")
 DB_PORT = int(os.getenv("DB_PORT", 3306))
+# A local SQLite file with a Question table instead of MySQL, for offline runs
+DB_SQLITE = os.getenv("DB_SQLITE")
+DB_DIALECT = "sqlite" if DB_SQLITE else "mysql"
 
 S3_BUCKET = os.getenv("S3_BUCKET", "telegram-qna-splits")
 S3_PREFIX = "transcripts/"   # Folder where transcript .json files live
-LOCAL_IMPORT_FOLDER = "dbIMPORT"
-
-os.makedirs(LOCAL_IMPORT_FOLDER, exist_ok=True)
+BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))  # rows per transaction
+FETCH_WORKERS = int(os.getenv("IMPORT_FETCH_WORKERS", 16))  # concurrent get_object calls
 
 def get_db_connection():
+    if DB_SQLITE:
+        # make_db_importer keeps one connection across its worker threads, one batch at a time
+        return sqlite3.connect(DB_SQLITE, check_same_thread=False)
     return pymysql.connect(
         host=DB_HOST,
         user=DB_USER,
@@ -27,6 +41,148 @@ def get_db_connection():
         cursorclass=pymysql.cursors.DictCursor
     )
 
+# Statements per backend; sqlite is only used as a local stand-in (benchmarks)
+SQL = {
+    "mysql": {
+        "create_manifest": """
+            CREATE TABLE IF NOT EXISTS ImportedTranscript (
+                S3Key VARCHAR(768) NOT NULL PRIMARY KEY,
+                ETag VARCHAR(64) NOT NULL,
+                ImportedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) CHARACTER SET utf8mb4
+        """,
+        "select_manifest": "SELECT S3Key, ETag FROM ImportedTranscript",
+        "select_questions": "SELECT Title, Date FROM Question",
+        "insert_question": "INSERT INTO Question (Title, Date, Transcription) VALUES (%s, %s, %s)",
+        "update_question": "UPDATE Question SET Transcription = %s WHERE Title = %s AND Date = %s",
+        "upsert_manifest": """
+            INSERT INTO ImportedTranscript (S3Key, ETag) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE ETag = VALUES(ETag), ImportedAt = CURRENT_TIMESTAMP
+        """,
+    },
+    "sqlite": {
+        "create_manifest": """
+            CREATE TABLE IF NOT EXISTS ImportedTranscript (
+                S3Key TEXT NOT NULL PRIMARY KEY,
+                ETag TEXT NOT NULL,
+                ImportedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """,
+        "select_manifest": "SELECT S3Key, ETag FROM ImportedTranscript",
+        "select_questions": "SELECT Title, Date FROM Question",
+        "insert_question": "INSERT INTO Question (Title, Date, Transcription) VALUES (?, ?, ?)",
+        "update_question": "UPDATE Question SET Transcription = ? WHERE Title = ? AND Date = ?",
+        "upsert_manifest": """
+            INSERT INTO ImportedTranscript (S3Key, ETag) VALUES (?, ?)
+            ON CONFLICT(S3Key) DO UPDATE SET ETag = excluded.ETag, ImportedAt = CURRENT_TIMESTAMP
+        """,
+    },
+}
+
+class TranscriptWriter:
+    """
+    Batches Question rows into one transaction per BATCH_SIZE transcripts.
+    Every imported S3 key is recorded with its ETag in ImportedTranscript,
+    so a re-run skips unchanged files and only updates re-transcribed ones.
+    A key missing from the manifest (every key, the first time) updates the
+    Question row with its Title and Date if there is one, and is only
+    inserted if there is not: existing (Title, Date) pairs are read once.
+    With a search_index.SearchIndex, each batch is indexed once it commits;
+    with a word_timings.WordTimingStore, the word timings of its transcripts
+    are written then too.
+    """
+
+    def __init__(self, connection, dialect=DB_DIALECT, batch_size=BATCH_SIZE, index=None, timings=None):
+        self.connection = connection
+        self.index = index
+        self.timings = timings
+        self.timing_rows = []
+        self.sql = SQL[dialect]
+        self.batch_size = batch_size
+        self.new_rows = []
+        self.changed_rows = []
+        self.manifest_rows = []
+        self.inserted = 0
+        self.updated = 0
+        self.skipped = 0
+        cursor = connection.cursor()
+        cursor.execute(self.sql["create_manifest"])
+        cursor.execute(self.sql["select_manifest"])
+        self.imported = {}
+        for row in cursor.fetchall():
+            key, etag = (row["S3Key"], row["ETag"]) if isinstance(row, dict) else row
+            self.imported[key] = etag
+        cursor.execute(self.sql["select_questions"])
+        self.questions = set()
+        for row in cursor.fetchall():
+            title, date = (row["Title"], row["Date"]) if isinstance(row, dict) else row
+            self.questions.add((title, str(date)))
+        cursor.close()
+        connection.commit()
+
+    def is_imported(self, key, etag):
+        if self.imported.get(key) == etag:
+            self.skipped += 1
+            return True
+        return False
+
+    def add(self, key, etag, title, date, transcription, items=None):
+        # Empty transcripts only go into the manifest, so they are not fetched again
+        if transcription:
+            if key in self.imported or (title, str(date)) in self.questions:
+                self.changed_rows.append((transcription, title, date))
+            else:
+                self.new_rows.append((title, date, transcription))
+                self.questions.add((title, str(date)))
+            if self.index:
+                self.index.add(title, date, transcription)
+            if self.timings and items:
+                # Packed right away so the JSON items are not held until the batch commits
+                self.timing_rows.append((title, date, self.timings.encode(transcription, items)))
+        self.manifest_rows.append((key, etag))
+        self.imported[key] = etag
+        if len(self.manifest_rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.manifest_rows:
+            return
+        cursor = self.connection.cursor()
+        try:
+            if self.new_rows:
+                cursor.executemany(self.sql["insert_question"], self.new_rows)
+            if self.changed_rows:
+                cursor.executemany(self.sql["update_question"], self.changed_rows)
+            cursor.executemany(self.sql["upsert_manifest"], self.manifest_rows)
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            for key, _ in self.manifest_rows:
+                self.imported.pop(key, None)
+            for title, date, _ in self.new_rows:
+                self.questions.discard((title, str(date)))
+            if self.index:
+                self.index.discard()
+            self.timing_rows = []
+            raise
+        finally:
+            cursor.close()
+        if self.index:
+            try:
+                self.index.flush()
+            except Exception as e:
+                # The rows are in; the index can catch up with search_index.py --rebuild
+                self.index.discard()
+                log(f"⚠️ Search index update failed: {e}", level="warning", error=repr(e))
+        for title, date, data in self.timing_rows:
+            self.timings.write(title, date, data)
+        self.timing_rows = []
+        self.inserted += len(self.new_rows)
+        self.updated += len(self.changed_rows)
+        log(f"Committed batch: {len(self.new_rows)} inserted, {len(self.changed_rows)} updated",
+            inserted=len(self.new_rows), updated=len(self.changed_rows))
+        self.new_rows, self.changed_rows, self.manifest_rows = [], [], []
+
 def clean_transcription_text(transcript_json):
     """
     Extracts only the readable transcription body text from AWS Transcribe JSON.
@@ -39,7 +195,7 @@ def clean_transcription_text(transcript_json):
             # Remove any redundant whitespace
             return " ".join(text.split())
     except Exception as e:
-        print(f"[WARN] Could not parse transcription: {e}")
+        log(f"⚠️ Could not parse transcription: {e}", level="warning", error=repr(e))
     return ""
 
 def extract_title_and_date(filename):
@@ -64,51 +220,117 @@ def extract_title_and_date(filename):
     title_part = title_part.replace("_", " ").strip()
     return title_part, date_part
 
-def main():
-    print("Fetching list of transcript files from S3...")
-    s3 = boto3.client("s3")
+def iter_transcript_objects(s3, bucket=S3_BUCKET, prefix=S3_PREFIX):
+    """
+    Yields every .json object under the prefix, following list_objects_v2
+    continuation tokens past the 1000-key page limit.
+    """
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            if obj["Key"].endswith(".json"):
+                yield obj
 
-    response = s3.list_objects_v2(Bucket=S3_BUCKET, Prefix=S3_PREFIX)
-    if "Contents" not in response:
-        print("No transcript files found in S3.")
-        return
+def fetch_transcript(s3, key, bucket=S3_BUCKET):
+    body = s3.get_object(Bucket=bucket, Key=key)["Body"]
+    try:
+        return json.loads(body.read())
+    finally:
+        body.close()
 
-    connection = get_db_connection()
-    cursor = connection.cursor()
+def add_transcript(writer, key, etag, data):
+    filename = os.path.basename(key)
+    transcription = clean_transcription_text(data).strip()
+    title, date = extract_title_and_date(filename)
+    if not transcription:
+        log(f"⏭️ Empty transcription for {filename}", key=key)
+    writer.add(key, etag, title, date, transcription, data.get("results", {}).get("items"))
 
-    for obj in response["Contents"]:
-        key = obj["Key"]
-        if not key.endswith(".json"):
-            continue
+def import_transcripts(s3, writer, bucket=S3_BUCKET, prefix=S3_PREFIX, workers=FETCH_WORKERS):
+    """
+    Lists the prefix and fetches new transcripts straight into memory on a
+    pool of `workers` threads. Parsed transcripts come back through a bounded
+    queue to this thread, which cleans them and hands them to the writer.
+    Returns the number of objects that could not be fetched.
+    """
+    results = queue.Queue(maxsize=workers * 4)
+    # Held from submit until this thread has written the body, so it caps
+    # fetched-but-unwritten bodies (and the queue never fills)
+    slots = threading.BoundedSemaphore(workers * 2)
+    finished = object()
 
-        filename = os.path.basename(key)
-        local_path = os.path.join(LOCAL_IMPORT_FOLDER, filename)
+    def fetch(key, etag):
+        try:
+            results.put((key, etag, fetch_transcript(s3, key, bucket), None))
+        except Exception as e:
+            results.put((key, etag, None, e))
 
-        print(f"Downloading {filename}...")
-        s3.download_file(S3_BUCKET, key, local_path)
+    def produce():
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for obj in iter_transcript_objects(s3, bucket, prefix):
+                    key, etag = obj["Key"], obj["ETag"].strip('"')
+                    if writer.is_imported(key, etag):
+                        continue
+                    slots.acquire()
+                    pool.submit(fetch, key, etag)
+        except Exception as e:
+            results.put((None, None, None, e))
+        results.put(finished)
 
-        with open(local_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+    threading.Thread(target=produce, name="s3-lister", daemon=True).start()
 
-        transcription = clean_transcription_text(data)
-        title, date = extract_title_and_date(filename)
+    failed = 0
+    while True:
+        item = results.get()
+        if item is finished:
+            break
+        key, etag, data, error = item
+        if key is None:
+            raise error
+        try:
+            if error:
+                log(f"⚠️ Could not fetch {key}: {error}", level="warning", key=key, error=repr(error))
+                failed += 1
+                continue
+            add_transcript(writer, key, etag, data)
+        finally:
+            slots.release()
 
-        if not transcription.strip():
-            print(f"[SKIP] Empty transcription for {filename}")
-            continue
+    writer.flush()
+    return failed
 
-        sql = """
-            INSERT INTO Question (Title, Date, Transcription)
-            VALUES (%s, %s, %s)
-        """
-        cursor.execute(sql, (title, date, transcription))
-        connection.commit()
+def import_keys(s3, writer, keys, bucket=S3_BUCKET):
+    """
+    Imports specific transcripts, e.g. the ones a Transcribe job just wrote.
+    Each key's ETag is checked against the manifest with head_object first,
+    so transcripts already imported are not downloaded again.
+    """
+    for key in keys:
+        if writer.is_imported(key, s3.head_object(Bucket=bucket, Key=key)["ETag"].strip('"')):
+            continue
+        obj = s3.get_object(Bucket=bucket, Key=key)
+        try:
+            # The body's own ETag, in case the file was rewritten since the HEAD
+            add_transcript(writer, key, obj["ETag"].strip('"'), json.loads(obj["Body"].read()))
+        finally:
+            obj["Body"].close()
+    writer.flush()
 
-        print(f"Inserted: {title} ({date})")
+def main():
+    log("Fetching list of transcript files from S3...")
+    s3 = boto3.client("s3", config=Config(max_pool_connections=FETCH_WORKERS))
 
-    cursor.close()
+    connection = get_db_connection()
+    index = search_index.open_index()
+    writer = TranscriptWriter(connection, index=index, timings=word_timings.open_store())
+    failed = import_transcripts(s3, writer)
     connection.close()
-    print("All files processed and inserted successfully.")
+    if index:
+        index.close()
+    log(f"All files processed: {writer.inserted} inserted, {writer.updated} updated, "
+        f"{writer.skipped} already imported, {failed} failed.", inserted=writer.inserted, updated=writer.updated,
+        skipped=writer.skipped, failed=failed)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,157 @@
+# metrics.py
+# In-process counters, gauges and timings for every stage of the scraper,
+# exported as a JSON-lines file and/or a Prometheus text endpoint, plus
+# log() for structured log lines.
+#
+#   METRICS_FILE=metrics.jsonl   append a snapshot every METRICS_INTERVAL seconds (off by default)
+#   METRICS_PORT=9108            serve /metrics in Prometheus text format (0 to disable)
+#   LOG_FORMAT=json              one JSON object per log line instead of plain text
+
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", 15))
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+Labels = Tuple[Tuple[str, str], ...]
+Key = Tuple[str, Labels]
+
+
+def _key(name: str, labels: Dict) -> Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    """
+    Counters only go up, gauges hold the last value set, and timings keep
+    count, sum and max (seconds, or any other observed value). Collectors are
+    called at export time for values that are cheaper to read than to track.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.counters: Dict[Key, float] = {}
+        self.gauges: Dict[Key, float] = {}
+        self.timings: Dict[Key, List[float]] = {}
+        self.collectors: List[Callable[[], None]] = []
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self.lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        with self.lock:
+            timing = self.timings.get(key)
+            if timing is None:
+                self.timings[key] = [1, value, value]
+            else:
+                timing[0] += 1
+                timing[1] += value
+                timing[2] = max(timing[2], value)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def add_collector(self, collect: Callable[[], None]) -> None:
+        self.collectors.append(collect)
+
+    def _collect(self) -> None:
+        for collect in self.collectors:
+            try:
+                collect()
+            except Exception as e:
+                log(f"⚠️ Metrics collector failed: {e}", level="warning")
+
+    def snapshot(self) -> Dict:
+        self._collect()
+        with self.lock:
+            return {
+                "ts": round(time.time(), 3),
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self.counters.items()],
+                "gauges": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self.gauges.items()],
+                "timings": [{"name": n, "labels": dict(l), "count": c, "sum": round(s, 6), "max": round(m, 6)}
+                            for (n, l), (c, s, m) in self.timings.items()],
+            }
+
+    def write_jsonl(self, path: str) -> None:
+        with open(path, "a") as f:
+            f.write(json.dumps(self.snapshot()) + "\n")
+
+    def prometheus(self) -> str:
+        snap = self.snapshot()
+        families: Dict[str, List[str]] = {}
+
+        def sample(name, kind, labels, value):
+            # Samples of one metric have to follow its TYPE line
+            lines = families.setdefault(name, [f"# TYPE {name} {kind}"])
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        for c in snap["counters"]:
+            sample(c["name"], "counter", c["labels"], c["value"])
+        for g in snap["gauges"]:
+            sample(g["name"], "gauge", g["labels"], g["value"])
+        for t in snap["timings"]:
+            sample(t["name"] + "_count", "counter", t["labels"], t["count"])
+            sample(t["name"] + "_sum", "counter", t["labels"], t["sum"])
+            sample(t["name"] + "_max", "gauge", t["labels"], t["max"])
+        return "\n".join(line for lines in families.values() for line in lines) + "\n"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = self.prometheus().encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                         + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, path: Optional[str] = METRICS_FILE, port: int = METRICS_PORT,
+                    interval: float = METRICS_INTERVAL) -> None:
+        """Runs the exporters until cancelled; the file gets a final snapshot on the way out."""
+        server = await asyncio.start_server(self._handle, port=port) if port else None
+        if server:
+            log(f"📈 Serving metrics on :{port}/metrics", port=port)
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                if path:
+                    self.write_jsonl(path)
+        finally:
+            if path:
+                self.write_jsonl(path)
+            if server:
+                server.close()
+
+
+metrics = Metrics()
+
+
+def log(message: str, level: str = "info", **fields) -> None:
+    """Plain text by default; with LOG_FORMAT=json the fields are kept as JSON keys."""
+    if LOG_FORMAT == "json":
+        print(json.dumps({"ts": round(time.time(), 3), "level": level, "msg": message, **fields},
+                         ensure_ascii=False, default=str))
+    else:
+        print(message)
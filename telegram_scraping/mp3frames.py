@@ -0,0 +1,200 @@
+# mp3frames.py
+# Minimal MPEG audio frame scanner. Only headers are parsed, so cutting a
+# recording at frame boundaries needs neither a decoder nor the whole file in RAM.
+
+from collections import namedtuple
+from typing import BinaryIO, Dict, List, Optional, Sequence, Tuple
+
+READ_CHUNK = 256 * 1024
+
+Frame = namedtuple("Frame", "offset size start_ms duration_ms")
+
+# kbps, indexed by [version_is_mpeg1][layer][bitrate_index]
+_BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+# Hz, indexed by version bits (0 = MPEG2.5, 2 = MPEG2, 3 = MPEG1)
+_SAMPLE_RATES = {0: (11025, 12000, 8000), 2: (22050, 24000, 16000), 3: (44100, 48000, 32000)}
+
+
+def parse_header(buf, pos: int) -> Optional[Tuple[int, int, int]]:
+    """
+    Returns (frame_size, samples_per_frame, sample_rate) for the header at pos,
+    or None if the four bytes there are not a usable frame header.
+    """
+    b0, b1, b2 = buf[pos], buf[pos + 1], buf[pos + 2]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = (b1 >> 3) & 3
+    layer = 4 - ((b1 >> 1) & 3)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 1
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, 384, sample_rate
+    if layer == 2 or mpeg1:
+        return 144 * bitrate // sample_rate + padding, 1152, sample_rate
+    return 72 * bitrate // sample_rate + padding, 576, sample_rate
+
+
+def _id3_size(buf) -> int:
+    # ID3v2: "ID3", version (2), flags (1), syncsafe size (4)
+    size = (buf[6] << 21) | (buf[7] << 14) | (buf[8] << 7) | buf[9]
+    footer = 10 if buf[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _is_info_frame(buf, pos: int, size: int) -> bool:
+    head = bytes(buf[pos:pos + min(size, 64)])
+    return b"Xing" in head or b"Info" in head or b"VBRI" in head
+
+
+class FrameScanner:
+    """
+    Incremental frame scanner: feed it the stream in any chunking and it
+    returns the frames that are complete so far, with their absolute offsets
+    and start times. A leading ID3v2 tag and Xing/Info frame are skipped.
+    """
+
+    def __init__(self) -> None:
+        self.buf = bytearray()
+        self.base = 0          # absolute offset of buf[0]
+        self.elapsed_ms = 0.0
+        self.skip = 0
+        self.started = False
+        self.synced = False
+
+    def feed(self, data: bytes, final: bool = False) -> List[Frame]:
+        self.buf += data
+        buf = self.buf
+        pos = 0
+        frames = []
+
+        if self.skip:
+            pos = min(self.skip, len(buf))
+            self.skip -= pos
+        if not self.started:
+            if len(buf) - pos < 10 and not final:
+                return self._consume(pos, frames)
+            if bytes(buf[pos:pos + 3]) == b"ID3" and len(buf) - pos >= 10:
+                tag = _id3_size(buf[pos:pos + 10])
+                step = min(tag, len(buf) - pos)
+                pos += step
+                self.skip = tag - step
+                if self.skip:
+                    return self._consume(pos, frames)
+            self.started = True
+
+        while pos + 4 <= len(buf):
+            header = parse_header(buf, pos)
+            if header is None:
+                self.synced = False
+                pos += 1
+                continue
+            size, samples, sample_rate = header
+            if pos + size > len(buf):
+                break
+            if not self.synced:
+                # After losing sync, only trust a header that is followed by another one
+                nxt = pos + size
+                if nxt + 4 > len(buf):
+                    if not final:
+                        break
+                elif parse_header(buf, nxt) is None:
+                    pos += 1
+                    continue
+                self.synced = True
+                if not frames and self.elapsed_ms == 0 and _is_info_frame(buf, pos, size):
+                    pos += size
+                    continue
+            duration = samples * 1000.0 / sample_rate
+            frames.append(Frame(self.base + pos, size, self.elapsed_ms, duration))
+            self.elapsed_ms += duration
+            pos += size
+        return self._consume(pos, frames)
+
+    def _consume(self, pos: int, frames: List[Frame]) -> List[Frame]:
+        del self.buf[:pos]
+        self.base += pos
+        return frames
+
+
+def iter_frames(f: BinaryIO, chunk_size: int = READ_CHUNK):
+    scanner = FrameScanner()
+    while True:
+        data = f.read(chunk_size)
+        yield from scanner.feed(data or b"", final=not data)
+        if not data:
+            break
+
+
+def scan_cut_points(path: str, boundaries_ms: Sequence[int]) -> Tuple[Dict[int, int], float, int]:
+    """
+    One pass over the file. Returns ({boundary_ms: offset of first frame at or
+    after it}, total duration in ms, offset just past the last frame).
+    Boundaries past the end of the audio map to the end offset.
+    """
+    pending = sorted(set(boundaries_ms))
+    cuts = {}
+    duration_ms = 0.0
+    end = 0
+    with open(path, "rb") as f:
+        for frame in iter_frames(f):
+            while pending and frame.start_ms >= pending[0]:
+                cuts[pending.pop(0)] = frame.offset
+            duration_ms = frame.start_ms + frame.duration_ms
+            end = frame.offset + frame.size
+    for b in pending:
+        cuts[b] = end
+    return cuts, duration_ms, end
+
+
+def copy_range(src_path: str, start: int, end: int, out_path: str, chunk_size: int = READ_CHUNK) -> int:
+    remaining = end - start
+    with open(src_path, "rb") as src, open(out_path, "wb") as out:
+        src.seek(start)
+        while remaining > 0:
+            data = src.read(min(chunk_size, remaining))
+            if not data:
+                break
+            out.write(data)
+            remaining -= len(data)
+    return end - start - remaining
+
+
+def scan_seek_table(path: str, boundaries_ms: Sequence[int],
+                    interval_ms: float) -> Tuple[Dict[int, Tuple[int, float]], List[Tuple[float, int]], float, int]:
+    """
+    Like scan_cut_points, but each boundary maps to (offset, start_ms) of its
+    first frame, and every interval_ms of audio also yields a (start_ms,
+    offset) seek point, from the first frame on.
+    """
+    pending = sorted(set(boundaries_ms))
+    cuts = {}
+    seek = []
+    next_seek = 0.0
+    duration_ms = 0.0
+    end = 0
+    with open(path, "rb") as f:
+        for frame in iter_frames(f):
+            while pending and frame.start_ms >= pending[0]:
+                cuts[pending.pop(0)] = (frame.offset, frame.start_ms)
+            if frame.start_ms >= next_seek:
+                seek.append((frame.start_ms, frame.offset))
+                while next_seek <= frame.start_ms:
+                    next_seek += interval_ms
+            duration_ms = frame.start_ms + frame.duration_ms
+            end = frame.offset + frame.size
+    for b in pending:
+        cuts[b] = (end, duration_ms)
+    return cuts, seek, duration_ms, end
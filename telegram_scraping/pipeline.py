@@ -0,0 +1,120 @@
+# pipeline.py
+# Staged asyncio pipeline: each stage has its own workers and a bounded inbox,
+# so a full downstream queue pauses the stages feeding it (backpressure).
+
+import asyncio
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from metrics import log, metrics
+
+
+class Stage:
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[Any]], workers: int = 1,
+                 queue_size: int = 2) -> None:
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+
+
+class CompletionTracker:
+    """
+    Keeps items in the order they were fetched and reports the key of the last
+    item whose predecessors have all finished every stage. A failed item holds
+    the watermark in place so it gets picked up again on the next run, unless
+    hold_failed is off because failures are retried some other way.
+    """
+
+    def __init__(self, on_advance: Optional[Callable[[Any], None]] = None, hold_failed: bool = True) -> None:
+        self.on_advance = on_advance
+        self.hold_failed = hold_failed
+        self.keys: Dict[int, Any] = {}
+        self.finished: Dict[int, bool] = {}
+        self.next_seq = 0
+        self.low = 0
+        self.watermark = None
+        self.failed = 0
+
+    def register(self, key: Any) -> int:
+        seq = self.next_seq
+        self.next_seq += 1
+        self.keys[seq] = key
+        return seq
+
+    def finish(self, seq: int, ok: bool = True) -> None:
+        self.finished[seq] = ok
+        if not ok:
+            self.failed += 1
+        advanced = False
+        while self.low in self.finished and (self.finished[self.low] or not self.hold_failed):
+            del self.finished[self.low]
+            self.watermark = self.keys.pop(self.low)
+            self.low += 1
+            advanced = True
+        if advanced and self.on_advance:
+            self.on_advance(self.watermark)
+
+
+class Pipeline:
+    def __init__(self, stages: List[Stage], tracker: Optional[CompletionTracker] = None, name: str = "") -> None:
+        self.stages = stages
+        self.tracker = tracker or CompletionTracker()
+        self.name = name
+        self.queues: List[asyncio.Queue] = []
+
+    def depths(self) -> Dict[str, int]:
+        return {stage.name: queue.qsize() for stage, queue in zip(self.stages, self.queues)}
+
+    def _report_depths(self) -> None:
+        for stage, depth in self.depths().items():
+            metrics.set_gauge("stage_queue_depth", depth, pipeline=self.name, stage=stage)
+
+    async def _worker(self, stage: Stage, inbox: asyncio.Queue, outbox: Optional[asyncio.Queue]) -> None:
+        while True:
+            seq, item = await inbox.get()
+            try:
+                with metrics.timer("stage_seconds", pipeline=self.name, stage=stage.name):
+                    result = await stage.handler(item)
+            except Exception as e:
+                log(f"❌ Stage '{stage.name}' failed: {e}", level="error", stage=stage.name, error=repr(e))
+                metrics.inc("stage_items_total", pipeline=self.name, stage=stage.name, outcome="failed")
+                self.tracker.finish(seq, ok=False)
+                inbox.task_done()
+                continue
+            metrics.inc("stage_items_total", pipeline=self.name, stage=stage.name, outcome="ok")
+            if result is None or outbox is None:
+                self.tracker.finish(seq)
+            else:
+                await outbox.put((seq, result))
+            inbox.task_done()
+
+    async def run(self, source: AsyncIterable[Tuple[Any, Any]]) -> CompletionTracker:
+        """
+        Feeds (key, item) pairs from source through every stage. An item of None
+        (or a handler returning None) finishes that key without further work.
+        """
+        self.queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        metrics.add_collector(self._report_depths)
+        workers = []
+        for i, stage in enumerate(self.stages):
+            outbox = self.queues[i + 1] if i + 1 < len(self.queues) else None
+            for _ in range(stage.workers):
+                workers.append(asyncio.ensure_future(self._worker(stage, self.queues[i], outbox)))
+
+        try:
+            async for key, item in source:
+                seq = self.tracker.register(key)
+                if item is None:
+                    self.tracker.finish(seq)
+                    continue
+                await self.queues[0].put((seq, item))
+
+            # Drain stage by stage: once a queue is joined, everything it held
+            # has been handed to the next one.
+            for queue in self.queues:
+                await queue.join()
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return self.tracker
@@ -0,0 +1,86 @@
+# qna_parser.py
+# Parses a channel post in one go: is it a Q&A livestream post, which date
+# does it announce, and which (seconds, question) timestamps does it list.
+# Shared by scraping.py and scrapinglocal.py.
+
+import re
+from collections import namedtuple
+from typing import List, Optional, Tuple
+
+MARKER = "livestream counselling q&a timestamps"
+
+MONTHS = {
+    "January": "01", "February": "02", "March": "03", "April": "04", "May": "05",
+    "June": "06", "July": "07", "August": "08", "September": "09",
+    "October": "10", "November": "11", "December": "12"
+}
+
+TME_LINK = re.compile(r"https?://t\.me/\S+", re.IGNORECASE)
+DATE = re.compile(r"(" + "|".join(MONTHS) + r")\s+(\d{1,2})(?:st|nd|rd|th)?,\s*(\d{4})")
+_TIME = r"\d{1,2}:\d{2}(?::\d{2})?"
+# "0:00 - Question", "1:02:03 Question", "[1:02:03] Question", "(12:30) Question", "01:02 — Question"
+TIMESTAMP_LINE = re.compile(rf"^(?:\[({_TIME})\]|\(({_TIME})\)|({_TIME}))\s*[-–—]?\s*(.+)$")
+UNSAFE_FILENAME = re.compile(r'[<>:"/\\|?*\x00-\x1F]')
+
+ParsedMessage = namedtuple("ParsedMessage", "is_qna date items")
+
+
+def _seconds(time_str: str) -> int:
+    parts = time_str.split(":")
+    if len(parts) == 2:
+        return int(parts[0]) * 60 + int(parts[1])
+    return int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
+
+
+def _clean(text: str) -> str:
+    # Same result as collapsing \s+ with a regex: str.split() uses the same whitespace set
+    if "://" in text:
+        text = TME_LINK.sub("", text)
+    return " ".join(text.split())
+
+
+def parse_message(text: Optional[str], require_qna: bool = False) -> ParsedMessage:
+    """
+    t.me links are stripped once, and the cleaned text serves both the
+    marker check and the date search. Timestamps are matched on the original
+    lines, so links in question text survive. With require_qna, non-Q&A
+    posts return right after the marker check.
+    """
+    if not text:
+        return ParsedMessage(False, None, [])
+    # The marker contains "&" and stripping links never adds one
+    cleaned = _clean(text) if "&" in text or not require_qna else ""
+    is_qna = MARKER in cleaned.lower()
+    if require_qna and not is_qna:
+        return ParsedMessage(False, None, [])
+    m = DATE.search(cleaned)
+    date = f"{m.group(3)}-{m.group(2).zfill(2)}-{MONTHS[m.group(1)]}" if m else None
+    return ParsedMessage(is_qna, date, parse_timestamps(text))
+
+
+def is_qna_message(msg_text: Optional[str]) -> bool:
+    if not msg_text or "&" not in msg_text:
+        return False
+    return MARKER in _clean(msg_text).lower()
+
+
+def extract_date(text: str) -> Optional[str]:
+    """Date like "January 10th, 2025" as yyyy-dd-mm, the format used in clip names."""
+    m = DATE.search(_clean(text))
+    if not m:
+        return None
+    month, day, year = m.groups()
+    return f"{year}-{day.zfill(2)}-{MONTHS[month]}"
+
+
+def parse_timestamps(text: str) -> List[Tuple[int, str]]:
+    items = []
+    for m in map(TIMESTAMP_LINE.match, map(str.strip, text.splitlines())):
+        if m:
+            bracketed, parenthesized, bare, question = m.groups()
+            items.append((_seconds(bracketed or parenthesized or bare), question.strip()))
+    return items
+
+
+def sanitize_filename(name: str) -> str:
+    return UNSAFE_FILENAME.sub("_", name)[:180]
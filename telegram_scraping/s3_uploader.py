@@ -0,0 +1,88 @@
+# s3_uploader.py
+# Runs boto3 uploads on a thread pool so they never block the event loop
+# (and with it the Telegram connection), with retries and per-clip results.
+
+import asyncio
+import os
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Iterable, List, Optional, Tuple
+
+from boto3.s3.transfer import TransferConfig
+
+from metrics import log, metrics
+
+MB = 1024 * 1024
+
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", 8))
+UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", 4))
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 20
+
+# One multipart config for every upload in the process
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=int(os.getenv("S3_MULTIPART_THRESHOLD_MB", 16)) * MB,
+    multipart_chunksize=int(os.getenv("S3_MULTIPART_CHUNK_MB", 8)) * MB,
+    max_concurrency=int(os.getenv("S3_PART_CONCURRENCY", 4)),
+    use_threads=True,
+)
+
+UploadResult = namedtuple("UploadResult", "path key ok attempts seconds size error")
+
+
+class AsyncUploader:
+    """
+    Uploads files to one bucket with at most `concurrency` transfers in
+    flight. Failed attempts are retried with full-jitter exponential backoff;
+    every call returns an UploadResult instead of raising.
+    """
+
+    def __init__(self, s3_client, bucket: str, concurrency: int = UPLOAD_CONCURRENCY,
+                 retries: int = UPLOAD_RETRIES, config: TransferConfig = TRANSFER_CONFIG) -> None:
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.retries = max(1, retries)
+        self.config = config
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="s3-upload")
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.concurrency = concurrency
+
+    async def upload(self, path: str, key: str) -> UploadResult:
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        start = time.monotonic()
+        error = None
+        async with self.slots:
+            for attempt in range(1, self.retries + 1):
+                attempt_start = time.monotonic()
+                try:
+                    await loop.run_in_executor(self.executor, partial(
+                        self.s3.upload_file, path, self.bucket, key, Config=self.config))
+                    metrics.observe("s3_upload_seconds", time.monotonic() - attempt_start, outcome="ok")
+                    metrics.inc("s3_upload_bytes_total", size)
+                    log(f"✅ Uploaded to S3: s3://{self.bucket}/{key}", key=key, bytes=size,
+                        seconds=round(time.monotonic() - start, 3), attempts=attempt)
+                    return UploadResult(path, key, True, attempt, time.monotonic() - start, size, None)
+                except Exception as e:
+                    error = e
+                    metrics.observe("s3_upload_seconds", time.monotonic() - attempt_start, outcome="error")
+                    if attempt < self.retries:
+                        delay = random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+                        metrics.inc("s3_upload_retries_total")
+                        log(f"⚠️ Upload of {key} failed (attempt {attempt}), retrying in {delay:.1f}s: {e}",
+                            level="warning", key=key, attempt=attempt, error=repr(e))
+                        await asyncio.sleep(delay)
+        metrics.inc("s3_upload_failures_total")
+        log(f"❌ Failed to upload {path}: {error}", level="error", key=key, error=repr(error))
+        return UploadResult(path, key, False, self.retries, time.monotonic() - start, size, repr(error))
+
+    async def upload_many(self, items: Iterable[Tuple[str, str]]) -> List[UploadResult]:
+        return list(await asyncio.gather(*[self.upload(path, key) for path, key in items]))
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
@@ -1,15 +1,33 @@
+import io
 import os
 import json
 import re
 import time
 import asyncio
 import boto3
-from telethon import TelegramClient
-from FastTelethon import download_file
-from pydub import AudioSegment
-from dateutil import parser
+from datetime import datetime, timezone
+from telethon import TelegramClient, events, utils
+from telethon.errors import FloodWaitError
+from telethon.tl.types import InputMessagesFilterMusic, DocumentAttributeAudio
+import FastTelethon
+from FastTelethon import download_to_path, iter_download, upload_file, JOURNAL_SUFFIX
+from channel_scheduler import FloodGate, FairScheduler
+from metrics import log, metrics
+from pipeline import Pipeline, Stage, CompletionTracker
+from sender_pool import SenderPool, MAX_POOL_CONNECTIONS
+from splitter import split_file, StreamingSplitter
+from s3_uploader import AsyncUploader
+from transcribe_tracker import JobStore, TranscribeTracker, make_db_importer
+from transcribe_batch import (plan_batches, batch_job_name, batch_media_key, batch_transcript_key, concat_clips,
+                              make_parts, TRANSCRIBE_BATCH_SECONDS)
+from virtual_clips import parse_range_key, VIRTUAL_CLIPS
+import virtual_clips
+from qna_parser import parse_message, sanitize_filename
+from clip_cache import ClipCache, clip_id, UPLOADED, TRANSCRIBED, SKIPPED
+from state_store import StateStore, RUNNING, DONE, FAILED
+from transfer_tuning import MAX_UPLOAD_CONNECTIONS
+import state_store
 import sys
-import random
 
 # UTF-8 stdout for Docker logs
 sys.stdout.reconfigure(encoding='utf-8')
@@ -18,39 +36,99 @@ sys.stdout.reconfigure(encoding='utf-8')
 ENABLE_TRANSCRIBE = True  # 🔄 Toggle this ON/OFF if needed
 MIN_CLIP_MS = 5000        # ⏱️ Minimum clip length for transcription (5 seconds)
 
+# Channels scraped together over one client (comma separated)
+CHANNEL_URLS = [url.strip() for url in os.getenv("TELEGRAM_CHANNEL_URLS", "").split(",") if url.strip()]
+LEGACY_CHANNEL_URL = os.getenv("TELEGRAM_CHANNEL_URL", "https://t.me/devtestingchannel")
+# Also post every new clip to this Telegram channel, next to S3
+MIRROR_CHANNEL_URL = os.getenv("MIRROR_CHANNEL_URL")
+# Each mirror upload holds up to MAX_UPLOAD_CONNECTIONS pooled senders; by default they get half the pool
+MIRROR_UPLOADS = int(os.getenv("MIRROR_UPLOADS", max(1, MAX_POOL_CONNECTIONS // 2 // MAX_UPLOAD_CONNECTIONS)))
+
+# Workers per pipeline stage and the size of the queue in front of each stage.
+# DOWNLOAD_WORKERS is shared by all channels; each channel uses at most its budget.
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", 2))
+CHANNEL_DOWNLOAD_BUDGET = int(os.getenv("CHANNEL_DOWNLOAD_BUDGET", DOWNLOAD_WORKERS))
+SPLIT_WORKERS = int(os.getenv("SPLIT_WORKERS", 2))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", 4))
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", 2))
+STAGE_QUEUE_SIZE = int(os.getenv("STAGE_QUEUE_SIZE", 2))
+
+# "copy" cuts MP3 frames as-is, "reencode" re-encodes each clip on a process pool
+SPLIT_MODE = os.getenv("SPLIT_MODE", "copy")
+SPLIT_PROCESSES = int(os.getenv("SPLIT_PROCESSES", 0)) or None  # default: one per core
+# Cut and upload clips while the MP3 is still downloading (frame-copy clips only).
+# VIRTUAL_CLIPS (see virtual_clips.py) needs the whole recording and turns this off.
+STREAM_SPLIT = os.getenv("STREAM_SPLIT", "0") == "1"
+
+# Import transcripts into the DB as soon as their Transcribe job finishes
+IMPORT_ON_COMPLETE = os.getenv("IMPORT_ON_COMPLETE", "1") == "1"
+# Keep polling after the scrape until every Transcribe job has finished
+WAIT_FOR_TRANSCRIPTS = os.getenv("WAIT_FOR_TRANSCRIPTS", "0") == "1"
+# Only re-run messages that failed or were interrupted, without scanning the channel
+RETRY_FAILED = "--retry-failed" in sys.argv
+# "music" asks Telegram for audio posts only; "all" walks every message in the channel
+SCAN_FILTER = os.getenv("SCAN_FILTER", "music")
+SCAN_WAIT_TIME = float(os.getenv("SCAN_WAIT_TIME", 0))  # pause between history requests
+# Keep running and process posts as they are published or edited
+DAEMON = "--daemon" in sys.argv or os.getenv("DAEMON", "0") == "1"
+
 # === ENVIRONMENT VARIABLES ===
-api_id = int(os.getenv("TELEGRAM_API_ID"))
-api_hash = os.getenv("TELEGRAM_API_HASH")
 aws_region = os.getenv("AWS_DEFAULT_REGION") or "us-east-1"
 s3_bucket = os.getenv("S3_BUCKET", "telegram-qna-splits")
 
-client = TelegramClient('anon', api_id, api_hash)
-s3 = boto3.client('s3', region_name=aws_region)
-transcribe = boto3.client('transcribe', region_name=aws_region)
-
-STATE_FILE = "last_id.json"
+# Set by setup(), so importing this module needs no credentials, network or state files
+client = None
+s3 = None
+transcribe = None
+uploader = None
+job_store = None
+clip_cache = None
+state = None
+flood_gate = FloodGate()
+mirror_channel = None
+mirror_slots = asyncio.Semaphore(MIRROR_UPLOADS)
+download_slots = FairScheduler(DOWNLOAD_WORKERS, flood_gate)
+
+LEGACY_STATE_FILE = "last_id.json"  # read once to seed the state store's cursor
 DOWNLOADS_DIR = "downloads"
 SPLIT_DIR = "splits"
 
 
-# === STATE HANDLERS ===
-def get_last_id():
-    if os.path.exists(STATE_FILE):
-        return json.load(open(STATE_FILE)).get("last_id", 0)
-    return 0
+def setup(telegram=None, s3_client=None, transcribe_client=None, jobs=None, cache=None, scrape_state=None):
+    """
+    Creates the clients and stores the scraper runs on. Whatever is passed
+    in is used instead, e.g. the stand-ins in benchmarks/pipeline.py.
+    """
+    global client, s3, transcribe, uploader, job_store, clip_cache, state
+    client = telegram or TelegramClient('anon', int(os.getenv("TELEGRAM_API_ID")), os.getenv("TELEGRAM_API_HASH"))
+    s3 = s3_client or boto3.client('s3', region_name=aws_region)
+    transcribe = transcribe_client or boto3.client('transcribe', region_name=aws_region)
+    uploader = AsyncUploader(s3, s3_bucket)
+    job_store = jobs or JobStore()
+    clip_cache = cache or ClipCache()
+    state = scrape_state or StateStore()
+    if flood_gate.trip not in FastTelethon.flood_wait_hooks:
+        FastTelethon.flood_wait_hooks.append(flood_gate.trip)
 
 
-def save_last_id(last_id):
-    json.dump({"last_id": last_id}, open(STATE_FILE, "w"))
+# === STATE HANDLERS ===
+def get_legacy_last_id():
+    if os.path.exists(LEGACY_STATE_FILE):
+        return json.load(open(LEGACY_STATE_FILE)).get("last_id", 0)
+    return 0
 
 
 def clean_local_folders():
     for folder in [DOWNLOADS_DIR, SPLIT_DIR]:
-        for f in os.listdir(folder):
+        files = os.listdir(folder)
+        for f in files:
+            # Keep interrupted downloads (and their part journals) so they can resume
+            if f.endswith(JOURNAL_SUFFIX) or f + JOURNAL_SUFFIX in files:
+                continue
             try:
                 os.remove(os.path.join(folder, f))
             except Exception as e:
-                print(f"⚠️ Could not delete {f}: {e}")
+                log(f"⚠️ Could not delete {f}: {e}", level="warning", path=f, error=repr(e))
 
 
 # === HELPERS ===
@@ -71,152 +149,623 @@ timer = Timer()
 
 async def progress_bar(current, total, fname):
     if timer.can_send():
-        print(f"{fname}: {current * 100 / total:.1f}%")
+        log(f"{fname}: {current * 100 / total:.1f}%", file=fname, bytes=current, total=total)
 
 
-def is_qna_message(msg_text: str) -> bool:
-    if not msg_text:
+def start_transcribe_job(s3_uri, job_name, s3_key, parts=None):
+    # A combined job (parts given) writes outside transcripts/ and is split before import
+    transcript_key = batch_transcript_key(job_name) if parts else f"transcripts/{job_name}.json"
+    try:
+        with metrics.timer("transcribe_call_seconds", call="start_transcription_job"):
+            transcribe.start_transcription_job(
+                TranscriptionJobName=job_name,
+                Media={"MediaFileUri": s3_uri},
+                MediaFormat="mp3",
+                OutputBucketName=s3_bucket,
+                OutputKey=transcript_key,
+                IdentifyMultipleLanguages=True,
+                LanguageOptions=["en-US", "ar-SA"],
+            )
+        if parts:
+            job_store.add_batch(job_name, s3_key, transcript_key, parts)
+        else:
+            job_store.add(job_name, s3_key, transcript_key)
+        metrics.inc("transcribe_jobs_started_total")
+        log(f"🎧 Started Transcribe job: {job_name}", job=job_name, key=s3_key)
+        return True
+    except transcribe.exceptions.ConflictException:
+        # Job names are deterministic, so this clip was already sent to Transcribe
+        log(f"♻️ Transcribe job already exists: {job_name}", job=job_name)
+        return True
+    except Exception as e:
+        metrics.inc("transcribe_start_failures_total")
+        log(f"⚠️ Could not start transcription job for {s3_uri}: {e}", level="warning", job=job_name,
+            error=repr(e))
         return False
-    cleaned = re.sub(r"https?://t\.me/\S+", "", msg_text, flags=re.IGNORECASE)
-    cleaned = re.sub(r"\s+", " ", cleaned).strip()
-    return "livestream counselling q&a timestamps" in cleaned.lower()
 
 
-def extract_date(text: str) -> str:
-    text = re.sub(r"https?://t\.me/\S+", "", text)
-    text = text.replace("\n", " ").strip()
-    m = re.search(
-        r"(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{1,2})(?:st|nd|rd|th)?,\s*(\d{4})",
-        text,
+# === PIPELINE STAGES ===
+class QnaJob:
+    def __init__(self, message, ts_items, date_str):
+        self.message = message
+        self.channel = message.chat_id
+        self.ts_items = ts_items
+        self.date_str = date_str
+        self.fname = f"{date_str}.mp3"
+        self.path = os.path.join(DOWNLOADS_DIR, f"{message.id}-{self.fname}")
+        self.clips = []  # (q_name, out_path, s3_key, clip_id); virtual clips have no out_path
+        self.clip_ms = {}  # clip_id -> length
+        self.virtual = {}  # clip_id -> VirtualClip
+        self.duration_ms = 0
+        self.source_key = virtual_clips.source_key(date_str, message.document.id)
+        self.uploaded = []  # the clips that are in S3
+        self.failed_clips = 0
+        self.streamed = False
+        # Cache ids of every planned clip; the last one runs to the end of the file
+        doc_id = message.document.id
+        self.clip_ids = {}
+        for idx, (start_sec, question) in enumerate(ts_items):
+            end_ms = ts_items[idx + 1][0] * 1000 if idx + 1 < len(ts_items) else None
+            self.clip_ids[(question, start_sec * 1000)] = clip_id(doc_id, start_sec * 1000, end_ms)
+
+    def clip_name(self, clip):
+        return f"{self.date_str} - {sanitize_filename(clip.question)}.mp3"
+
+    def clip_path(self, clip):
+        # Prefixed like the download: posts sharing a date and question split concurrently
+        return os.path.join(SPLIT_DIR, f"{self.message.id}-{self.clip_name(clip)}")
+
+    def add_clip(self, clip, out_path):
+        q_name = self.clip_name(clip)
+        entry = (q_name, out_path, f"initial-splits/{q_name}", self.clip_ids[(clip.question, clip.start_ms)])
+        self.clips.append(entry)
+        self.clip_ms[entry[3]] = clip.end_ms - clip.start_ms
+        self.set_clip(entry, "split", DONE)
+        return entry
+
+    def add_virtual_clip(self, clip):
+        q_name = self.clip_name(clip)
+        cid = self.clip_ids[(clip.question, clip.start_ms)]
+        entry = (q_name, None, virtual_clips.range_key(self.source_key, clip), cid)
+        self.clips.append(entry)
+        self.clip_ms[cid] = int(clip.duration_ms)
+        self.virtual[cid] = clip
+        self.set_clip(entry, "split", DONE)
+        return entry
+
+    def set_clip(self, entry, stage, status, error=None):
+        q_name, _, s3_key, cid = entry
+        state.set_clip(cid, self.channel, self.message.id, q_name, stage, status,
+                       s3_key if stage == "upload" and status == DONE else None, error)
+
+    def mark_skipped_clips(self):
+        # Planned clips that were too short to cut count as done for the cache
+        made = {entry[3] for entry in self.clips}
+        for (question, _), cid in self.clip_ids.items():
+            if cid not in made:
+                clip_cache.mark(cid, SKIPPED)
+                state.set_clip(cid, self.channel, self.message.id, question, "split", state_store.SKIPPED)
+
+    def record_uploads(self, outcomes):
+        self.uploaded = [entry for entry, ok in outcomes if ok]
+        failed = len(outcomes) - len(self.uploaded)
+        self.failed_clips += failed
+        if DAEMON and self.uploaded:
+            latency = datetime.now(timezone.utc) - self.message.date
+            metrics.observe("post_to_s3_seconds", latency.total_seconds())
+            log(f"⏱️ Message {self.message.id}: post to S3 in {latency.total_seconds() / 60:.1f} min",
+                msg_id=self.message.id, seconds=round(latency.total_seconds()))
+        log(f"📦 Uploaded {len(self.uploaded)}/{len(outcomes)} clips for message {self.message.id}"
+            + (f" ({failed} failed)" if failed else ""), msg_id=self.message.id, uploaded=len(self.uploaded),
+            failed=failed)
+
+
+def make_job(message):
+    if not (message.audio and message.audio.mime_type == "audio/mpeg"):
+        return None
+    parsed = parse_message(message.message, require_qna=True)
+    if not parsed.is_qna:
+        return None
+    ts_items = parsed.items
+    if not ts_items:
+        log("⚠️ No timestamps found, skipping...", level="warning", msg_id=message.id)
+        return None
+    date_str = parsed.date or "unknown-date"
+    job = QnaJob(message, ts_items, date_str)
+    if clip_cache.is_done(job.clip_ids.values(), TRANSCRIBED if ENABLE_TRANSCRIBE else UPLOADED):
+        metrics.inc("messages_cached_total")
+        log(f"♻️ All clips of message {message.id} were already processed, skipping...", msg_id=message.id)
+        return None
+    return job
+
+
+async def fetch_messages(channel, last_id):
+    # Oldest first, so the last_id watermark only ever moves forward.
+    # Text and photo posts can never be Q&A audio, so by default Telegram
+    # filters them out server-side instead of us walking the whole history.
+    scan_filter = InputMessagesFilterMusic() if SCAN_FILTER == "music" else None
+    scanned = 0
+    scan_seconds = 0.0  # time spent fetching and checking, not waiting on the pipeline
+    while True:
+        try:
+            resumed = time.monotonic()
+            async for message in client.iter_messages(channel, min_id=last_id, reverse=True,
+                                                      filter=scan_filter, wait_time=SCAN_WAIT_TIME):
+                scanned += 1
+                last_id = message.id
+                job = make_job(message)
+                scan_seconds += time.monotonic() - resumed
+                yield message.id, job
+                resumed = time.monotonic()
+            metrics.inc("messages_scanned_total", scanned, filter=SCAN_FILTER)
+            log(f"🔎 Scanned {scanned} message(s) ({SCAN_FILTER}) in {scan_seconds:.1f}s, "
+                f"{scanned / max(scan_seconds, 1e-6):.0f} msg/s", scanned=scanned, seconds=round(scan_seconds, 3))
+            return
+        except FloodWaitError as e:
+            # Too long for Telethon to sleep through: pause every channel, then resume
+            flood_gate.trip(e.seconds)
+            await flood_gate.wait()
+
+
+async def fetch_incomplete(channel, channel_key):
+    ids = state.incomplete(channel_key)
+    log(f"🔁 Retrying {len(ids)} incomplete message(s)")
+    if not ids:
+        return
+    for msg_id, message in zip(ids, await client.get_messages(channel, ids=ids)):
+        job = make_job(message) if message else None
+        if job is None:
+            # Deleted, no longer a Q&A post, or already fully processed
+            state.set_message(channel_key, msg_id, "fetch", state_store.SKIPPED)
+        yield msg_id, job
+
+
+# Live posts per channel, filled by the event handlers in daemon mode
+live_queues = {}
+
+
+async def on_live_message(event):
+    queue = live_queues.get(event.chat_id)
+    if queue is not None:
+        queue.put_nowait((event.message, isinstance(event, events.MessageEdited.Event)))
+
+
+async def follow_messages(channel, channel_key, last_id):
+    # Listening starts before the catch-up pass, so nothing posted meanwhile is missed
+    queue = live_queues[channel_key]
+    seen = set()
+    async for msg_id, job in fetch_messages(channel, last_id):
+        seen.add(msg_id)
+        yield msg_id, job
+    log(f"👂 Caught up on {channel_key}, waiting for new posts...")
+    while True:
+        message, edited = await queue.get()
+        if message.id in seen and not edited:
+            continue  # already picked up by the catch-up pass
+        if edited:
+            log(f"✏️ Message {message.id} was edited, checking it again")
+        yield message.id, make_job(message)
+
+
+def scheduled(handler):
+    # Downloads take turns across channels and wait out any FLOOD_WAIT
+    async def run(job):
+        async with download_slots.slot(job.channel):
+            try:
+                return await handler(job)
+            except FloodWaitError as e:
+                flood_gate.trip(e.seconds)
+                raise
+    return run
+
+
+def tracked(stage_name, handler):
+    # Records which stage each message reached, and why it failed
+    async def run(job):
+        state.set_message(job.channel, job.message.id, stage_name, RUNNING)
+        try:
+            return await handler(job)
+        except Exception as e:
+            state.set_message(job.channel, job.message.id, stage_name, FAILED, str(e))
+            raise
+    return run
+
+
+async def download_stage(job):
+    log(f"\n⬇️ Downloading {job.fname}...", msg_id=job.message.id)
+    start = time.perf_counter()
+    await download_to_path(
+        client,
+        job.message.document,
+        job.path,
+        progress_callback=lambda c, t, fname=job.fname: progress_bar(c, t, fname),
     )
-    if not m:
+    seconds = time.perf_counter() - start
+    size = job.message.document.size
+    metrics.observe("download_bytes_per_second", size / max(seconds, 1e-6))
+    log(f"✅ Finished download: {job.path}", msg_id=job.message.id, bytes=size, seconds=round(seconds, 3))
+    return job
+
+
+async def stream_stage(job):
+    # Download, split and upload in one go: each clip is uploaded as soon as
+    # the audio past its end timestamp has arrived.
+    log(f"\n⬇️ Streaming {job.fname}...", msg_id=job.message.id)
+    splitter = StreamingSplitter(job.ts_items, job.clip_path, MIN_CLIP_MS)
+    size = job.message.document.size
+    received = 0
+    uploads = []
+
+    def start_uploads(done):
+        for clip, out_path in done:
+            uploads.append(asyncio.ensure_future(upload_clip(job, job.add_clip(clip, out_path))))
+
+    try:
+        async for chunk in iter_download(client, job.message.document):
+            received += len(chunk)
+            start_uploads(splitter.feed(chunk))
+            await progress_bar(received, size, job.fname)
+        if received != size:
+            raise IOError(f"Stream of {job.fname} stopped at {received}/{size} bytes")
+    except Exception:
+        # The clips already sent are whole; the one being cut would be short, so the job fails
+        splitter.abort()
+        await asyncio.gather(*uploads, return_exceptions=True)
+        raise
+    start_uploads(splitter.finish())
+    job.mark_skipped_clips()
+    log(f"✅ Finished streaming: {job.fname}", msg_id=job.message.id, bytes=received)
+
+    job.record_uploads(await asyncio.gather(*uploads))
+    job.streamed = True
+    return job
+
+
+def split_audio(job):
+    results, _ = split_file(job.path, job.ts_items, job.clip_path, mode=SPLIT_MODE,
+                            min_clip_ms=MIN_CLIP_MS, workers=SPLIT_PROCESSES)
+    for clip, out_path in results:
+        job.add_clip(clip, out_path)
+    job.mark_skipped_clips()
+    return job
+
+
+def index_audio(job):
+    # Virtual clips: one frame scan for the byte ranges, nothing is cut or written
+    clips, job.duration_ms = virtual_clips.index_clips(job.path, job.ts_items, MIN_CLIP_MS)
+    for clip in clips:
+        job.add_virtual_clip(clip)
+    job.mark_skipped_clips()
+    return job
+
+
+async def split_stage(job):
+    if job.streamed:
+        return job
+    # Splitting runs off the event loop so downloads keep flowing
+    return await asyncio.to_thread(index_audio if VIRTUAL_CLIPS else split_audio, job)
+
+
+async def upload_clip(job, entry):
+    q_name, out_path, s3_key, cid = entry
+    cached = clip_cache.lookup([cid]).get(cid)
+    if cached and cached["s3_key"]:
+        # Same audio is already in S3, possibly under an older question name
+        log(f"♻️ Already uploaded: {cached['s3_key']}")
+        entry = (q_name, out_path, cached["s3_key"], cid)
+        job.set_clip(entry, "upload", DONE)
+        return entry, True
+    if mirror_channel is not None:
+        result, _ = await asyncio.gather(uploader.upload(out_path, s3_key), mirror_clip(job, entry))
+    else:
+        result = await uploader.upload(out_path, s3_key)
+    if result.ok:
+        clip_cache.mark(cid, UPLOADED, s3_key=s3_key, size=result.size)
+    job.set_clip(entry, "upload", DONE if result.ok else FAILED, result.error)
+    return entry, result.ok
+
+
+def open_clip(job, entry):
+    # A virtual clip has no file of its own; its bytes are read out of the recording
+    if entry[1]:
+        return open(entry[1], "rb")
+    clip = job.virtual[entry[3]]
+    return io.BytesIO(virtual_clips.read_range(job.path, clip.byte_start, clip.byte_end))
+
+
+async def mirror_clip(job, entry):
+    # Best effort: a failed mirror post is logged but does not fail the clip
+    q_name, _, _, cid = entry
+    title = q_name[:-len(".mp3")]
+    try:
+        with metrics.timer("telegram_mirror_seconds"):
+            # Every clip of a post mirrors at once; only MIRROR_UPLOADS of them take senders
+            async with mirror_slots:
+                with open_clip(job, entry) as f:
+                    input_file = await upload_file(client, f, q_name)
+            await client.send_file(mirror_channel, input_file, caption=title, attributes=[
+                DocumentAttributeAudio(duration=job.clip_ms.get(cid, 0) // 1000, title=title)])
+        log(f"📣 Mirrored to Telegram: {q_name}", clip=q_name)
+    except Exception as e:
+        metrics.inc("telegram_mirror_failures_total")
+        log(f"⚠️ Could not mirror {q_name} to Telegram: {e}", level="warning", clip=q_name, error=repr(e))
+
+
+async def upload_recording(job):
+    # Virtual clips: the recording goes up once, with a manifest of every clip's byte range
+    cached = clip_cache.lookup([entry[3] for entry in job.clips])
+    entries, fresh = [], []
+    for entry in job.clips:
+        known = cached.get(entry[3], {}).get("s3_key")
+        if known:
+            log(f"♻️ Already uploaded: {known}")
+            entries.append(entry[:2] + (known, entry[3]))
+        else:
+            entries.append(entry)
+            fresh.append(entry)
+    ok, error = True, None
+    if fresh:
+        uploads = [uploader.upload(job.path, job.source_key)]
+        if mirror_channel is not None:
+            uploads += [mirror_clip(job, entry) for entry in fresh]
+        result = (await asyncio.gather(*uploads))[0]
+        ok, error = result.ok, result.error
+        if ok:
+            manifest = virtual_clips.make_manifest(job.source_key, result.size, job.duration_ms,
+                                                   [job.virtual[entry[3]] for entry in job.clips],
+                                                   [(entry[0], entry[3]) for entry in job.clips])
+            try:
+                key = await asyncio.to_thread(virtual_clips.put_manifest, s3, s3_bucket, manifest)
+                log(f"🗂️ Wrote clip manifest: s3://{s3_bucket}/{key}", key=key, clips=len(job.clips))
+            except Exception as e:
+                ok, error = False, repr(e)
+                log(f"⚠️ Could not write clip manifest for {job.source_key}: {e}", level="warning",
+                    key=job.source_key, error=repr(e))
+    outcomes = []
+    for entry in entries:
+        if entry in fresh:
+            if ok:
+                clip = job.virtual[entry[3]]
+                clip_cache.mark(entry[3], UPLOADED, s3_key=entry[2], size=clip.byte_end - clip.byte_start)
+            job.set_clip(entry, "upload", DONE if ok else FAILED, error)
+            outcomes.append((entry, ok))
+        else:
+            job.set_clip(entry, "upload", DONE)
+            outcomes.append((entry, True))
+    job.record_uploads(outcomes)
+    return job
+
+
+async def upload_stage(job):
+    if job.streamed:
+        return job
+    if VIRTUAL_CLIPS:
+        return await upload_recording(job)
+    job.record_uploads(await asyncio.gather(*[upload_clip(job, entry) for entry in job.clips]))
+    return job
+
+
+def clip_job_name(q_name, cid):
+    base_name = re.sub(r"[^a-zA-Z0-9_-]", "_", q_name.split(".mp3")[0])
+    return f"{base_name}-{cid[:10]}"
+
+
+async def cut_clip_media(job_name, s3_key):
+    # Transcribe needs an object of its own; the clip's range is copied out of the recording inside S3
+    source, start, end = parse_range_key(s3_key)
+    media_key = virtual_clips.media_key(job_name)
+    try:
+        await asyncio.to_thread(virtual_clips.cut_media, s3, s3_bucket, source, start, end, media_key)
+        return media_key
+    except Exception as e:
+        log(f"⚠️ Could not cut out audio for {job_name}: {e}", level="warning", job=job_name, error=repr(e))
         return None
-    month, day, year = m.groups()
-    months = {
-        "January": "01", "February": "02", "March": "03", "April": "04", "May": "05",
-        "June": "06", "July": "07", "August": "08", "September": "09",
-        "October": "10", "November": "11", "December": "12"
-    }
-    return f"{year}-{day.zfill(2)}-{months[month]}"
-
-
-def parse_timestamps(text: str):
-    lines = text.splitlines()
-    pattern = re.compile(r"^(\d{1,2}:\d{2}(?::\d{2})?)\s*[-–]?\s*(.+)$")
-    items = []
-    for line in lines:
-        m = pattern.match(line.strip())
-        if m:
-            time_str, question = m.groups()
-            parts = [int(x) for x in time_str.split(":")]
-            if len(parts) == 2:
-                secs = parts[0] * 60 + parts[1]
-            else:
-                secs = parts[0] * 3600 + parts[1] * 60 + parts[2]
-            items.append((secs, question.strip()))
-    return items
 
 
-def sanitize_filename(name: str) -> str:
-    return re.sub(r'[<>:"/\\|?*\x00-\x1F]', "_", name)[:180]
+def joined_media(job, entry):
+    # How a clip's audio can be joined with its neighbours': "range" for a virtual clip indexed
+    # in this run, "file" for a clip file on disk, None when it can only go to Transcribe alone
+    # (e.g. cached under a clip-file key from an earlier run).
+    if parse_range_key(entry[2]) and entry[3] in job.virtual:
+        return "range"
+    return "file" if entry[1] else None
 
 
-def upload_to_s3(file_path, s3_key):
+async def start_batch_job(job, batch):
+    # Joins the clips' frames into one MP3 (or, for virtual clips, cuts their range out of the
+    # recording in S3) and starts a single job for all of them
+    names = [clip_job_name(q_name, cid) for q_name, _, _, cid in batch]
+    job_name = batch_job_name(names)
+    media_path = os.path.join(SPLIT_DIR, f"{job_name}.mp3")
+    media_key = batch_media_key(job_name)
     try:
-        s3.upload_file(file_path, s3_bucket, s3_key)
-        print(f"✅ Uploaded to S3: s3://{s3_bucket}/{s3_key}")
+        if joined_media(job, batch[0]) == "range":
+            # Consecutive virtual clips are already one range of the recording. A skipped
+            # too-short clip between two of them stays in the audio; its words go to the clip before.
+            clips = [job.virtual[entry[3]] for entry in batch]
+            base = clips[0].offset_ms
+            spans = [(clip.offset_ms - base, clip.offset_ms - base + clip.duration_ms) for clip in clips]
+            source, start, _ = parse_range_key(batch[0][2])
+            await asyncio.to_thread(virtual_clips.cut_media, s3, s3_bucket, source, start,
+                                    parse_range_key(batch[-1][2])[2], media_key)
+            error = None
+        else:
+            spans = await asyncio.to_thread(concat_clips, [entry[1] for entry in batch], media_path)
+            result = await uploader.upload(media_path, media_key)
+            error = result.error if not result.ok else None
     except Exception as e:
-        print(f"❌ Failed to upload {file_path}: {e}")
+        error = e
+    finally:
+        if os.path.exists(media_path):
+            os.remove(media_path)
+    if error:
+        log(f"⚠️ Could not prepare joined audio for {job_name}: {error}", level="warning", job=job_name,
+            error=repr(error))
+        return None
+    parts = make_parts(names, [entry[2] for entry in batch], spans)
+    if not await asyncio.to_thread(start_transcribe_job, f"s3://{s3_bucket}/{media_key}", job_name, media_key,
+                                   parts):
+        return None
+    metrics.inc("transcribe_batched_clips_total", len(batch))
+    return job_name
+
+
+async def transcribe_stage(job):
+    if ENABLE_TRANSCRIBE:
+        pending = []
+        for entry in job.uploaded:
+            cid = entry[3]
+            cached = clip_cache.lookup([cid]).get(cid)
+            if cached and cached["state"] == TRANSCRIBED:
+                log(f"♻️ Already transcribed: {cached['job_name']}")
+                job.set_clip(entry, "transcribe", DONE)
+                continue
+            pending.append(entry)
+        # Consecutive short clips share one job when TRANSCRIBE_BATCH_SECONDS is set.
+        # Virtual clips and clip files are batched apart, as their joined media is made differently.
+        groups = {}
+        for entry in pending:
+            groups.setdefault(joined_media(job, entry), []).append(entry)
+        batches = []
+        for media, entries in groups.items():
+            batches += plan_batches([(entry, job.clip_ms.get(entry[3], 0) / 1000) for entry in entries],
+                                    TRANSCRIBE_BATCH_SECONDS if media else 0)
+        for batch in batches:
+            if len(batch) > 1:
+                job_name = await start_batch_job(job, batch)
+            else:
+                q_name, _, s3_key, cid = batch[0]
+                job_name = clip_job_name(q_name, cid)
+                media_key = await cut_clip_media(job_name, s3_key) if parse_range_key(s3_key) else s3_key
+                if not media_key or not await asyncio.to_thread(start_transcribe_job, f"s3://{s3_bucket}/{media_key}",
+                                                                job_name, media_key):
+                    job_name = None
+            for entry in batch:
+                if job_name:
+                    clip_cache.mark(entry[3], TRANSCRIBED, job_name=job_name)
+                    job.set_clip(entry, "transcribe", DONE)
+                else:
+                    job.failed_clips += 1
+                    job.set_clip(entry, "transcribe", FAILED)
+
+    # Any failed clip leaves the message for --retry-failed; cached clips are not redone
+    state.set_message(job.channel, job.message.id, "transcribe", FAILED if job.failed_clips else DONE,
+                      f"{job.failed_clips} clip(s) failed" if job.failed_clips else None)
+    clean_job_files(job)
+    log(f"🧹 Cleaned up local files for message {job.message.id}.")
+    return job
+
+
+def clean_job_files(job):
+    for path in [job.path] + [entry[1] for entry in job.clips if entry[1]]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            log(f"⚠️ Could not delete {path}: {e}", level="warning", path=path, error=repr(e))
 
 
-def start_transcribe_job(s3_uri, job_name):
-    try:
-        transcribe.start_transcription_job(
-            TranscriptionJobName=job_name,
-            Media={"MediaFileUri": s3_uri},
-            MediaFormat="mp3",
-            OutputBucketName=s3_bucket,
-            OutputKey=f"transcripts/{job_name}.json",
-            IdentifyMultipleLanguages=True,
-            LanguageOptions=["en-US", "ar-SA"],
-        )
-        print(f"🎧 Started Transcribe job: {job_name}")
-    except Exception as e:
-        print(f"⚠️ Could not start transcription job for {s3_uri}: {e}")
+# === MAIN ===
+async def scrape_channel(url):
+    channel = await client.get_entity(url)
+    channel_key = utils.get_peer_id(channel)
+    name = getattr(channel, "username", None) or channel_key
+    last_id = state.cursor(channel_key, default=get_legacy_last_id() if url == LEGACY_CHANNEL_URL else 0)
+    log(f"📜 [{name}] Last processed id: {last_id}")
+
+    if RETRY_FAILED:
+        # The cursor stays where it is; only the listed messages are re-run
+        progress = CompletionTracker()
+        source = fetch_incomplete(channel, channel_key)
+    else:
+        # Failures are kept in the state store, so they no longer hold the cursor back.
+        # Edits can bring back older ids, so the cursor only moves forward.
+        progress = CompletionTracker(
+            on_advance=lambda msg_id: state.set_cursor(channel_key, max(msg_id, state.cursor(channel_key))),
+            hold_failed=False)
+        if DAEMON:
+            live_queues[channel_key] = asyncio.Queue()
+            source = follow_messages(channel, channel_key, last_id)
+        else:
+            source = fetch_messages(channel, last_id)
+    download = stream_stage if STREAM_SPLIT and not VIRTUAL_CLIPS else download_stage
+    pipeline = Pipeline([
+        Stage("download", tracked("download", scheduled(download)),
+              min(CHANNEL_DOWNLOAD_BUDGET, DOWNLOAD_WORKERS), STAGE_QUEUE_SIZE),
+        Stage("split", tracked("split", split_stage), SPLIT_WORKERS, STAGE_QUEUE_SIZE),
+        Stage("upload", tracked("upload", upload_stage), UPLOAD_WORKERS, STAGE_QUEUE_SIZE),
+        Stage("transcribe", tracked("transcribe", transcribe_stage), TRANSCRIBE_WORKERS, STAGE_QUEUE_SIZE),
+    ], progress, name=str(name))
+    await pipeline.run(source)
+
+    log(f"📋 [{name}] Message states: {state.counts(channel_key)}")
+    if progress.failed:
+        log(f"⚠️ [{name}] {progress.failed} message(s) failed; re-run them with --retry-failed.", level="warning",
+            channel=channel_key, failed=progress.failed)
+    if not RETRY_FAILED:
+        log(f"✅ [{name}] Updated last_id to {state.cursor(channel_key, last_id)}")
+
+
+async def flush_state_periodically():
+    # In daemon mode state writes can be sparse; don't leave them buffered for long
+    while True:
+        await asyncio.sleep(state.flush_seconds)
+        state.flush()
 
 
-# === MAIN ===
 async def main():
-    channel = await client.get_entity(os.getenv("TELEGRAM_CHANNEL_URL", "https://t.me/devtestingchannel"))
     os.makedirs(DOWNLOADS_DIR, exist_ok=True)
     os.makedirs(SPLIT_DIR, exist_ok=True)
-
-    last_id = get_last_id()
-    print(f"📜 Last processed id: {last_id}")
-
-    async for message in client.iter_messages(channel, min_id=last_id):
-        if message.audio and message.audio.mime_type == "audio/mpeg" and is_qna_message(message.message):
-            ts_items = parse_timestamps(message.message)
-            if not ts_items:
-                print("⚠️ No timestamps found, skipping...")
-                continue
-
-            date_str = extract_date(message.message) or "unknown-date"
-            fname = f"{date_str}.mp3"
-            path = os.path.join(DOWNLOADS_DIR, fname)
-
-            print(f"\n⬇️ Downloading {fname}...")
-            with open(path, "wb") as out:
-                await download_file(
-                    client,
-                    message.document,
-                    out,
-                    progress_callback=lambda c, t, fname=fname: progress_bar(c, t, fname),
-                )
-            print(f"✅ Finished download: {path}")
-
-            # Split audio cleanly
-            audio = AudioSegment.from_file(path)
-            duration_ms = len(audio)
-            print(f"🎧 Audio length: {duration_ms / 1000:.1f} seconds")
-
-            for idx, (start_sec, question) in enumerate(ts_items):
-                start_ms = start_sec * 1000
-                end_ms = ts_items[idx + 1][0] * 1000 if idx + 1 < len(ts_items) else duration_ms
-
-                # Skip invalid or tiny clips
-                if end_ms <= start_ms or (end_ms - start_ms) < MIN_CLIP_MS:
-                    print(f"⚠️ Skipping too-short or invalid clip ({end_ms - start_ms} ms)")
-                    continue
-
-                clip = audio[start_ms:end_ms]
-                q_name = f"{date_str} - {sanitize_filename(question)}.mp3"
-                out_path = os.path.join(SPLIT_DIR, q_name)
-                clip.export(out_path, format="mp3")
-                print(f"🎧 Saved split: {out_path}")
-
-                # Upload to S3
-                s3_key = f"initial-splits/{q_name}"
-                upload_to_s3(out_path, s3_key)
-
-                # Start Transcribe if enabled
-                if ENABLE_TRANSCRIBE:
-                    s3_uri = f"s3://{s3_bucket}/{s3_key}"
-                    base_name = re.sub(r"[^a-zA-Z0-9_-]", "_", q_name.split(".mp3")[0])
-                    suffix = f"-{random.randint(100000, 999999)}"
-                    job_name = base_name + suffix
-                    start_transcribe_job(s3_uri, job_name)
-
-            # Cleanup
-            time.sleep(1)
-            clean_local_folders()
-            print("🧹 Cleaned up local folders for next session.")
-
-        last_id = max(last_id, message.id)
-        save_last_id(last_id)
-
-    print(f"\n✅ Updated last_id to {last_id}")
-
-
-with client:
-    client.loop.run_until_complete(main())
+    clean_local_folders()
+
+    urls = CHANNEL_URLS or [LEGACY_CHANNEL_URL]
+    global mirror_channel
+    if MIRROR_CHANNEL_URL:
+        mirror_channel = await client.get_entity(MIRROR_CHANNEL_URL)
+    if DAEMON and not RETRY_FAILED:
+        client.add_event_handler(on_live_message, events.NewMessage())
+        client.add_event_handler(on_live_message, events.MessageEdited())
+        flushing = asyncio.ensure_future(flush_state_periodically())
+    tracker_stop = asyncio.Event()
+    importer = make_db_importer(s3, job_store) if IMPORT_ON_COMPLETE else None
+    tracker = TranscribeTracker(transcribe, job_store, importer)
+    tracking = asyncio.ensure_future(tracker.run(tracker_stop))
+    exporting = asyncio.ensure_future(metrics.serve())
+    metrics.add_collector(lambda: metrics.set_gauge("sender_pool_open", SenderPool.for_client(client).open))
+    try:
+        # One failing channel must not stop the others
+        results = await asyncio.gather(*[scrape_channel(url) for url in urls], return_exceptions=True)
+        for url, result in zip(urls, results):
+            if isinstance(result, Exception):
+                log(f"❌ Channel {url} failed: {result}", level="error", channel=url, error=repr(result))
+    finally:
+        if DAEMON and not RETRY_FAILED:
+            flushing.cancel()
+        state.flush()
+        await SenderPool.for_client(client).close()
+        uploader.close()
+        if WAIT_FOR_TRANSCRIPTS:
+            log("⏳ Waiting for Transcribe jobs to finish...")
+            # The polling loop must be gone before the final run, or both import the same batch
+            tracking.cancel()
+            await asyncio.gather(tracking, return_exceptions=True)
+            await tracker.run(until_idle=True)
+        else:
+            tracker_stop.set()
+            await tracking
+        if importer:
+            importer.close()
+    log(f"📝 Transcribe jobs: {job_store.counts()}")
+    log(f"♻️ Clip cache: {clip_cache.hits} hit(s), {clip_cache.misses} miss(es)")
+    if flood_gate.trips:
+        log(f"🚦 FLOOD_WAITs across channels: {flood_gate.trips}")
+    exporting.cancel()
+    await asyncio.gather(exporting, return_exceptions=True)
+    state.close()
+
+
+if __name__ == "__main__":
+    setup()
+    with client:
+        client.loop.run_until_complete(main())
@@ -6,11 +6,11 @@
 
 import os
 import json
-import re
 import time
 import asyncio
 from telethon import TelegramClient
 from FastTelethon import download_file  # your fast downloader
+from qna_parser import is_qna_message, extract_date, parse_timestamps, sanitize_filename
 from pydub import AudioSegment
 from pydub.utils import mediainfo
 import sys
@@ -52,55 +52,6 @@ async def progress_bar(current, total, fname):
     if timer.can_send():
         print(f"{fname}: {current*100/total:.1f}%")
 
-# check if message text looks like Q&A session
-def is_qna_message(msg_text: str) -> bool:
-    if not msg_text:
-        return False
-    # remove Telegram link if present
-    cleaned = re.sub(r"https?://t\.me/\S+", "", msg_text, flags=re.IGNORECASE)
-    # normalize spacing
-    cleaned = re.sub(r"\s+", " ", cleaned).strip()
-    return "livestream counselling q&a timestamps" in cleaned.lower()
-
-# extract date string (e.g., "January 10th, 2025") and convert to yyyy-dd-mm
-def extract_date(text: str) -> str:
-    # remove links and compress spacing
-    text = re.sub(r"https?://t\.me/\S+", "", text)
-    text = text.replace("\n", " ").strip()
-
-    # match e.g. "January 10th, 2025" or "May 9th, 2025:"
-    m = re.search(r"(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{1,2})(?:st|nd|rd|th)?,\s*(\d{4})", text)
-    if not m:
-        return None
-    month, day, year = m.groups()
-    months = {
-        "January": "01", "February": "02", "March": "03", "April": "04", "May": "05",
-        "June": "06", "July": "07", "August": "08", "September": "09",
-        "October": "10", "November": "11", "December": "12"
-    }
-    return f"{year}-{day.zfill(2)}-{months[month]}"
-
-# parse "0:00 - Question..." lines
-def parse_timestamps(text: str):
-    lines = text.splitlines()
-    pattern = re.compile(r"^(\d{1,2}:\d{2}(?::\d{2})?)\s*[-–]?\s*(.+)$")
-    items = []
-    for line in lines:
-        m = pattern.match(line.strip())
-        if m:
-            time_str, question = m.groups()
-            # convert to seconds
-            parts = [int(x) for x in time_str.split(":")]
-            if len(parts) == 2:
-                secs = parts[0]*60 + parts[1]
-            else:
-                secs = parts[0]*3600 + parts[1]*60 + parts[2]
-            items.append((secs, question.strip()))
-    return items
-
-def sanitize_filename(name: str) -> str:
-    return re.sub(r'[<>:"/\\|?*\x00-\x1F]', '_', name)[:180]
-
 async def main():
     channel = await client.get_entity('https://t.me/devtestingchannel')
     os.makedirs(DOWNLOADS_DIR, exist_ok=True)
@@ -0,0 +1,248 @@
+# search_index.py
+# SQLite FTS5 sidecar index over imported questions, kept up to date by
+# db_import as it writes Question rows, so search no longer needs
+# "Title LIKE '%q%' OR Transcription LIKE '%q%'" scans of the whole table.
+#
+#   python search_index.py "question words"     search
+#   python search_index.py --rebuild            re-index every Question row
+
+import os
+import re
+import sqlite3
+import sys
+import threading
+import unicodedata
+from collections import namedtuple
+from typing import Iterable, List, Optional, Tuple
+
+from metrics import log
+
+SEARCH_INDEX_DB = os.getenv("SEARCH_INDEX_DB", "search_index.db")  # "" disables indexing
+TITLE_WEIGHT = 10.0    # bm25 weight of a title hit relative to a transcription hit
+SNIPPET_WORDS = 12
+
+# Harakat, superscript alef and tatweel carry no meaning for search
+_ARABIC_MARKS = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+_ARABIC_LETTERS = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ئ": "ي", "ؤ": "و", "ة": "ه",
+    **{chr(0x0660 + d): str(d) for d in range(10)},  # Arabic-Indic digits
+    **{chr(0x06f0 + d): str(d) for d in range(10)},  # Persian digits
+})
+# Definite article, alone or after wa/fa/bi/ka ("the", "and the", "with the", ...)
+_ARABIC_ARTICLE = re.compile(r"\b(?:[وفبك]?ال|لل)(?=\w{3})")
+_TERM = re.compile(r"\w+")
+_WHITESPACE = re.compile(r"\s+")
+_OPEN, _CLOSE = "\x02", "\x03"  # highlight() markers, never in a transcript
+
+SearchHit = namedtuple("SearchHit", "title date score snippet")
+
+
+def normalize(text: str) -> str:
+    """
+    Folds the spellings people actually type onto one form: NFKC, case,
+    Arabic diacritics and tatweel, alef/yaa/taa marbuta variants, Eastern
+    digits and the definite article. English stemming and Latin accents are
+    left to the porter/unicode61 tokenizer. Applied to documents and queries
+    alike.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _ARABIC_MARKS.sub("", text).translate(_ARABIC_LETTERS)
+    return _ARABIC_ARTICLE.sub("", text)
+
+
+def index_text(text: str) -> str:
+    """
+    normalize() word by word, one indexed word per whitespace-separated word
+    of the original, so a highlighted word can be shown as it was written.
+    """
+    return " ".join(_WHITESPACE.sub("", normalize(word)) for word in text.split())
+
+
+def original_snippet(marked: str, original: str, words: int = SNIPPET_WORDS) -> str:
+    """
+    Rebuilds an FTS5 snippet from the original text: marked is the indexed
+    column as highlight() returns it, and the window of `words` words with
+    the most hits is shown with hits in [brackets], runs of hits sharing one.
+    If the two no longer line up word for word, the start is shown unmarked.
+    """
+    source = original.split()
+    marked_words = marked.split(" ")
+    if len(marked_words) != len(source):
+        hits = [False] * len(source)
+    else:
+        hits, inside = [], False
+        for word in marked_words:
+            hits.append(inside or _OPEN in word)
+            if _OPEN in word or _CLOSE in word:
+                inside = word.rfind(_OPEN) > word.rfind(_CLOSE)
+    # Most hits, then a few words of lead-in before the first of them
+    best, most = 0, (-1, 0)
+    for start in range(max(1, len(source) - words + 1)):
+        window = hits[start:start + words]
+        lead = window.index(True) if any(window) else 0
+        rank = (sum(window), -abs(lead - words // 4))
+        if rank > most:
+            best, most = start, rank
+    end = min(best + words, len(source))
+    out = []
+    for i in range(best, end):
+        word = source[i]
+        if hits[i] and (i == best or not hits[i - 1]):
+            word = "[" + word
+        if hits[i] and (i + 1 == end or not hits[i + 1]):
+            word += "]"
+        out.append(word)
+    return ("…" if best > 0 else "") + " ".join(out) + ("…" if end < len(source) else "")
+
+
+def build_query(text: str, prefix_last: bool = True) -> Optional[str]:
+    """
+    Every word must match. Words are quoted so user input can never be read
+    as FTS5 syntax, and the last one matches as a prefix for as-you-type
+    search. None when there is nothing to search for.
+    """
+    terms = _TERM.findall(normalize(text))
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    if prefix_last:
+        quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+class SearchIndex:
+    """
+    Questions are identified by (title, date), as db_import identifies them.
+    add() replaces a question's indexed text; changes are buffered and made
+    visible by flush(), one transaction per db_import batch. The original
+    transcription is kept unindexed beside the normalized one for snippets.
+    """
+
+    def __init__(self, path: str = SEARCH_INDEX_DB) -> None:
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        with self.lock, self.db:
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS questions (
+                    id INTEGER PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    UNIQUE (title, date)
+                )
+            """)
+            columns = [row[1] for row in self.db.execute("PRAGMA table_info(question_text)")]
+            if columns and "original" not in columns:
+                # Written before originals were kept: its snippets would show folded text
+                log("⚠️ Search index predates snippet originals, run search_index.py --rebuild",
+                    level="warning", path=path)
+                self.db.execute("DROP TABLE question_text")
+                self.db.execute("DELETE FROM questions")
+            self.db.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS question_text USING fts5(
+                    title, transcription, original UNINDEXED,
+                    tokenize = 'porter unicode61 remove_diacritics 2'
+                )
+            """)
+        self.pending: List[Tuple[str, str, str]] = []
+
+    def add(self, title: str, date: str, transcription: str) -> None:
+        self.pending.append((title, date, transcription))
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        with self.lock, self.db:
+            for title, date, transcription in self.pending:
+                self.db.execute("INSERT INTO questions (title, date) VALUES (?, ?) ON CONFLICT DO NOTHING",
+                                (title, date))
+                (row_id,) = self.db.execute("SELECT id FROM questions WHERE title = ? AND date = ?",
+                                            (title, date)).fetchone()
+                self.db.execute("DELETE FROM question_text WHERE rowid = ?", (row_id,))
+                self.db.execute("INSERT INTO question_text (rowid, title, transcription, original) "
+                                "VALUES (?, ?, ?, ?)",
+                                (row_id, normalize(title), index_text(transcription), transcription))
+        self.pending = []
+
+    def discard(self) -> None:
+        """Drops buffered changes whose Question rows were rolled back."""
+        self.pending = []
+
+    def search(self, text: str, limit: int = 20, offset: int = 0) -> List[SearchHit]:
+        """
+        Best matches first by bm25, a title hit counting TITLE_WEIGHT times a
+        transcription hit. score is bm25's, so lower is better. The snippet
+        quotes the transcription as imported, not its normalized form.
+        """
+        query = build_query(text)
+        if not query:
+            return []
+        with self.lock:
+            rows = self.db.execute("""
+                SELECT q.title, q.date, bm25(question_text, ?, 1.0) AS score,
+                       highlight(question_text, 1, ?, ?), question_text.original
+                FROM question_text JOIN questions q ON q.id = question_text.rowid
+                WHERE question_text MATCH ?
+                ORDER BY score LIMIT ? OFFSET ?
+            """, (TITLE_WEIGHT, _OPEN, _CLOSE, query, limit, offset)).fetchall()
+        return [SearchHit(title, date, score, original_snippet(marked, original))
+                for title, date, score, marked, original in rows]
+
+    def count(self, text: str) -> int:
+        query = build_query(text)
+        if not query:
+            return 0
+        with self.lock:
+            return self.db.execute("SELECT count(*) FROM question_text WHERE question_text MATCH ?",
+                                   (query,)).fetchone()[0]
+
+    def rebuild(self, rows: Iterable[Tuple[str, str, str]], batch_size: int = 1000) -> int:
+        """Replaces the whole index with (title, date, transcription) rows."""
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM questions")
+            self.db.execute("DELETE FROM question_text")
+        count = 0
+        for title, date, transcription in rows:
+            self.add(title, date, transcription or "")
+            count += 1
+            if len(self.pending) >= batch_size:
+                self.flush()
+        self.flush()
+        with self.lock, self.db:
+            self.db.execute("INSERT INTO question_text (question_text) VALUES ('optimize')")
+        return count
+
+    def close(self) -> None:
+        self.flush()
+        self.db.close()
+
+
+def open_index(path: Optional[str] = SEARCH_INDEX_DB) -> Optional[SearchIndex]:
+    return SearchIndex(path) if path else None
+
+
+def main() -> None:
+    index = SearchIndex()
+    if sys.argv[1:] == ["--rebuild"]:
+        import db_import
+        import pymysql
+
+        connection = db_import.get_db_connection()
+        try:
+            # Unbuffered, so the table is streamed rather than loaded whole
+            with connection.cursor(pymysql.cursors.SSDictCursor) as cursor:
+                cursor.execute("SELECT Title, Date, Transcription FROM Question")
+                count = index.rebuild((r["Title"], r["Date"], r["Transcription"]) for r in cursor)
+        finally:
+            connection.close()
+        print(f"✅ Indexed {count} questions")
+    else:
+        for hit in index.search(" ".join(sys.argv[1:])):
+            print(f"{hit.score:8.2f}  {hit.date}  {hit.title}\n          {hit.snippet}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# sender_pool.py
+# Long-lived, per-DC pool of authorized MTProtoSenders shared by every
+# FastTelethon download and upload, so connections and foreign-DC
+# authorization are paid for once per run instead of once per file.
+
+import asyncio
+import os
+import time
+import weakref
+from collections import defaultdict
+from typing import DefaultDict, Dict, List, Optional, Tuple
+
+from telethon import TelegramClient
+from telethon.crypto import AuthKey
+from telethon.network import MTProtoSender
+from telethon.tl.alltlobjects import LAYER
+from telethon.tl.functions import InvokeWithLayerRequest
+from telethon.tl.functions.auth import ExportAuthorizationRequest, ImportAuthorizationRequest
+
+MAX_POOL_CONNECTIONS = int(os.getenv("MAX_POOL_CONNECTIONS", 40))
+SENDER_IDLE_TIMEOUT = float(os.getenv("SENDER_IDLE_TIMEOUT", 60))
+
+parallel_transfer_locks: DefaultDict[int, asyncio.Lock] = defaultdict(lambda: asyncio.Lock())
+
+_pools: "weakref.WeakKeyDictionary[TelegramClient, SenderPool]" = weakref.WeakKeyDictionary()
+
+
+class SenderPool:
+    """
+    Keeps idle senders per DC for reuse. At most max_total connections are
+    open at once (busy and idle together); when the cap is hit an idle
+    sender from another DC is closed, otherwise acquire() waits for a release.
+    A transfer that needs several senders before it can make progress takes
+    them with acquire_many(), all at once, so no transfer holds some while
+    waiting for the rest. Idle senders are dropped after idle_timeout or when
+    found disconnected.
+    """
+
+    def __init__(self, client: TelegramClient, max_total: int = MAX_POOL_CONNECTIONS,
+                 idle_timeout: float = SENDER_IDLE_TIMEOUT) -> None:
+        self.client = client
+        self.max_total = max_total
+        self.idle_timeout = idle_timeout
+        self.idle: DefaultDict[int, List[Tuple[MTProtoSender, float]]] = defaultdict(list)
+        self.auth_keys: Dict[int, AuthKey] = {}
+        self.open = 0
+        self.created = 0
+        self.reused = 0
+        self.changed: Optional[asyncio.Condition] = None
+        self.reaper: Optional[asyncio.Task] = None
+
+    @classmethod
+    def for_client(cls, client: TelegramClient) -> "SenderPool":
+        pool = _pools.get(client)
+        if pool is None:
+            pool = _pools[client] = cls(client)
+        return pool
+
+    def _start(self) -> None:
+        if self.changed is None:
+            self.changed = asyncio.Condition()
+        if self.reaper is None or self.reaper.done():
+            self.reaper = asyncio.ensure_future(self._reap())
+
+    @staticmethod
+    def _healthy(sender: MTProtoSender) -> bool:
+        return sender.is_connected()
+
+    def _disconnect(self, sender: MTProtoSender) -> None:
+        # Called with self.changed held; the freed slot may be what a waiter needs
+        self.open -= 1
+        self.changed.notify_all()
+        asyncio.ensure_future(sender.disconnect())
+
+    def _evict_one(self, keep_dc: Optional[int] = None) -> bool:
+        oldest = None
+        for dc_id, senders in self.idle.items():
+            if dc_id != keep_dc and senders and (oldest is None or senders[0][1] < self.idle[oldest][0][1]):
+                oldest = dc_id
+        if oldest is None:
+            return False
+        sender, _ = self.idle[oldest].pop(0)
+        self._disconnect(sender)
+        return True
+
+    async def acquire(self, dc_id: int) -> MTProtoSender:
+        return (await self.acquire_many(dc_id, 1))[0]
+
+    async def acquire_many(self, dc_id: int, count: int) -> List[MTProtoSender]:
+        """
+        Waits until count senders (at most max_total) can be had together,
+        then takes them in one step: idle ones for this DC first, new
+        connections for the rest, closing idle senders of other DCs to make
+        room. If a connect fails, the senders already taken go back and the
+        error is raised.
+        """
+        self._start()
+        count = max(1, min(count, self.max_total))
+        async with self.changed:
+            while True:
+                idle = self.idle[dc_id]
+                for entry in [entry for entry in idle if not self._healthy(entry[0])]:
+                    idle.remove(entry)
+                    self._disconnect(entry[0])
+                reused = min(len(idle), count)
+                new = count - reused
+                others = sum(len(senders) for other, senders in self.idle.items() if other != dc_id)
+                if new <= self.max_total - self.open + others:
+                    while self.open + new > self.max_total:
+                        self._evict_one(keep_dc=dc_id)
+                    taken = [idle.pop()[0] for _ in range(reused)]
+                    self.open += new
+                    break
+                await self.changed.wait()
+        try:
+            connected = await asyncio.gather(*[self._connect(dc_id) for _ in range(new)], return_exceptions=True)
+        except BaseException:
+            await self._give_back(dc_id, taken, new)
+            raise
+        errors = [result for result in connected if isinstance(result, BaseException)]
+        senders = taken + [result for result in connected if not isinstance(result, BaseException)]
+        if errors:
+            await self._give_back(dc_id, senders, len(errors))
+            raise errors[0]
+        self.reused += reused
+        self.created += new
+        return senders
+
+    async def _give_back(self, dc_id: int, senders: List[MTProtoSender], slots: int) -> None:
+        # Undoes a partly done acquire_many: senders go back idle, slots never got a connection
+        async with self.changed:
+            self.open -= slots
+            for sender in senders:
+                self.idle[dc_id].append((sender, time.monotonic()))
+            self.changed.notify_all()
+
+    async def release(self, dc_id: int, sender: MTProtoSender, healthy: bool = True) -> None:
+        async with self.changed:
+            if healthy and self._healthy(sender):
+                self.idle[dc_id].append((sender, time.monotonic()))
+                self.changed.notify_all()
+            else:
+                self._disconnect(sender)
+
+    async def _new_sender(self, dc_id: int, auth_key: Optional[AuthKey]) -> MTProtoSender:
+        client = self.client
+        dc = await client._get_dc(dc_id)
+        sender = MTProtoSender(auth_key, loggers=client._log)
+        await sender.connect(client._connection(dc.ip_address, dc.port, dc.id,
+                                                loggers=client._log,
+                                                proxy=client._proxy))
+        return sender
+
+    async def _connect(self, dc_id: int) -> MTProtoSender:
+        client = self.client
+        if dc_id == client.session.dc_id:
+            return await self._new_sender(dc_id, client.session.auth_key)
+        if dc_id not in self.auth_keys:
+            # Only the first connection to a foreign DC imports our authorization
+            async with parallel_transfer_locks[dc_id]:
+                if dc_id not in self.auth_keys:
+                    sender = await self._new_sender(dc_id, None)
+                    auth = await client(ExportAuthorizationRequest(dc_id))
+                    client._init_request.query = ImportAuthorizationRequest(id=auth.id, bytes=auth.bytes)
+                    req = InvokeWithLayerRequest(LAYER, client._init_request)
+                    await sender.send(req)
+                    self.auth_keys[dc_id] = sender.auth_key
+                    return sender
+        return await self._new_sender(dc_id, self.auth_keys[dc_id])
+
+    async def _reap(self) -> None:
+        while True:
+            await asyncio.sleep(max(1.0, self.idle_timeout / 4))
+            cutoff = time.monotonic() - self.idle_timeout
+            async with self.changed:
+                for dc_id, senders in self.idle.items():
+                    keep = []
+                    for sender, since in senders:
+                        if since < cutoff or not self._healthy(sender):
+                            self._disconnect(sender)
+                        else:
+                            keep.append((sender, since))
+                    senders[:] = keep
+                self.changed.notify_all()
+
+    async def close(self) -> None:
+        if self.reaper:
+            self.reaper.cancel()
+        senders = [sender for idle in self.idle.values() for sender, _ in idle]
+        self.idle.clear()
+        self.open -= len(senders)
+        await asyncio.gather(*[sender.disconnect() for sender in senders], return_exceptions=True)
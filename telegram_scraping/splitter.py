@@ -0,0 +1,177 @@
+# splitter.py
+# Cuts a downloaded livestream into per-question clips from parse_timestamps() output.
+#
+#   copy     - cut on MP3 frame boundaries, no decode or re-encode (default)
+#   reencode - decode/encode only each clip's range, fanned out over a process pool
+
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from metrics import log, metrics
+from mp3frames import FrameScanner, scan_cut_points, copy_range
+
+Clip = namedtuple("Clip", "question start_ms end_ms")
+
+SPLIT_MODES = ("copy", "reencode")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+    return _pool
+
+
+def plan_clips(ts_items, duration_ms: float, min_clip_ms: int = 0) -> List[Clip]:
+    clips = []
+    for idx, (start_sec, question) in enumerate(ts_items):
+        start_ms = start_sec * 1000
+        end_ms = ts_items[idx + 1][0] * 1000 if idx + 1 < len(ts_items) else int(duration_ms)
+
+        # Skip invalid or tiny clips
+        if end_ms <= start_ms or (end_ms - start_ms) < min_clip_ms:
+            log(f"⚠️ Skipping too-short or invalid clip ({end_ms - start_ms} ms)", level="warning",
+                question=question, clip_ms=end_ms - start_ms)
+            continue
+        clips.append(Clip(question, start_ms, end_ms))
+    return clips
+
+
+def _export_clip(src_path: str, start_ms: int, end_ms: int, out_path: str, bitrate: str) -> Tuple[str, float]:
+    # Runs in a worker process; ffmpeg seeks to the clip so only its range is decoded
+    from pydub import AudioSegment
+    start = time.perf_counter()
+    clip = AudioSegment.from_file(src_path, format="mp3", start_second=start_ms / 1000,
+                                  duration=(end_ms - start_ms) / 1000)
+    clip.export(out_path, format="mp3", bitrate=bitrate)
+    return out_path, time.perf_counter() - start
+
+
+def split_file(src_path: str, ts_items, out_path_for: Callable[[Clip], str], mode: str = "copy",
+               min_clip_ms: int = 0, workers: Optional[int] = None,
+               bitrate: str = "128k") -> Tuple[List[Tuple[Clip, str]], float]:
+    """
+    Splits src_path into one file per timestamp. Returns ([(clip, out_path)], duration_ms).
+    """
+    if mode not in SPLIT_MODES:
+        raise ValueError(f"Unknown split mode: {mode}")
+
+    boundaries = [start_sec * 1000 for start_sec, _ in ts_items]
+    with metrics.timer("split_scan_seconds"):
+        cuts, duration_ms, end = scan_cut_points(src_path, boundaries)
+    log(f"🎧 Audio length: {duration_ms / 1000:.1f} seconds", path=src_path, duration_ms=duration_ms)
+    clips = plan_clips(ts_items, duration_ms, min_clip_ms)
+
+    results = []
+    if mode == "copy":
+        for clip in clips:
+            out_path = out_path_for(clip)
+            with metrics.timer("clip_export_seconds", mode="copy"):
+                copy_range(src_path, cuts[clip.start_ms], cuts.get(clip.end_ms, end), out_path)
+            log(f"🎧 Saved split: {out_path}", clip=out_path, mode="copy")
+            results.append((clip, out_path))
+        return results, duration_ms
+
+    pool = _get_pool(workers)
+    futures = [(clip, pool.submit(_export_clip, src_path, clip.start_ms, clip.end_ms,
+                                  out_path_for(clip), bitrate))
+               for clip in clips]
+    for clip, future in futures:
+        out_path, seconds = future.result()
+        metrics.observe("clip_export_seconds", seconds, mode="reencode")
+        log(f"🎧 Saved split: {out_path}", clip=out_path, mode="reencode", seconds=round(seconds, 3))
+        results.append((clip, out_path))
+    return results, duration_ms
+
+
+class StreamingSplitter:
+    """
+    Cuts clips out of an MP3 while it is still arriving. feed() takes the
+    stream in order and returns every clip whose end timestamp has been
+    passed; finish() closes the last one. The source file is never written.
+    Clips are cut on frame boundaries like split_file(mode="copy").
+    """
+
+    def __init__(self, ts_items, out_path_for: Callable[[Clip], str], min_clip_ms: int = 0) -> None:
+        self.ts_items = ts_items
+        self.starts = [start_sec * 1000 for start_sec, _ in ts_items]
+        self.out_path_for = out_path_for
+        self.min_clip_ms = min_clip_ms
+        self.scanner = FrameScanner()
+        self.pending = bytearray()
+        self.pending_base = 0
+        self.index = -1
+        self.out = None
+        self.out_path = None
+
+    def _close(self, end_ms: float) -> Optional[Tuple[Clip, str]]:
+        if self.index < 0:
+            return None
+        start_ms = self.starts[self.index]
+        clip = Clip(self.ts_items[self.index][1], start_ms, int(end_ms))
+        if self.out:
+            self.out.close()
+            self.out = None
+        if end_ms <= start_ms or (end_ms - start_ms) < self.min_clip_ms or not self.out_path:
+            log(f"⚠️ Skipping too-short or invalid clip ({int(end_ms) - start_ms} ms)", level="warning",
+                question=clip.question, clip_ms=int(end_ms) - start_ms)
+            if self.out_path:
+                os.remove(self.out_path)
+            self.out_path = None
+            return None
+        out_path, self.out_path = self.out_path, None
+        metrics.inc("clips_total", mode="stream")
+        log(f"🎧 Saved split: {out_path}", clip=out_path, mode="stream")
+        return clip, out_path
+
+    def _write(self, frames) -> List[Tuple[Clip, str]]:
+        done = []
+        for frame in frames:
+            while self.index + 1 < len(self.starts) and frame.start_ms >= self.starts[self.index + 1]:
+                closed = self._close(self.starts[self.index + 1])
+                if closed:
+                    done.append(closed)
+                self.index += 1
+            if self.index < 0:
+                continue
+            if not self.out:
+                start_ms = self.starts[self.index]
+                self.out_path = self.out_path_for(Clip(self.ts_items[self.index][1], start_ms, None))
+                self.out = open(self.out_path, "wb")
+            at = frame.offset - self.pending_base
+            self.out.write(self.pending[at:at + frame.size])
+        return done
+
+    def _drop_consumed(self) -> None:
+        # Everything before the scanner's unparsed tail has been handled
+        consumed = self.scanner.base - self.pending_base
+        del self.pending[:consumed]
+        self.pending_base = self.scanner.base
+
+    def feed(self, data: bytes) -> List[Tuple[Clip, str]]:
+        self.pending += data
+        done = self._write(self.scanner.feed(data))
+        self._drop_consumed()
+        return done
+
+    def abort(self) -> None:
+        """Drops the clip being cut when the stream ends early; clips already returned stay."""
+        if self.out:
+            self.out.close()
+            self.out = None
+        if self.out_path:
+            os.remove(self.out_path)
+            self.out_path = None
+
+    def finish(self) -> List[Tuple[Clip, str]]:
+        done = self._write(self.scanner.feed(b"", final=True))
+        self._drop_consumed()
+        closed = self._close(self.scanner.elapsed_ms)
+        if closed:
+            done.append(closed)
+        return done
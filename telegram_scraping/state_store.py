@@ -0,0 +1,156 @@
+# state_store.py
+# Crash-safe scrape state in SQLite (WAL mode): the per-channel cursor plus
+# the stage and status of every Q&A message and clip, so a failed message can
+# be retried on its own instead of holding back a single last_id.
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+STATE_DB = os.getenv("SCRAPE_STATE_DB", "scrape_state.db")
+STATE_BATCH_SIZE = int(os.getenv("STATE_BATCH_SIZE", 50))
+STATE_FLUSH_SECONDS = float(os.getenv("STATE_FLUSH_SECONDS", 2))
+
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+INCOMPLETE = (RUNNING, FAILED)
+
+
+class StateStore:
+    """
+    Writes are buffered and committed together, one transaction per batch, once
+    STATE_BATCH_SIZE updates are waiting or STATE_FLUSH_SECONDS have passed. A
+    crash loses at most the last unflushed batch, and since the cursor is
+    written in the same transaction as the statuses it follows, the two never
+    disagree: lost updates just mean the work is redone. Clip state is also
+    set from the split worker threads, so the connection is shared under a lock.
+    """
+
+    def __init__(self, path: str = STATE_DB, batch_size: int = STATE_BATCH_SIZE,
+                 flush_seconds: float = STATE_FLUSH_SECONDS) -> None:
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        with self.lock, self.db:
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS cursors (
+                    channel INTEGER PRIMARY KEY,
+                    last_id INTEGER NOT NULL
+                )
+            """)
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    channel INTEGER NOT NULL,
+                    msg_id INTEGER NOT NULL,
+                    stage TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (channel, msg_id)
+                )
+            """)
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS clips (
+                    clip_id TEXT PRIMARY KEY,
+                    channel INTEGER NOT NULL,
+                    msg_id INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    s3_key TEXT,
+                    error TEXT,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self.db.execute("CREATE INDEX IF NOT EXISTS messages_status ON messages (channel, status)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS clips_message ON clips (channel, msg_id)")
+        # Pending writes, keyed by primary key so repeated updates collapse
+        self.cursors: Dict[int, int] = {}
+        self.messages: Dict[Tuple[int, int], tuple] = {}
+        self.clips: Dict[str, tuple] = {}
+        self.last_flush = time.monotonic()
+        self.commits = 0
+
+    def cursor(self, channel: int, default: int = 0) -> int:
+        with self.lock:
+            if channel in self.cursors:
+                return self.cursors[channel]
+            row = self.db.execute("SELECT last_id FROM cursors WHERE channel = ?", (channel,)).fetchone()
+        return row[0] if row else default
+
+    def set_cursor(self, channel: int, last_id: int) -> None:
+        with self.lock:
+            self.cursors[channel] = last_id
+        self._maybe_flush()
+
+    def set_message(self, channel: int, msg_id: int, stage: str, status: str, error: Optional[str] = None) -> None:
+        with self.lock:
+            self.messages[(channel, msg_id)] = (channel, msg_id, stage, status, error, time.time())
+        self._maybe_flush()
+
+    def set_clip(self, clip_id: str, channel: int, msg_id: int, name: str, stage: str, status: str,
+                 s3_key: Optional[str] = None, error: Optional[str] = None) -> None:
+        with self.lock:
+            pending = self.clips.get(clip_id)
+            if s3_key is None and pending:
+                s3_key = pending[6]
+            self.clips[clip_id] = (clip_id, channel, msg_id, name, stage, status, s3_key, error, time.time())
+        self._maybe_flush()
+
+    def _maybe_flush(self) -> None:
+        waiting = len(self.cursors) + len(self.messages) + len(self.clips)
+        if waiting >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        self.last_flush = time.monotonic()
+        if not (self.cursors or self.messages or self.clips):
+            return
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?)",
+                                list(self.messages.values()))
+            self.db.executemany("""
+                INSERT INTO clips VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(clip_id) DO UPDATE SET
+                    stage = excluded.stage,
+                    status = excluded.status,
+                    s3_key = COALESCE(excluded.s3_key, clips.s3_key),
+                    error = excluded.error,
+                    updated_at = excluded.updated_at
+            """, list(self.clips.values()))
+            self.db.executemany("INSERT OR REPLACE INTO cursors VALUES (?, ?)", list(self.cursors.items()))
+        self.cursors.clear()
+        self.messages.clear()
+        self.clips.clear()
+        self.commits += 1
+
+    def incomplete(self, channel: int) -> List[int]:
+        """Ids of messages that failed or were interrupted, oldest first."""
+        marks = ",".join("?" * len(INCOMPLETE))
+        with self.lock:
+            self._flush()
+            rows = self.db.execute(f"SELECT msg_id FROM messages WHERE channel = ? AND status IN ({marks}) "
+                                   "ORDER BY msg_id", (channel, *INCOMPLETE)).fetchall()
+        return [row[0] for row in rows]
+
+    def counts(self, channel: int) -> Dict[str, int]:
+        with self.lock:
+            self._flush()
+            return dict(self.db.execute("SELECT status, COUNT(*) FROM messages WHERE channel = ? GROUP BY status",
+                                        (channel,)).fetchall())
+
+    def close(self) -> None:
+        with self.lock:
+            self._flush()
+            self.db.close()
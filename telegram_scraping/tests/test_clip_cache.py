@@ -0,0 +1,36 @@
+# tests/test_clip_cache.py
+# ClipCache eviction: the row count is kept without re-counting the table,
+# and the least recently used clips go first once it is full.
+
+import time
+
+from clip_cache import UPLOADED, TRANSCRIBED, ClipCache
+
+
+def rows(cache):
+    return cache.db.execute("SELECT COUNT(*) FROM clips").fetchone()[0]
+
+
+def test_least_recently_used_clips_are_evicted(tmp_path):
+    cache = ClipCache(str(tmp_path / "cache.db"), max_entries=3)
+    for name in "abc":
+        cache.mark(name, UPLOADED)
+        time.sleep(0.001)
+    cache.lookup(["a"])
+    cache.mark("b", TRANSCRIBED)  # an update, not a new row
+    assert cache.count == rows(cache) == 3
+    cache.mark("d", UPLOADED)
+    assert cache.count == rows(cache) == 3
+    assert set(cache.lookup("abcd")) == {"a", "b", "d"}
+
+
+def test_count_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ClipCache(path, max_entries=10)
+    for i in range(6):
+        cache.mark(str(i), UPLOADED)
+    cache.db.close()
+    again = ClipCache(path, max_entries=4)
+    assert again.count == 6
+    again.mark("new", UPLOADED)
+    assert again.count == rows(again) == 4
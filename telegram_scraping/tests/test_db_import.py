@@ -0,0 +1,98 @@
+# tests/test_db_import.py
+# import_transcripts from a moto bucket into SQLite: every transcript lands
+# once, failed fetches are counted, and fetched bodies waiting for the
+# writer never exceed the slot limit. import_keys only downloads transcripts
+# the manifest does not already have.
+
+import json
+import sqlite3
+import threading
+import time
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import db_import
+from db_import import TranscriptWriter, import_keys, import_transcripts
+
+BUCKET = "test-bucket"
+
+
+@pytest.fixture
+def s3():
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        for i in range(60):
+            body = {"jobName": f"job-{i}", "results": {"transcripts": [{"transcript": f"answer {i}"}]}}
+            client.put_object(Bucket=BUCKET, Key=f"transcripts/2024-01-01_-_Question_{i}-{i}.json",
+                              Body=json.dumps(body).encode())
+        yield client
+
+
+def writer():
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.execute("CREATE TABLE Question (ID INTEGER PRIMARY KEY, Title TEXT, Date TEXT, Transcription TEXT)")
+    return TranscriptWriter(conn, dialect="sqlite")
+
+
+def test_every_transcript_is_imported_once(s3):
+    w = writer()
+    assert import_transcripts(s3, w, BUCKET, workers=4) == 0
+    assert w.inserted == 60
+    again = TranscriptWriter(w.connection, dialect="sqlite")
+    assert import_transcripts(s3, again, BUCKET, workers=4) == 0
+    assert (again.inserted, again.updated, again.skipped) == (0, 0, 60)
+
+
+def test_failed_fetches_are_counted(s3, monkeypatch):
+    fetch = db_import.fetch_transcript
+
+    def flaky(s3, key, bucket):
+        if key.endswith(("-3.json", "-7.json")):
+            raise ConnectionError("injected failure")
+        return fetch(s3, key, bucket)
+
+    monkeypatch.setattr(db_import, "fetch_transcript", flaky)
+    w = writer()
+    assert import_transcripts(s3, w, BUCKET, workers=4) == 2
+    assert w.inserted == 58
+
+
+def test_unwritten_bodies_are_capped(s3, monkeypatch):
+    workers = 3
+    lock = threading.Lock()
+    counts = {"fetched": 0, "written": 0, "most": 0}
+    fetch, add = db_import.fetch_transcript, db_import.add_transcript
+
+    def counted_fetch(s3, key, bucket):
+        data = fetch(s3, key, bucket)
+        with lock:
+            counts["fetched"] += 1
+            counts["most"] = max(counts["most"], counts["fetched"] - counts["written"])
+        return data
+
+    def slow_add(*args):
+        time.sleep(0.005)  # a writer slower than the fetches
+        add(*args)
+        with lock:
+            counts["written"] += 1
+
+    monkeypatch.setattr(db_import, "fetch_transcript", counted_fetch)
+    monkeypatch.setattr(db_import, "add_transcript", slow_add)
+    w = writer()
+    assert import_transcripts(s3, w, BUCKET, workers=workers) == 0
+    assert w.inserted == 60
+    assert counts["most"] <= workers * 2
+
+
+def test_import_keys_skips_imported_transcripts_without_downloading(s3):
+    keys = [f"transcripts/2024-01-01_-_Question_{i}-{i}.json" for i in range(10)]
+    gets = []
+    s3.meta.events.register("before-call.s3.GetObject", lambda params, **kwargs: gets.append(params))
+    w = writer()
+    import_keys(s3, w, keys[:6], BUCKET)
+    assert (w.inserted, len(gets)) == (6, 6)
+    import_keys(s3, w, keys, BUCKET)
+    assert (w.inserted, w.skipped, len(gets)) == (10, 6, 10)
@@ -0,0 +1,160 @@
+# tests/test_part_journal.py
+# PartJournal round trips, and download_to_path resuming an interrupted
+# download from it: only missing or damaged parts are fetched again.
+
+import asyncio
+import os
+import zlib
+
+import pytest
+
+import FastTelethon
+import sender_pool
+from benchmarks.fakes import FakeChannelClient, FakeSenderPool
+from FastTelethon import JOURNAL_SUFFIX, PartJournal, download_to_path
+from transfer_tuning import DcStats
+
+PART_SIZE = 64 * 1024
+
+
+class CountingClient(FakeChannelClient):
+    """Counts GetFileRequests and, with fail_after, drops the connection after that many."""
+
+    def __init__(self, fail_after=None, **kwargs):
+        super().__init__(latency=0.001, jitter=0.002, slow_fraction=0.0, **kwargs)
+        self.fail_after = fail_after
+        self.fetched = []
+
+    async def _call(self, sender, request):
+        if hasattr(request, "offset"):
+            if self.fail_after is not None and len(self.fetched) >= self.fail_after:
+                raise ConnectionError("connection lost")
+            self.fetched.append(request.offset // PART_SIZE)
+        return await super()._call(sender, request)
+
+
+@pytest.fixture(autouse=True)
+def no_saved_stats(monkeypatch):
+    monkeypatch.setattr(FastTelethon, "dc_stats", DcStats(path=None, log_path=None))
+
+
+def post(client, payload):
+    sender_pool._pools[client] = FakeSenderPool(client)
+    return client.post_audio("https://t.me/test", "Q&A", payload).document
+
+
+def serve(client, document, payload):
+    client.files[document.id] = payload
+    sender_pool._pools[client] = FakeSenderPool(client)
+
+
+async def download(client, document, path):
+    # The fake client takes the running loop when built, so every client is
+    # created inside the coroutine handed to asyncio.run
+    return await asyncio.wait_for(
+        download_to_path(client, document, path, part_size_kb=PART_SIZE / 1024, connection_count=3),
+        timeout=30)
+
+
+def test_journal_round_trip(tmp_path):
+    path = str(tmp_path / "a.journal")
+    journal = PartJournal(path, 10 * PART_SIZE + 5, PART_SIZE)
+    journal.start()
+    journal.record(3, b"x" * PART_SIZE)
+    journal.record(10, b"tail!")
+    journal.close()
+
+    again = PartJournal(path, 10 * PART_SIZE + 5, PART_SIZE)
+    again.load()
+    assert again.done == {3: zlib.crc32(b"x" * PART_SIZE), 10: zlib.crc32(b"tail!")}
+    assert again.part_count == 11
+    assert again.part_length(10) == 5
+    assert not again.complete
+    assert PartJournal.saved_part_size(path, 10 * PART_SIZE + 5) == PART_SIZE
+
+
+def test_journal_for_another_file_is_ignored(tmp_path):
+    path = str(tmp_path / "a.journal")
+    journal = PartJournal(path, 4 * PART_SIZE, PART_SIZE)
+    journal.start()
+    journal.record(0, b"x" * PART_SIZE)
+    journal.close()
+
+    other_size = PartJournal(path, 5 * PART_SIZE, PART_SIZE)
+    other_size.load()
+    other_part_size = PartJournal(path, 4 * PART_SIZE, PART_SIZE * 2)
+    other_part_size.load()
+    assert other_size.done == {} and other_part_size.done == {}
+    assert PartJournal.saved_part_size(path, 5 * PART_SIZE) == 0
+    assert PartJournal.saved_part_size(str(tmp_path / "missing"), 5 * PART_SIZE) == 0
+
+
+def test_torn_last_line_is_dropped(tmp_path):
+    path = tmp_path / "a.journal"
+    path.write_text(f"{4 * PART_SIZE} {PART_SIZE}\n0 123\n1 456\n2")
+    journal = PartJournal(str(path), 4 * PART_SIZE, PART_SIZE)
+    journal.load()
+    assert journal.done == {0: 123, 1: 456}
+
+
+def test_verify_drops_parts_whose_bytes_are_wrong(tmp_path):
+    data = bytes(range(256)) * (3 * PART_SIZE // 256)
+    out = tmp_path / "file"
+    out.write_bytes(data[:PART_SIZE] + b"\0" * PART_SIZE + data[2 * PART_SIZE:])
+    journal = PartJournal(str(tmp_path / "file.journal"), len(data), PART_SIZE)
+    journal.done = {i: zlib.crc32(data[i * PART_SIZE:(i + 1) * PART_SIZE]) for i in range(3)}
+    with open(out, "rb") as f:
+        journal.verify(f.fileno())
+    assert sorted(journal.done) == [0, 2]
+
+
+def test_download_resumes_with_only_the_missing_parts(tmp_path):
+    payload = os.urandom(20 * PART_SIZE + 1000)
+    path = str(tmp_path / "audio.mp3")
+
+    async def run():
+        first = CountingClient(fail_after=8)
+        document = post(first, payload)
+        with pytest.raises(ConnectionError):
+            await download(first, document, path)
+        journal = PartJournal(path + JOURNAL_SUFFIX, len(payload), PART_SIZE)
+        journal.load()
+
+        second = CountingClient()
+        serve(second, document, payload)
+        return journal, second, await download(second, document, path)
+
+    journal, second, result = asyncio.run(run())
+    assert 0 < len(journal.done) <= 8
+    assert result == path
+    with open(path, "rb") as f:
+        assert f.read() == payload
+    assert sorted(second.fetched) == sorted(set(range(21)) - set(journal.done))
+    assert not os.path.exists(path + JOURNAL_SUFFIX)
+
+
+def test_damaged_parts_are_fetched_again(tmp_path):
+    payload = os.urandom(12 * PART_SIZE)
+    path = str(tmp_path / "audio.mp3")
+
+    async def run():
+        first = CountingClient(fail_after=6)
+        document = post(first, payload)
+        with pytest.raises(ConnectionError):
+            await download(first, document, path)
+        journal = PartJournal(path + JOURNAL_SUFFIX, len(payload), PART_SIZE)
+        journal.load()
+        damaged = min(journal.done)
+        with open(path, "r+b") as f:
+            f.seek(damaged * PART_SIZE)
+            f.write(b"\0" * 16)
+
+        second = CountingClient()
+        serve(second, document, payload)
+        await download(second, document, path)
+        return damaged, second
+
+    damaged, second = asyncio.run(run())
+    with open(path, "rb") as f:
+        assert f.read() == payload
+    assert damaged in second.fetched
@@ -0,0 +1,186 @@
+# tests/test_qna_parser.py
+# qna_parser against the is_qna_message / extract_date / parse_timestamps
+# functions it replaced, over a fuzzed corpus of channel posts, plus the
+# timestamp formats only the new parser reads. The throughput tests use
+# pytest-benchmark:
+#
+#   cd telegram_scraping && python -m pytest tests/test_qna_parser.py --benchmark-only
+
+import random
+import re
+import timeit
+
+import pytest
+
+from qna_parser import (MONTHS, ParsedMessage, extract_date, is_qna_message, parse_message, parse_timestamps,
+                        sanitize_filename)
+
+
+# === The functions qna_parser replaced, as they were ===
+def legacy_is_qna_message(msg_text):
+    if not msg_text:
+        return False
+    cleaned = re.sub(r"https?://t\.me/\S+", "", msg_text, flags=re.IGNORECASE)
+    cleaned = re.sub(r"\s+", " ", cleaned).strip()
+    return "livestream counselling q&a timestamps" in cleaned.lower()
+
+
+def legacy_extract_date(text):
+    text = re.sub(r"https?://t\.me/\S+", "", text)
+    text = text.replace("\n", " ").strip()
+    m = re.search(
+        r"(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{1,2})(?:st|nd|rd|th)?,\s*(\d{4})",
+        text,
+    )
+    if not m:
+        return None
+    month, day, year = m.groups()
+    months = {
+        "January": "01", "February": "02", "March": "03", "April": "04", "May": "05",
+        "June": "06", "July": "07", "August": "08", "September": "09",
+        "October": "10", "November": "11", "December": "12"
+    }
+    return f"{year}-{day.zfill(2)}-{months[month]}"
+
+
+def legacy_parse_timestamps(text):
+    lines = text.splitlines()
+    pattern = re.compile(r"^(\d{1,2}:\d{2}(?::\d{2})?)\s*[-–]?\s*(.+)$")
+    items = []
+    for line in lines:
+        m = pattern.match(line.strip())
+        if m:
+            time_str, question = m.groups()
+            parts = [int(x) for x in time_str.split(":")]
+            if len(parts) == 2:
+                secs = parts[0] * 60 + parts[1]
+            else:
+                secs = parts[0] * 3600 + parts[1] * 60 + parts[2]
+            items.append((secs, question.strip()))
+    return items
+
+
+# === Fuzzed corpus ===
+WORDS = ["marriage", "salah", "zakat", "parents", "work", "riba", "dua", "fasting", "quran", "hajj",
+         "السلام", "الصلاة", "وعليكم", "&", "-", "–", ":", "?", "2025", "5th"]
+
+
+def fuzz_message(rng, new_formats=False):
+    lines = []
+    if rng.random() < 0.4:
+        marker = rng.choice(["Livestream Counselling Q&A Timestamps", "livestream  counselling\nQ&A timestamps",
+                             "LIVESTREAM COUNSELLING Q&A TIMESTAMPS:", "Livestream Counselling Q and A"])
+        lines.append(marker)
+    if rng.random() < 0.7:
+        month = rng.choice(list(MONTHS))
+        suffix = rng.choice(["", "st", "nd", "rd", "th"])
+        lines.append(f"{month} {rng.randint(1, 31)}{suffix},{rng.choice(['', ' ', '  '])}{rng.randint(2019, 2026)}")
+    if rng.random() < 0.5:
+        lines.append(f"https://t.me/channel/{rng.randint(1, 99999)}")
+    for _ in range(rng.randint(0, 25)):
+        h, m, s = rng.randint(0, 3), rng.randint(0, 59), rng.randint(0, 59)
+        stamp = rng.choice([f"{m}:{s:02d}", f"{h}:{m:02d}:{s:02d}", f"{m:02d}:{s:02d}"])
+        sep = rng.choice([" - ", " – ", "-", " ", "  -  "])
+        if new_formats:
+            stamp = rng.choice([f"[{stamp}]", f"({stamp})", stamp])
+            sep = rng.choice([sep, " — "])
+        question = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 12)))
+        lines.append(rng.choice(["", " ", "\t"]) + stamp + sep + question + rng.choice(["", " ", "?"]))
+        if rng.random() < 0.1:
+            lines.append(rng.choice(["", "Part two", "https://t.me/x/1", "12 - not a time"]))
+    rng.shuffle(lines) if rng.random() < 0.1 else None
+    return rng.choice(["\n", "\r\n"]).join(lines)
+
+
+POST = """Livestream Counselling Q&A Timestamps
+January 10th, 2025
+https://t.me/channel/123
+0:05 - Question one
+12:30 – Question two
+1:02:03 Question three https://t.me/x/1"""
+
+
+def legacy(text):
+    return legacy_is_qna_message(text), legacy_extract_date(text), legacy_parse_timestamps(text)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_fuzzed_posts_parse_as_before(seed):
+    rng = random.Random(seed)
+    for _ in range(1000):
+        text = fuzz_message(rng)
+        expected = legacy(text)
+        assert tuple(parse_message(text)) == expected, text
+        assert (is_qna_message(text), extract_date(text), parse_timestamps(text)) == expected, text
+
+
+def test_require_qna_matches_the_full_parse_for_qna_posts():
+    rng = random.Random(99)
+    for _ in range(2000):
+        text = fuzz_message(rng)
+        full = parse_message(text)
+        expected = full if full.is_qna else ParsedMessage(False, None, [])
+        assert parse_message(text, require_qna=True) == expected, text
+
+
+def test_post():
+    assert parse_message(POST) == ParsedMessage(True, "2025-10-01", [
+        (5, "Question one"), (750, "Question two"), (3723, "Question three https://t.me/x/1")])
+    assert parse_message(POST) == legacy(POST)
+
+
+@pytest.mark.parametrize("text", [None, "", "Just a post", "Q&A timestamps\n0:05 - question"])
+def test_not_qna(text):
+    assert not parse_message(text).is_qna
+    assert parse_message(text, require_qna=True) == ParsedMessage(False, None, [])
+
+
+def test_bracketed_timestamps_and_em_dash():
+    text = "[1:02:03] Question one\n(12:30) Question two\n01:02 — Question three\n0:05 - Question four"
+    assert parse_message(text).items == [
+        (3723, "Question one"), (750, "Question two"), (62, "Question three"), (5, "Question four")]
+
+
+def test_fuzzed_new_format_posts():
+    rng = random.Random(3)
+    for _ in range(500):
+        text = fuzz_message(rng, new_formats=True)
+        items = parse_message(text).items
+        bracketed = [line for line in text.splitlines() if line.strip()[:1] in ("[", "(")]
+        assert len(items) >= len(bracketed), text
+        for seconds, question in items:
+            assert seconds >= 0
+            assert question and not question.startswith(("]", ")")), text
+
+
+def test_sanitize_filename():
+    assert sanitize_filename('a/b: "c"?') == "a_b_ _c__"
+    assert len(sanitize_filename("x" * 500)) == 180
+
+
+# === Throughput ===
+@pytest.fixture(scope="module")
+def corpus():
+    rng = random.Random(7)
+    return [fuzz_message(rng) for _ in range(2000)]
+
+
+def parse_all(fn, corpus):
+    for text in corpus:
+        fn(text)
+
+
+def only_qna(text):
+    return legacy_is_qna_message(text) and (legacy_extract_date(text), legacy_parse_timestamps(text))
+
+
+@pytest.mark.parametrize("new, old", [
+    (parse_message, legacy),
+    (lambda text: parse_message(text, require_qna=True), only_qna),
+], ids=["all three", "only Q&A posts parsed"])
+def test_parse_message_beats_the_old_functions(benchmark, corpus, new, old):
+    benchmark.group = "qna_parser"
+    benchmark.pedantic(parse_all, args=(new, corpus), rounds=5)
+    if benchmark.stats:  # None with --benchmark-disable
+        before = min(timeit.repeat(lambda: parse_all(old, corpus), number=1, repeat=3))
+        assert benchmark.stats.stats.min < before
@@ -0,0 +1,198 @@
+# tests/test_reassembly_window.py
+# ReassemblyWindow ordering, back-pressure and error paths, and the sliding
+# window download end to end against the fake MTProto senders.
+
+import asyncio
+import hashlib
+
+import pytest
+
+from benchmarks.fakes import FakeSenderPool, FakeTelegramClient, FakeTransferrer, SyntheticPayload, fake_location
+from FastTelethon import DownloadSink, ReassemblyWindow
+
+
+class ListSink(DownloadSink):
+    def __init__(self, size):
+        super().__init__(size)
+        self.data = bytearray(size)
+
+    def write(self, offset, data):
+        self.data[offset:offset + len(data)] = data
+        self.received += len(data)
+
+
+async def finished_task(error=None):
+    async def body():
+        if error:
+            raise error
+
+    task = asyncio.ensure_future(body())
+    await asyncio.gather(task, return_exceptions=True)
+    return task
+
+
+def test_ordered_get_returns_parts_in_sequence():
+    async def run():
+        window = ReassemblyWindow(4)
+        window.running = 1
+        for part in (2, 0, 3, 1):
+            window.put(part, bytes([part]))
+        return [await window.get() for _ in range(4)]
+
+    assert asyncio.run(run()) == [(0, b"\x00"), (1, b"\x01"), (2, b"\x02"), (3, b"\x03")]
+
+
+def test_ordered_get_waits_for_the_missing_part():
+    async def run():
+        window = ReassemblyWindow(4)
+        window.running = 1
+        window.put(1, b"b")
+        getter = asyncio.ensure_future(window.get())
+        await asyncio.sleep(0)
+        assert not getter.done()
+        window.put(0, b"a")
+        return await getter, await window.get()
+
+    assert asyncio.run(run()) == ((0, b"a"), (1, b"b"))
+
+
+def test_ordered_reserve_holds_senders_too_far_ahead():
+    async def run():
+        window = ReassemblyWindow(2)
+        window.running = 1
+        await window.reserve(1)  # inside the window: returns at once
+        ahead = asyncio.ensure_future(window.reserve(2))
+        await asyncio.sleep(0)
+        assert not ahead.done()
+        window.put(0, b"a")
+        await asyncio.sleep(0)
+        assert not ahead.done()  # arriving is not enough, the reader has to move on
+        await window.get()
+        await asyncio.wait_for(ahead, 1)
+
+    asyncio.run(run())
+
+
+def test_unordered_get_hands_out_whatever_arrived():
+    async def run():
+        window = ReassemblyWindow(2, ordered=False)
+        window.running = 1
+        window.put(5, b"f")
+        window.put(3, b"d")
+        full = asyncio.ensure_future(window.reserve(7))
+        await asyncio.sleep(0)
+        assert not full.done()  # two parts held: the cap
+        first = await window.get()
+        await asyncio.wait_for(full, 1)
+        return first, await window.get()
+
+    assert asyncio.run(run()) == ((3, b"d"), (5, b"f"))
+
+
+def test_sink_gets_the_bytes_and_get_only_the_length():
+    async def run():
+        sink = ListSink(10)
+        seen = []
+        window = ReassemblyWindow(4, sink=sink, part_size=4, on_part=lambda part, view: seen.append(bytes(view)))
+        window.running = 1
+        window.put(1, b"efgh")
+        window.put(0, b"abcd")
+        window.put(2, b"ij")
+        return sink, seen, [await window.get() for _ in range(3)]
+
+    sink, seen, got = asyncio.run(run())
+    assert bytes(sink.data) == b"abcdefghij"
+    assert sink.received == 10
+    assert seen == [b"efgh", b"abcd", b"ij"]
+    assert got == [(0, 4), (1, 4), (2, 2)]
+
+
+def test_get_returns_none_once_every_sender_is_done():
+    async def run():
+        window = ReassemblyWindow(4)
+        window.running = 1
+        window.put(0, b"a")
+        window.sender_done(await finished_task())
+        return await window.get(), await window.get()
+
+    assert asyncio.run(run()) == ((0, b"a"), None)
+
+
+def test_sender_error_reaches_the_reader():
+    async def run():
+        window = ReassemblyWindow(4)
+        window.running = 2
+        getter = asyncio.ensure_future(window.get())
+        await asyncio.sleep(0)
+        window.sender_done(await finished_task(ConnectionError("lost")))
+        await getter
+
+    with pytest.raises(ConnectionError, match="lost"):
+        asyncio.run(run())
+
+
+def test_parts_already_received_are_read_before_the_error():
+    async def run():
+        window = ReassemblyWindow(4)
+        window.running = 1
+        window.put(0, b"a")
+        window.sender_done(await finished_task(ConnectionError("lost")))
+        first = await window.get()
+        with pytest.raises(ConnectionError):
+            await window.get()
+        return first
+
+    assert asyncio.run(run()) == (0, b"a")
+
+
+@pytest.mark.parametrize("connections", [1, 3, 8])
+def test_download_yields_the_file_in_order(connections):
+    size = 5 * 1024 * 1024 + 123
+    payload = SyntheticPayload(size, period=256 * 1024)
+
+    async def run():
+        client = FakeTelegramClient(payload, latency=0.001, jitter=0.005, slow_fraction=0.3, seed=connections)
+        digest = hashlib.sha1()
+        async for chunk in FakeTransferrer(client).download(fake_location(size), size, 256, connections):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    expected = hashlib.sha1(b"".join(payload[i:i + 256 * 1024] for i in range(0, size, 256 * 1024)))
+    assert asyncio.run(run()) == expected.hexdigest()
+
+
+@pytest.mark.parametrize("connections", [1, 4])
+def test_download_fails_when_no_connection_can_be_made(connections):
+    class NoConnections(FakeSenderPool):
+        async def _connect(self, dc_id):
+            raise ConnectionError("cannot connect")
+
+    size = 10 * 256 * 1024
+
+    async def run():
+        client = FakeTelegramClient(SyntheticPayload(size), latency=0.001, jitter=0.001)
+        received = 0
+        async for chunk in FakeTransferrer(client, pool=NoConnections(client)).download(
+                fake_location(size), size, 256, connections):
+            received += len(chunk)
+        return received
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(asyncio.wait_for(run(), timeout=10))
+
+
+def test_download_fails_when_senders_leave_parts_unserved():
+    class Quitter(FakeTransferrer):
+        async def _run_download_sender(self, sender, parts, window, controller):
+            self.senders.remove(sender)
+            await self._release(sender)
+
+    size = 10 * 256 * 1024
+
+    async def run():
+        client = FakeTelegramClient(SyntheticPayload(size), latency=0.001, jitter=0.001)
+        async for _ in Quitter(client).download(fake_location(size), size, 256, 2):
+            pass
+
+    with pytest.raises(IOError, match="0 of 10 parts"):
+        asyncio.run(asyncio.wait_for(run(), timeout=10))
@@ -0,0 +1,142 @@
+# tests/test_s3_uploader.py
+# AsyncUploader against a moto bucket with injected failures: retries,
+# per-clip results, the concurrency cap, and scraping.py only handing the
+# clips that reached S3 to Transcribe.
+
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import s3_uploader
+import scraping
+from benchmarks.fakes import FakeTranscribeClient
+from clip_cache import ClipCache
+from s3_uploader import AsyncUploader
+from splitter import Clip
+from state_store import StateStore
+from transcribe_tracker import JobStore
+
+BUCKET = "test-bucket"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setattr(s3_uploader, "RETRY_BASE_SECONDS", 0.001)
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def fail_puts(s3, failures):
+    """Fails PutObject for a key while failures[key] > 0, counting it down; -1 fails every time."""
+    attempts = {}
+
+    def before_put(params, **kwargs):
+        key = params["Key"]
+        attempts[key] = attempts.get(key, 0) + 1
+        if failures.get(key, 0):
+            failures[key] -= 1
+            raise ConnectionError(f"injected failure for {key}")
+
+    s3.meta.events.register_first("before-parameter-build.s3.PutObject", before_put)
+    return attempts
+
+
+def make_file(folder, name, size=1024):
+    path = os.path.join(folder, name)
+    with open(path, "wb") as f:
+        f.write(os.urandom(size))
+    return path
+
+
+def test_failed_attempts_are_retried(s3, tmp_path):
+    attempts = fail_puts(s3, {"clip.mp3": 2})
+    path = make_file(tmp_path, "clip.mp3")
+    uploader = AsyncUploader(s3, BUCKET, retries=4)
+    result = asyncio.run(uploader.upload(path, "clip.mp3"))
+    uploader.close()
+    assert result.ok and result.attempts == 3 and result.error is None
+    assert attempts["clip.mp3"] == 3
+    assert s3.get_object(Bucket=BUCKET, Key="clip.mp3")["Body"].read() == open(path, "rb").read()
+
+
+def test_results_per_clip(s3, tmp_path):
+    fail_puts(s3, {"bad.mp3": -1, "flaky.mp3": 1})
+    items = [(make_file(tmp_path, name), name) for name in ("good.mp3", "bad.mp3", "flaky.mp3")]
+    items.append((str(tmp_path / "missing.mp3"), "missing.mp3"))
+    uploader = AsyncUploader(s3, BUCKET, retries=3)
+    results = asyncio.run(uploader.upload_many(items))
+    uploader.close()
+
+    by_key = {r.key: r for r in results}
+    assert [r.key for r in results] == ["good.mp3", "bad.mp3", "flaky.mp3", "missing.mp3"]
+    assert by_key["good.mp3"].ok and by_key["good.mp3"].attempts == 1 and by_key["good.mp3"].size == 1024
+    assert by_key["flaky.mp3"].ok and by_key["flaky.mp3"].attempts == 2
+    assert not by_key["bad.mp3"].ok and by_key["bad.mp3"].attempts == 3
+    assert "injected failure" in by_key["bad.mp3"].error
+    assert not by_key["missing.mp3"].ok
+    keys = {o["Key"] for o in s3.list_objects_v2(Bucket=BUCKET).get("Contents", [])}
+    assert keys == {"good.mp3", "flaky.mp3"}
+
+
+def test_uploads_in_flight_are_capped(s3, tmp_path):
+    lock = threading.Lock()
+    in_flight = [0, 0]  # now, most seen
+
+    def before_send(request, **kwargs):
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+        time.sleep(0.02)
+        with lock:
+            in_flight[0] -= 1
+
+    s3.meta.events.register_first("before-send.s3.PutObject", before_send)
+    items = [(make_file(tmp_path, f"c{i}.mp3"), f"c{i}.mp3") for i in range(12)]
+    uploader = AsyncUploader(s3, BUCKET, concurrency=3)
+    results = asyncio.run(uploader.upload_many(items))
+    uploader.close()
+    assert all(r.ok for r in results)
+    assert 1 < in_flight[1] <= 3
+
+
+def test_only_uploaded_clips_go_to_transcribe(s3, tmp_path, monkeypatch):
+    monkeypatch.setattr(scraping, "SPLIT_DIR", str(tmp_path))
+    monkeypatch.setattr(scraping, "DOWNLOADS_DIR", str(tmp_path))
+    monkeypatch.setattr(scraping, "s3_bucket", BUCKET)
+    monkeypatch.setattr(scraping, "TRANSCRIBE_BATCH_SECONDS", 0)
+    transcribe = FakeTranscribeClient(s3, job_seconds=60)
+    scraping.setup(SimpleNamespace(), s3, transcribe, JobStore(str(tmp_path / "jobs.db")),
+                   ClipCache(str(tmp_path / "cache.db")), StateStore(str(tmp_path / "state.db")))
+
+    message = SimpleNamespace(id=7, chat_id=-100, date=datetime.now(timezone.utc),
+                              document=SimpleNamespace(id=42, size=0))
+    ts_items = [(0, "First question"), (60, "Second question"), (120, "Third question")]
+    job = scraping.QnaJob(message, ts_items, "2024-01-01")
+    for start, question in ts_items:
+        clip = Clip(question, start * 1000, start * 1000 + 60000)
+        job.add_clip(clip, make_file(tmp_path, os.path.basename(job.clip_path(clip))))
+    failed_key = job.clips[1][2]
+    fail_puts(s3, {failed_key: -1})
+
+    async def run():
+        outcomes = await asyncio.gather(*[scraping.upload_clip(job, entry) for entry in job.clips])
+        job.record_uploads(outcomes)
+        await scraping.transcribe_stage(job)
+
+    asyncio.run(run())
+    scraping.uploader.close()
+    scraping.state.close()
+
+    sent = {job["Media"]["MediaFileUri"] for job in transcribe.jobs.values()}
+    assert sent == {f"s3://{BUCKET}/{entry[2]}" for entry in job.clips if entry[2] != failed_key}
+    assert [entry[2] for entry in job.uploaded] == [job.clips[0][2], job.clips[2][2]]
+    assert job.failed_clips == 1
@@ -0,0 +1,72 @@
+# tests/test_search_index.py
+# SearchIndex matching through normalize(), and snippets quoting the
+# transcription as imported rather than its folded, indexed form.
+
+import sqlite3
+
+from search_index import SearchIndex, original_snippet
+
+TEXT = "Brother asked about الصلاة في المسجد during Ramadan, and the prayers of travellers on a long journey"
+
+
+def index_with(*rows):
+    index = SearchIndex(":memory:")
+    for title, date, transcription in rows:
+        index.add(title, date, transcription)
+    index.flush()
+    return index
+
+
+def test_snippet_preserves_the_source_text():
+    index = index_with(("Prayer in the mosque", "2024-01-01", TEXT))
+    [hit] = index.search("صلاة مسجد")
+    assert hit.title == "Prayer in the mosque"
+    assert "[الصلاة] في [المسجد]" in hit.snippet
+    assert "Ramadan," in hit.snippet
+    [hit] = index.search("ramadan")
+    assert "[Ramadan,]" in hit.snippet
+
+
+def test_snippet_window_and_ellipses():
+    index = index_with(("Travel", "2024-01-02", TEXT))
+    [hit] = index.search("journey")
+    assert hit.snippet.startswith("…")
+    assert hit.snippet.endswith("[journey]")
+    assert len(hit.snippet.lstrip("…").split()) == 12
+
+
+def test_adjacent_hits_share_brackets():
+    marked = "a \x02b\x03 \x02c\x03 d"
+    assert original_snippet(marked, "A B C D") == "A [B C] D"
+    assert original_snippet("\x02a b\x03 c", "A B C") == "[A B] C"
+
+
+def test_misaligned_text_is_shown_unmarked():
+    assert original_snippet("\x02a\x03", "A B") == "A B"
+
+
+def test_add_replaces_the_indexed_text():
+    index = index_with(("Q", "2024-01-01", "about zakat"))
+    index.add("Q", "2024-01-01", "about fasting")
+    index.flush()
+    assert index.search("zakat") == []
+    assert index.search("fasting")[0].snippet == "about [fasting]"
+    assert index.count("fasting") == 1
+
+
+def test_index_without_originals_is_reset(tmp_path):
+    path = str(tmp_path / "index.db")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE questions (id INTEGER PRIMARY KEY, title TEXT NOT NULL, date TEXT NOT NULL, "
+               "UNIQUE (title, date))")
+    db.execute("CREATE VIRTUAL TABLE question_text USING fts5(title, transcription)")
+    db.execute("INSERT INTO questions (id, title, date) VALUES (1, 'q', '2024-01-01')")
+    db.execute("INSERT INTO question_text (rowid, title, transcription) VALUES (1, 'q', 'zakat')")
+    db.commit()
+    db.close()
+
+    index = SearchIndex(path)
+    assert index.search("zakat") == []
+    index.add("q", "2024-01-01", "Zakat")
+    index.flush()
+    assert index.search("zakat")[0].snippet == "[Zakat]"
@@ -0,0 +1,102 @@
+# tests/test_sender_pool.py
+# SenderPool with fake connections: acquire_many taking its senders all at
+# once, waiters waking when a slot frees up, and failed connects giving
+# their slots back.
+
+import asyncio
+
+import pytest
+
+from benchmarks.fakes import FakeSenderPool, FakeTelegramClient
+
+DC = 2
+
+
+def run(body):
+    async def main():
+        return await asyncio.wait_for(body(), timeout=10)
+
+    return asyncio.run(main())
+
+
+def test_acquire_many_waits_for_all_of_them():
+    async def body():
+        pool = FakeSenderPool(FakeTelegramClient(), max_total=4)
+        held = await pool.acquire_many(DC, 2)
+        waiter = asyncio.ensure_future(pool.acquire_many(DC, 3))
+        await asyncio.sleep(0.01)
+        assert not waiter.done() and pool.open == 2  # nothing taken while it waits
+        await pool.release(DC, held[0])
+        senders = await waiter
+        assert len(senders) == 3 and pool.open == 4
+        assert held[0] in senders  # the idle one is reused
+        assert (pool.created, pool.reused) == (4, 1)
+
+    run(body)
+
+
+def test_concurrent_multi_sender_transfers_do_not_deadlock():
+    async def body():
+        pool = FakeSenderPool(FakeTelegramClient(), max_total=40)
+
+        async def transfer():
+            senders = await pool.acquire_many(DC, 8)
+            await asyncio.sleep(0.001)
+            for sender in senders:
+                await pool.release(DC, sender)
+
+        await asyncio.gather(*[transfer() for _ in range(45)])
+        assert pool.open <= 40
+
+    run(body)
+
+
+def test_count_is_capped_at_the_pool_size():
+    async def body():
+        pool = FakeSenderPool(FakeTelegramClient(), max_total=3)
+        assert len(await pool.acquire_many(DC, 8)) == 3
+
+    run(body)
+
+
+def test_dropping_a_broken_sender_wakes_waiters():
+    async def body():
+        pool = FakeSenderPool(FakeTelegramClient(), max_total=1)
+        sender = await pool.acquire(DC)
+        waiter = asyncio.ensure_future(pool.acquire(DC))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        await pool.release(DC, sender, healthy=False)
+        assert await waiter is not sender
+        assert pool.open == 1
+
+    run(body)
+
+
+def test_idle_senders_of_other_dcs_make_room():
+    async def body():
+        pool = FakeSenderPool(FakeTelegramClient(), max_total=3)
+        for sender in await pool.acquire_many(4, 3):
+            await pool.release(4, sender)
+        senders = await pool.acquire_many(DC, 2)
+        assert len(senders) == 2 and pool.open == 3 and len(pool.idle[4]) == 1
+
+    run(body)
+
+
+def test_failed_connect_gives_everything_back():
+    class FailingPool(FakeSenderPool):
+        async def _connect(self, dc_id):
+            self.attempts = getattr(self, "attempts", 0) + 1
+            if self.attempts == 3:
+                raise ConnectionError("connect failed")
+            return await super()._connect(dc_id)
+
+    async def body():
+        pool = FailingPool(FakeTelegramClient(), max_total=4)
+        with pytest.raises(ConnectionError):
+            await pool.acquire_many(DC, 4)
+        assert pool.open == 3 and len(pool.idle[DC]) == 3  # the ones that connected wait idle
+        assert len(await pool.acquire_many(DC, 4)) == 4
+
+    run(body)
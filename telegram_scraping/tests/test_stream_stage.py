@@ -0,0 +1,70 @@
+# tests/test_stream_stage.py
+# scraping.stream_stage with a stubbed download: a whole stream uploads
+# every clip, and one that ends early fails the job without uploading the
+# clip it was cutting.
+
+import asyncio
+import os
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import scraping
+from benchmarks.fakes import FakeTranscribeClient, fake_mp3
+from clip_cache import ClipCache
+from state_store import StateStore
+from transcribe_tracker import JobStore
+
+BUCKET = "test-bucket"
+AUDIO = fake_mp3(30)
+TS_ITEMS = [(0, "First question"), (10, "Second question"), (20, "Third question")]
+
+
+@pytest.fixture
+def s3(tmp_path, monkeypatch):
+    monkeypatch.setattr(scraping, "SPLIT_DIR", str(tmp_path))
+    monkeypatch.setattr(scraping, "s3_bucket", BUCKET)
+    monkeypatch.setattr(scraping, "MIN_CLIP_MS", 1000)
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        scraping.setup(SimpleNamespace(), client, FakeTranscribeClient(), JobStore(str(tmp_path / "jobs.db")),
+                       ClipCache(str(tmp_path / "cache.db")), StateStore(str(tmp_path / "state.db")))
+        yield client
+        scraping.uploader.close()
+        scraping.state.close()
+
+
+def stream(monkeypatch, data):
+    async def fake_download(client, document):
+        for offset in range(0, len(data), 4096):
+            yield data[offset:offset + 4096]
+
+    monkeypatch.setattr(scraping, "iter_download", fake_download)
+    message = SimpleNamespace(id=7, chat_id=-100, date=datetime.now(timezone.utc),
+                              document=SimpleNamespace(id=42, size=len(AUDIO)))
+    return scraping.QnaJob(message, TS_ITEMS, "2024-01-01")
+
+
+def uploaded(s3):
+    return sorted(o["Key"] for o in s3.list_objects_v2(Bucket=BUCKET).get("Contents", []))
+
+
+def test_whole_stream_uploads_every_clip(s3, monkeypatch):
+    job = asyncio.run(scraping.stream_stage(stream(monkeypatch, AUDIO)))
+    assert len(job.uploaded) == 3 and job.streamed
+    assert uploaded(s3) == sorted(entry[2] for entry in job.clips)
+
+
+def test_short_stream_fails_the_job(s3, monkeypatch, tmp_path):
+    job = stream(monkeypatch, AUDIO[:len(AUDIO) * 3 // 4])  # ends part way through the third clip
+    with pytest.raises(IOError, match="stopped at"):
+        asyncio.run(scraping.stream_stage(job))
+    assert not job.streamed
+    assert uploaded(s3) == sorted(entry[2] for entry in job.clips)
+    assert [entry[0] for entry in job.clips] == ["2024-01-01 - First question.mp3",
+                                                 "2024-01-01 - Second question.mp3"]
+    assert not any("Third question" in name for name in os.listdir(tmp_path))
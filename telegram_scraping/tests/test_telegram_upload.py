@@ -0,0 +1,44 @@
+# tests/test_telegram_upload.py
+# ParallelTransferrer.upload_file against the fake client: the parts add up
+# to the file, and many uploads sharing one sender pool all finish.
+
+import asyncio
+import io
+import os
+
+from benchmarks.fakes import FakeSenderPool, FakeTelegramClient, FakeTransferrer
+
+
+def test_parts_add_up_to_the_file():
+    payload = os.urandom(3 * 512 * 1024 + 100)
+
+    async def run():
+        client = FakeTelegramClient(latency=0.001, jitter=0.001, slow_fraction=0)
+        input_file = await FakeTransferrer(client).upload_file(io.BytesIO(payload), len(payload), "clip.mp3",
+                                                               part_size_kb=512, connection_count=3)
+        return client, input_file
+
+    client, input_file = asyncio.run(run())
+    assert input_file.parts == 4
+    assert b"".join(client.uploaded[i] for i in sorted(client.uploaded)) == payload
+
+
+def test_concurrent_uploads_on_a_full_pool_finish():
+    # 45 uploads of 8 senders each on a 40-connection pool used to deadlock,
+    # every connection held by an upload waiting for more
+    payload = os.urandom(8 * 64 * 1024)
+
+    async def run():
+        client = FakeTelegramClient(latency=0.001, jitter=0.001, slow_fraction=0)
+        pool = FakeSenderPool(client, max_total=40)
+
+        async def upload():
+            return await FakeTransferrer(client, pool=pool).upload_file(
+                io.BytesIO(payload), len(payload), "clip.mp3", part_size_kb=64, connection_count=8)
+
+        files = await asyncio.wait_for(asyncio.gather(*[upload() for _ in range(45)]), timeout=10)
+        return pool, files
+
+    pool, files = asyncio.run(run())
+    assert all(f.parts == 8 for f in files)
+    assert pool.open <= 40
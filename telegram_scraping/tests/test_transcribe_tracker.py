@@ -0,0 +1,190 @@
+# tests/test_transcribe_tracker.py
+# TranscribeTracker against the fake Transcribe client: terminal states,
+# paging stopping at the oldest pending job, backing off while throttled,
+# on_complete being retried until it succeeds, and make_db_importer keeping
+# one TranscriptWriter across batches.
+
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from benchmarks.fakes import FakeTranscribeClient
+from transcribe_tracker import PAGE_SIZE, JobStore, TranscribeTracker
+
+
+class ThrottlingException(Exception):
+    pass
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"))
+
+
+def start(transcribe, store, name, failure_rate=0.0, job_seconds=0.0):
+    # With job_seconds=0 the fake finishes the job as it starts
+    transcribe.failure_rate = failure_rate
+    transcribe.job_seconds = job_seconds
+    transcribe.start_transcription_job(TranscriptionJobName=name, Media={"MediaFileUri": f"s3://b/{name}.mp3"},
+                                       OutputKey=f"transcripts/{name}.json")
+    store.add(name, f"{name}.mp3", f"transcripts/{name}.json")
+
+
+def tracker_for(transcribe, store, on_complete=None, **kwargs):
+    return TranscribeTracker(transcribe, store, on_complete, calls_per_second=0, **kwargs)
+
+
+def test_completed_and_failed_jobs(store):
+    transcribe = FakeTranscribeClient()
+    start(transcribe, store, "done")
+    start(transcribe, store, "broken", failure_rate=1.0)
+    start(transcribe, store, "running", job_seconds=60)
+    imports = []
+
+    async def on_complete(completed):
+        imports.append(completed)
+        return [name for name, _ in completed]
+
+    tracker = tracker_for(transcribe, store, on_complete)
+    assert asyncio.run(tracker.poll_once()) == 2
+    assert store.counts() == {"COMPLETED": 1, "FAILED": 1, "IN_PROGRESS": 1}
+    assert imports == [[("done", "transcripts/done.json")]]
+    assert store.unimported() == []
+
+    assert asyncio.run(tracker.poll_once()) == 0
+    assert len(imports) == 1
+
+
+def test_paging_stops_at_the_oldest_pending_job(store):
+    transcribe = FakeTranscribeClient(job_seconds=0)
+    for i in range(2 * PAGE_SIZE + 50):
+        transcribe.start_transcription_job(TranscriptionJobName=f"old-{i}", Media={"MediaFileUri": "s3://b/x.mp3"})
+        transcribe.jobs[f"old-{i}"]["CreationTime"] -= timedelta(days=1)
+    start(transcribe, store, "new")
+
+    tracker = tracker_for(transcribe, store)
+    assert asyncio.run(tracker.poll_once()) == 1
+    assert tracker.list_calls == 2  # first COMPLETED page reaches day-old jobs; no FAILED jobs at all
+
+    # A pending job from before all of them has every page read
+    start(transcribe, store, "newer", job_seconds=60)
+    with store.db:
+        store.db.execute("UPDATE jobs SET created_at = created_at - 2 * 86400 WHERE job_name = 'newer'")
+    tracker.list_calls = 0
+    asyncio.run(tracker.poll_once())
+    assert tracker.list_calls == 3 + 1
+
+
+def test_interval_backs_off_while_throttled(store, monkeypatch):
+    transcribe = FakeTranscribeClient()
+    start(transcribe, store, "running", job_seconds=60)
+
+    def throttled(**kwargs):
+        raise ThrottlingException("Rate exceeded")
+
+    transcribe.list_transcription_jobs = throttled
+    intervals = []
+
+    async def no_wait(awaitable, timeout):
+        awaitable.close()
+        intervals.append(timeout)
+        if len(intervals) == 6:
+            return  # as if stopped
+        raise asyncio.TimeoutError
+
+    monkeypatch.setattr(asyncio, "wait_for", no_wait)
+    tracker = tracker_for(transcribe, store, min_interval=5, max_interval=60)
+    asyncio.run(tracker.run())
+    assert intervals == [10, 20, 40, 60, 60, 60]
+
+
+def test_interval_drops_back_on_progress(store, monkeypatch):
+    transcribe = FakeTranscribeClient()
+    start(transcribe, store, "running", job_seconds=60)
+    intervals = []
+
+    async def no_wait(awaitable, timeout):
+        awaitable.close()
+        intervals.append(timeout)
+        if len(intervals) == 3:
+            start(transcribe, store, "quick")
+        if len(intervals) == 5:
+            return
+        raise asyncio.TimeoutError
+
+    monkeypatch.setattr(asyncio, "wait_for", no_wait)
+    asyncio.run(tracker_for(transcribe, store, min_interval=5, max_interval=60).run())
+    assert intervals == [10, 20, 40, 5, 10]
+
+
+def test_on_complete_is_retried_after_an_exception(store):
+    transcribe = FakeTranscribeClient()
+    start(transcribe, store, "done")
+    calls = []
+
+    async def on_complete(completed):
+        calls.append(completed)
+        if len(calls) == 1:
+            raise ConnectionError("database unavailable")
+        return [name for name, _ in completed]
+
+    tracker = tracker_for(transcribe, store, on_complete)
+    asyncio.run(tracker.poll_once())
+    assert store.unimported() == [("done", "transcripts/done.json")]
+    asyncio.run(tracker.poll_once())
+    assert calls == [[("done", "transcripts/done.json")]] * 2
+    assert store.unimported() == []
+    asyncio.run(tracker.poll_once())
+    assert len(calls) == 2
+
+
+def test_db_importer_keeps_its_writer_between_batches(tmp_path, monkeypatch):
+    import json
+    import sqlite3
+
+    import boto3
+    from moto import mock_aws
+
+    import db_import
+    import search_index
+    import word_timings
+    from transcribe_tracker import make_db_importer
+
+    db = str(tmp_path / "questions.db")
+    with sqlite3.connect(db) as conn:
+        conn.execute("CREATE TABLE Question (ID INTEGER PRIMARY KEY, Title TEXT, Date TEXT, Transcription TEXT)")
+    opened = []
+
+    class CountedWriter(db_import.TranscriptWriter):
+        def __init__(self, *args, **kwargs):
+            opened.append(self)
+            super().__init__(*args, dialect="sqlite", **kwargs)
+
+    monkeypatch.setattr(db_import, "DB_SQLITE", db)
+    monkeypatch.setattr(db_import, "TranscriptWriter", CountedWriter)
+    monkeypatch.setattr(search_index, "open_index", lambda: None)
+    monkeypatch.setattr(word_timings, "open_store", lambda: None)
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket=db_import.S3_BUCKET)
+        for i in range(4):
+            body = {"results": {"transcripts": [{"transcript": f"answer {i}"}]}}
+            s3.put_object(Bucket=db_import.S3_BUCKET, Key=f"transcripts/2024-01-01_-_Question_{i}-{i}.json",
+                          Body=json.dumps(body).encode())
+        importer = make_db_importer(s3)
+
+        def batch(*numbers):
+            return asyncio.run(importer([(f"job-{i}", f"transcripts/2024-01-01_-_Question_{i}-{i}.json")
+                                         for i in numbers]))
+
+        batch(0)
+        batch(1, 0)
+        assert len(opened) == 1 and opened[0].inserted == 2 and opened[0].skipped == 1
+        with pytest.raises(Exception):
+            batch(2, 9)  # no such transcript
+        batch(2, 3)
+        assert len(opened) == 2  # a failed batch starts over from the database
+        importer.close()
+    with sqlite3.connect(db) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM Question").fetchone()[0] == 4
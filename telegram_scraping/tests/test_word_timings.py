@@ -0,0 +1,33 @@
+# tests/test_word_timings.py
+# WordTimingStore round trip, and a reader finding words that another
+# process added to the shared vocabulary after the reader loaded it.
+
+from word_timings import WordTimingStore
+
+
+def items(text):
+    return [{"type": "pronunciation", "start_time": str(i), "end_time": str(i + 0.5),
+             "alternatives": [{"content": word, "confidence": "0.9"}]} for i, word in enumerate(text.split())]
+
+
+def write(store, title, text):
+    store.write(title, "2024-01-01", store.encode(text, items(text)))
+
+
+def test_offsets_round_trip(tmp_path):
+    store = WordTimingStore(str(tmp_path))
+    write(store, "Q", "what about zakat on gold")
+    with store.open("Q", "2024-01-01") as timings:
+        assert timings.offset_of("Zakat") == 2.0
+        assert timings.find("silver") == []
+
+
+def test_words_added_by_another_process_are_found(tmp_path):
+    reader = WordTimingStore(str(tmp_path))
+    write(reader, "Old", "fasting in ramadan")
+    writer = WordTimingStore(str(tmp_path))  # e.g. the scraper's importer
+    write(writer, "New", "riba and fasting")
+    assert reader.vocabulary.get("riba") is None
+    with reader.open("New", "2024-01-01") as timings:
+        assert timings.find("riba") == [0]
+        assert timings.offset_of("fasting") == 2.0
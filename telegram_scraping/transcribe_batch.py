@@ -0,0 +1,166 @@
+# transcribe_batch.py
+# Joins short clips of one livestream into a single Transcribe job and splits
+# the finished transcript back into one transcript per clip by word timing,
+# so a 40-question stream costs a few jobs instead of 40. Per-clip
+# transcripts land under transcripts/ with the names single-clip jobs would
+# have used, so db_import sees no difference.
+#
+#   TRANSCRIBE_BATCH_SECONDS=900   join clips into jobs of up to 15 minutes (0 = one job per clip)
+
+import hashlib
+import json
+import os
+from typing import List, Sequence, Tuple, TypeVar
+
+from metrics import log, metrics
+from mp3frames import iter_frames, READ_CHUNK
+from transcribe_tracker import BatchPart, CompletedJob, JobStore
+
+TRANSCRIBE_BATCH_SECONDS = float(os.getenv("TRANSCRIBE_BATCH_SECONDS", 0))
+TRANSCRIBE_BATCH_MAX_CLIPS = int(os.getenv("TRANSCRIBE_BATCH_MAX_CLIPS", 50))
+BATCH_MEDIA_PREFIX = "transcribe-batches/"
+# Kept out of transcripts/, which db_import scans for per-question transcripts
+BATCH_TRANSCRIPT_PREFIX = "transcript-batches/"
+# Whole-job fields copied into every part; per-segment ones like audio_segments are dropped
+KEPT_RESULT_FIELDS = ("language_code", "language_identification")
+
+T = TypeVar("T")
+
+
+def plan_batches(clips: Sequence[Tuple[T, float]], max_seconds: float = TRANSCRIBE_BATCH_SECONDS,
+                 max_clips: int = TRANSCRIBE_BATCH_MAX_CLIPS) -> List[List[T]]:
+    """
+    Groups (clip, seconds) pairs, in order, into runs of at most max_seconds
+    and max_clips. A clip that is long enough on its own stays in a batch of
+    one; max_seconds <= 0 turns batching off.
+    """
+    if max_seconds <= 0:
+        return [[clip] for clip, _ in clips]
+    batches, current, total = [], [], 0.0
+    for clip, seconds in clips:
+        if current and (total + seconds > max_seconds or len(current) >= max_clips):
+            batches.append(current)
+            current, total = [], 0.0
+        current.append(clip)
+        total += seconds
+    if current:
+        batches.append(current)
+    return batches
+
+
+def batch_job_name(part_job_names: Sequence[str]) -> str:
+    # Deterministic, so re-running a message finds the job it already started
+    return "batch-" + hashlib.sha1("\n".join(part_job_names).encode()).hexdigest()[:20]
+
+
+def part_transcript_key(job_name: str) -> str:
+    # Where a single-clip job would have written it
+    return f"transcripts/{job_name}.json"
+
+
+def batch_transcript_key(job_name: str) -> str:
+    return f"{BATCH_TRANSCRIPT_PREFIX}{job_name}.json"
+
+
+def batch_media_key(job_name: str) -> str:
+    return f"{BATCH_MEDIA_PREFIX}{job_name}.mp3"
+
+
+def make_parts(job_names: Sequence[str], clip_keys: Sequence[str],
+               spans: Sequence[Tuple[float, float]]) -> List[BatchPart]:
+    return [BatchPart(name, key, part_transcript_key(name), start, end)
+            for name, key, (start, end) in zip(job_names, clip_keys, spans)]
+
+
+def concat_clips(paths: Sequence[str], out_path: str) -> List[Tuple[float, float]]:
+    """
+    Writes the MP3 frames of every clip back to back, without their ID3 and
+    Xing/Info headers, and returns each clip's (start_ms, end_ms) in the
+    joined audio. The clips are cut from the same recording, so their frames
+    share one format and need no re-encoding.
+    """
+    spans = []
+    elapsed = 0.0
+    with open(out_path, "wb") as out:
+        for path in paths:
+            start = elapsed
+            with open(path, "rb") as scan, open(path, "rb") as src:
+                for frame in iter_frames(scan, READ_CHUNK):
+                    if src.tell() != frame.offset:
+                        src.seek(frame.offset)
+                    out.write(src.read(frame.size))
+                    elapsed += frame.duration_ms
+            spans.append((start, elapsed))
+    return spans
+
+
+def _rebuild_text(items: List[dict]) -> str:
+    # Transcribe's own layout: words separated by spaces, punctuation attached
+    text = ""
+    for item in items:
+        content = item["alternatives"][0]["content"]
+        text += content if item["type"] == "punctuation" or not text else " " + content
+    return text
+
+
+def split_transcript(transcript: dict, parts: Sequence[BatchPart]) -> List[dict]:
+    """
+    One Transcribe-shaped transcript per part. A word belongs to the part its
+    midpoint falls in, with its times made relative to that part; punctuation
+    follows the word before it.
+    """
+    results = transcript.get("results", {})
+    per_part: List[List[dict]] = [[] for _ in parts]
+    bounds = [part.end_ms / 1000 for part in parts]
+    current = 0
+    for item in results.get("items", []):
+        if "start_time" in item:
+            middle = (float(item["start_time"]) + float(item["end_time"])) / 2
+            while current + 1 < len(parts) and middle >= bounds[current]:
+                current += 1
+            while current > 0 and middle < parts[current].start_ms / 1000:
+                current -= 1
+            offset = parts[current].start_ms / 1000
+            item = dict(item, start_time=f"{max(0.0, float(item['start_time']) - offset):.3f}",
+                        end_time=f"{max(0.0, float(item['end_time']) - offset):.3f}")
+        per_part[current].append(item)
+
+    split = []
+    for part, items in zip(parts, per_part):
+        split.append({
+            "jobName": part.job_name,
+            "status": transcript.get("status", "COMPLETED"),
+            "results": dict({k: v for k, v in results.items() if k in KEPT_RESULT_FIELDS},
+                            transcripts=[{"transcript": _rebuild_text(items)}], items=items),
+        })
+    return split
+
+
+def expand_batches(s3, bucket: str, store: JobStore, completed: List[CompletedJob]) -> List[str]:
+    """
+    Transcript keys to import for finished jobs. A combined job's transcript
+    is split and each part written to its own transcript key first, and the
+    joined audio, no longer needed, is deleted.
+    """
+    keys = []
+    for job_name, transcript_key in completed:
+        parts = store.batch_parts(job_name)
+        if not parts:
+            keys.append(transcript_key)
+            continue
+        body = s3.get_object(Bucket=bucket, Key=transcript_key)["Body"]
+        try:
+            transcript = json.loads(body.read())
+        finally:
+            body.close()
+        for part, data in zip(parts, split_transcript(transcript, parts)):
+            s3.put_object(Bucket=bucket, Key=part.transcript_key, Body=json.dumps(data).encode(),
+                          ContentType="application/json")
+            keys.append(part.transcript_key)
+        try:
+            s3.delete_object(Bucket=bucket, Key=batch_media_key(job_name))
+        except Exception as e:
+            log(f"⚠️ Could not delete joined audio for {job_name}: {e}", level="warning", job=job_name)
+        metrics.inc("transcribe_batch_clips_split_total", len(parts))
+        log(f"✂️ Split {job_name} into {len(parts)} transcript(s)", job=job_name, clips=len(parts))
+    return keys
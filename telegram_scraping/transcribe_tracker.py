@@ -0,0 +1,290 @@
+# transcribe_tracker.py
+# Remembers every Transcribe job we start and watches for them to finish, so
+# finished transcripts can be imported right away instead of at the next
+# full rescan of transcripts/.
+#
+# Run standalone to keep polling until every recorded job is done:
+#   python transcribe_tracker.py
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from metrics import log, metrics
+
+JOBS_DB = os.getenv("TRANSCRIBE_JOBS_DB", "transcribe_jobs.db")
+POLL_MIN_SECONDS = float(os.getenv("TRANSCRIBE_POLL_MIN", 5))
+POLL_MAX_SECONDS = float(os.getenv("TRANSCRIBE_POLL_MAX", 120))
+LIST_CALLS_PER_SECOND = float(os.getenv("TRANSCRIBE_LIST_RATE", 2))
+PAGE_SIZE = 100                      # list_transcription_jobs maximum
+CREATION_SLACK_SECONDS = 300         # clock skew allowance when paging back in time
+TERMINAL_STATES = ("COMPLETED", "FAILED")
+
+CompletedJob = Tuple[str, str]       # (job_name, transcript_key)
+# One clip inside a combined job: where its own transcript goes and where it sits in the joined audio
+BatchPart = namedtuple("BatchPart", "job_name clip_key transcript_key start_ms end_ms")
+
+
+class JobStore:
+    """
+    Job name, clip key, transcript key and state for every job, in SQLite,
+    plus the clips that make up each combined (batched) job.
+    """
+
+    def __init__(self, path: str = JOBS_DB) -> None:
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_name TEXT PRIMARY KEY,
+                    clip_key TEXT NOT NULL,
+                    transcript_key TEXT NOT NULL,
+                    state TEXT NOT NULL DEFAULT 'IN_PROGRESS',
+                    imported INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self.db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, imported)")
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS batch_parts (
+                    batch_job TEXT NOT NULL,
+                    part INTEGER NOT NULL,
+                    job_name TEXT NOT NULL,
+                    clip_key TEXT NOT NULL,
+                    transcript_key TEXT NOT NULL,
+                    start_ms REAL NOT NULL,
+                    end_ms REAL NOT NULL,
+                    PRIMARY KEY (batch_job, part)
+                )
+            """)
+
+    def add(self, job_name: str, clip_key: str, transcript_key: str) -> None:
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO jobs (job_name, clip_key, transcript_key, created_at, updated_at) "
+                            "VALUES (?, ?, ?, ?, ?)", (job_name, clip_key, transcript_key, now, now))
+
+    def add_batch(self, job_name: str, media_key: str, transcript_key: str, parts: List[BatchPart]) -> None:
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO jobs (job_name, clip_key, transcript_key, created_at, updated_at) "
+                            "VALUES (?, ?, ?, ?, ?)", (job_name, media_key, transcript_key, now, now))
+            self.db.execute("DELETE FROM batch_parts WHERE batch_job = ?", (job_name,))
+            self.db.executemany("INSERT INTO batch_parts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                [(job_name, i, *part) for i, part in enumerate(parts)])
+
+    def batch_parts(self, job_name: str) -> List[BatchPart]:
+        """The clips of a combined job, in order; empty for a single-clip job."""
+        with self.lock:
+            rows = self.db.execute("SELECT job_name, clip_key, transcript_key, start_ms, end_ms FROM batch_parts "
+                                   "WHERE batch_job = ? ORDER BY part", (job_name,)).fetchall()
+        return [BatchPart(*row) for row in rows]
+
+    def clip_keys(self, job_names: List[str]) -> Dict[str, str]:
+        if not job_names:
+            return {}
+        marks = ",".join("?" * len(job_names))
+        with self.lock:
+            return dict(self.db.execute(f"SELECT job_name, clip_key FROM jobs WHERE job_name IN ({marks})",
+                                        job_names).fetchall())
+
+    def pending(self) -> Dict[str, float]:
+        with self.lock:
+            rows = self.db.execute("SELECT job_name, created_at FROM jobs WHERE state = 'IN_PROGRESS'").fetchall()
+        return dict(rows)
+
+    def set_states(self, states: List[Tuple[str, str]]) -> None:
+        now = time.time()
+        with self.lock, self.db:
+            self.db.executemany("UPDATE jobs SET state = ?, updated_at = ? WHERE job_name = ?",
+                                [(state, now, name) for name, state in states])
+
+    def unimported(self) -> List[CompletedJob]:
+        with self.lock:
+            return self.db.execute("SELECT job_name, transcript_key FROM jobs "
+                                   "WHERE state = 'COMPLETED' AND imported = 0").fetchall()
+
+    def mark_imported(self, job_names: List[str]) -> None:
+        with self.lock, self.db:
+            self.db.executemany("UPDATE jobs SET imported = 1 WHERE job_name = ?", [(n,) for n in job_names])
+
+    def counts(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+
+class RateLimiter:
+    def __init__(self, per_second: float) -> None:
+        self.interval = 1.0 / per_second if per_second > 0 else 0
+        self.next_at = 0.0
+
+    async def wait(self) -> None:
+        now = time.monotonic()
+        if self.next_at > now:
+            await asyncio.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+class TranscribeTracker:
+    """
+    Polls with list_transcription_jobs, one call per page of 100 jobs per
+    terminal state, instead of one get_transcription_job per job. Paging
+    stops once it reaches jobs older than the oldest one still pending.
+    The poll interval doubles (up to POLL_MAX_SECONDS) while nothing changes
+    or the API throttles us, and drops back to POLL_MIN_SECONDS on progress.
+    """
+
+    def __init__(self, client, store: JobStore,
+                 on_complete: Optional[Callable[[List[CompletedJob]], Awaitable[List[str]]]] = None,
+                 min_interval: float = POLL_MIN_SECONDS, max_interval: float = POLL_MAX_SECONDS,
+                 calls_per_second: float = LIST_CALLS_PER_SECOND) -> None:
+        self.client = client
+        self.store = store
+        self.on_complete = on_complete
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.limiter = RateLimiter(calls_per_second)
+        self.list_calls = 0
+
+    async def _finished_jobs(self, status: str, oldest: float) -> Dict[str, str]:
+        found = {}
+        token = None
+        while True:
+            await self.limiter.wait()
+            kwargs = {"Status": status, "MaxResults": PAGE_SIZE}
+            if token:
+                kwargs["NextToken"] = token
+            with metrics.timer("transcribe_call_seconds", call="list_transcription_jobs"):
+                page = await asyncio.to_thread(self.client.list_transcription_jobs, **kwargs)
+            self.list_calls += 1
+            summaries = page.get("TranscriptionJobSummaries", [])
+            for summary in summaries:
+                found[summary["TranscriptionJobName"]] = status
+            token = page.get("NextToken")
+            # Results come newest first; stop once we are past our oldest pending job
+            if not token or not summaries or \
+                    summaries[-1]["CreationTime"].timestamp() < oldest - CREATION_SLACK_SECONDS:
+                return found
+
+    async def _import(self) -> None:
+        completed = self.store.unimported()
+        if not completed or not self.on_complete:
+            return
+        try:
+            imported = await self.on_complete(completed)
+        except Exception as e:
+            log(f"⚠️ Could not import finished transcripts (will retry): {e}", level="warning", error=repr(e))
+            return
+        self.store.mark_imported(imported)
+
+    async def poll_once(self) -> int:
+        """Checks every pending job once. Returns how many reached a terminal state."""
+        pending = self.store.pending()
+        if pending:
+            oldest = min(pending.values())
+            finished = {}
+            for status in TERMINAL_STATES:
+                finished.update(await self._finished_jobs(status, oldest))
+            changed = [(name, state) for name, state in finished.items() if name in pending]
+            self.store.set_states(changed)
+            for name, state in changed:
+                metrics.inc("transcribe_jobs_finished_total", state=state)
+                log(f"{'📝' if state == 'COMPLETED' else '❌'} Transcribe job {name}: {state}", job=name, state=state)
+        else:
+            changed = []
+        await self._import()
+        return len(changed)
+
+    async def run(self, stop: Optional[asyncio.Event] = None, until_idle: bool = False) -> None:
+        interval = self.min_interval
+        stop = stop or asyncio.Event()
+        while True:
+            try:
+                changed = await self.poll_once()
+            except Exception as e:
+                log(f"⚠️ Transcribe status check failed: {e}", level="warning", error=repr(e))
+                changed = 0
+            interval = self.min_interval if changed else min(self.max_interval, interval * 2)
+            if until_idle and not self.store.pending() and not self.store.unimported():
+                return
+            try:
+                await asyncio.wait_for(stop.wait(), interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+
+def make_db_importer(s3, store: Optional[JobStore] = None):
+    """
+    on_complete callback that imports finished transcripts with db_import.
+    With the job store, combined jobs are first split into one transcript
+    per clip, and media cut out of a virtual clip's recording is deleted
+    after the import. The TranscriptWriter and its connection are kept
+    between batches; call the callback's close() when the tracker is done.
+    """
+    import db_import
+    import search_index
+    import transcribe_batch
+    import virtual_clips
+    import word_timings
+
+    writer = None
+
+    def open_writer():
+        # One writer for the tracker's lifetime: the manifest and the Question
+        # titles are read once, and add() keeps both caches current afterwards
+        connection = db_import.get_db_connection()
+        try:
+            return db_import.TranscriptWriter(connection, index=search_index.open_index(),
+                                              timings=word_timings.open_store())
+        except Exception:
+            connection.close()
+            raise
+
+    def close_writer():
+        nonlocal writer
+        if writer:
+            writer.connection.close()
+            if writer.index:
+                writer.index.close()
+            writer = None
+
+    def import_now(completed: List[CompletedJob]) -> List[str]:
+        nonlocal writer
+        keys = transcribe_batch.expand_batches(s3, db_import.S3_BUCKET, store, completed) if store else \
+            [key for _, key in completed]
+        writer = writer or open_writer()
+        try:
+            db_import.import_keys(s3, writer, keys)
+        except Exception:
+            # Unflushed rows are already in the writer's caches; start over from the database
+            close_writer()
+            raise
+        log(f"📥 Imported {len(keys)} finished transcript(s)", count=len(keys))
+        if store:
+            virtual_clips.drop_media(s3, db_import.S3_BUCKET, store.clip_keys([name for name, _ in completed]))
+        return [name for name, _ in completed]
+
+    async def on_complete(completed: List[CompletedJob]) -> List[str]:
+        return await asyncio.to_thread(import_now, completed)
+
+    on_complete.close = close_writer
+    return on_complete
+
+
+if __name__ == "__main__":
+    import boto3
+
+    region = os.getenv("AWS_DEFAULT_REGION") or "us-east-1"
+    store = JobStore()
+    tracker = TranscribeTracker(boto3.client("transcribe", region_name=region), store,
+                                make_db_importer(boto3.client("s3", region_name=region), store))
+    asyncio.run(tracker.run(until_idle=True))
+    tracker.on_complete.close()
+    print(f"✅ Job states: {tracker.store.counts()}")
@@ -0,0 +1,158 @@
+# transfer_tuning.py
+# Picks the connection count and part size for FastTelethon transfers from
+# measured throughput instead of file size alone.
+
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+MIN_CONNECTIONS = 1
+MAX_CONNECTIONS = int(os.getenv("MAX_CONNECTIONS", 20))
+MAX_UPLOAD_CONNECTIONS = int(os.getenv("MAX_UPLOAD_CONNECTIONS", 8))
+BIG_FILE_SIZE = 10 * 1024 * 1024   # larger uploads must use SaveBigFilePart
+DOWNLOAD_SINK = os.getenv("DOWNLOAD_SINK", "pwrite")  # or "mmap"
+PART_SIZES_KB = (256, 512, 1024)   # GetFileRequest limits must divide 1 MB
+TICK_SECONDS = 1.0
+GAIN = 0.05                        # rate change that counts as better/worse
+FLOOD_COOLDOWN_TICKS = 3
+EWMA_ALPHA = 0.3
+
+STATS_FILE = os.getenv("TRANSFER_STATS_FILE", "transfer_stats.json")
+DOWNLOAD_LOG_FILE = os.getenv("DOWNLOAD_STATS_FILE", "download_stats.jsonl")
+
+
+class AdaptiveController:
+    """
+    Hill-climbs the connection count on bytes/sec: keep stepping while the
+    rate improves, turn around when it gets worse, hold when it is flat.
+    A FLOOD_WAIT halves the count and pauses climbing for a few ticks.
+    """
+
+    def __init__(self, start: int, max_count: int = MAX_CONNECTIONS, min_count: int = MIN_CONNECTIONS,
+                 fixed: bool = False, interval: float = TICK_SECONDS) -> None:
+        self.min_count = min_count
+        self.max_count = max(min_count, max_count)
+        self.target = min(max(start, min_count), self.max_count)
+        self.fixed = fixed
+        self.interval = interval
+        self.active = 0
+        self.direction = 1
+        self.cooldown = 0
+        self.last_rate: Optional[float] = None
+        self.window_bytes = 0
+        self.window_start = time.monotonic()
+        self.started = self.window_start
+        self.total_bytes = 0
+        self.flood_waits = 0
+        self.errors = 0
+        self.best_rate = 0.0
+        self.best_target = self.target
+        self.peak_active = 0
+        self.history: List[List[float]] = []
+
+    def on_bytes(self, n: int) -> None:
+        self.window_bytes += n
+        self.total_bytes += n
+
+    def on_flood_wait(self, seconds: int) -> None:
+        self.flood_waits += 1
+        if not self.fixed:
+            self.target = max(self.min_count, self.target // 2)
+            self.direction = 1
+            self.cooldown = FLOOD_COOLDOWN_TICKS + int(seconds / self.interval)
+
+    def on_error(self) -> None:
+        self.errors += 1
+
+    def on_sender_added(self) -> None:
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+
+    def should_retire(self) -> bool:
+        if self.active > self.target:
+            self.active -= 1
+            return True
+        return False
+
+    def tick(self) -> int:
+        now = time.monotonic()
+        rate = self.window_bytes / max(now - self.window_start, 1e-6)
+        self.window_bytes = 0
+        self.window_start = now
+        self.history.append([round(now - self.started, 2), self.target, round(rate)])
+        if rate > self.best_rate:
+            self.best_rate, self.best_target = rate, self.target
+
+        if self.fixed:
+            return self.target
+        if self.cooldown:
+            self.cooldown -= 1
+        elif self.last_rate is None or rate > self.last_rate * (1 + GAIN):
+            self.target += self.direction
+        elif rate < self.last_rate * (1 - GAIN):
+            self.direction = -self.direction
+            self.target += self.direction
+        self.target = min(max(self.target, self.min_count), self.max_count)
+        self.last_rate = rate
+        return self.target
+
+    def summary(self) -> Dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            "bytes": self.total_bytes,
+            "seconds": round(elapsed, 3),
+            "bytes_per_sec": round(self.total_bytes / max(elapsed, 1e-6)),
+            "connections_final": self.target,
+            "connections_peak": self.peak_active,
+            "connections_best": self.best_target,
+            "flood_waits": self.flood_waits,
+            "errors": self.errors,
+            "history": self.history,
+        }
+
+
+class DcStats:
+    """
+    Per-DC results of earlier transfers, kept in a small JSON file between
+    runs, plus a JSON-lines log of every transfer. path=None keeps them in memory.
+    """
+
+    def __init__(self, path: Optional[str] = STATS_FILE, log_path: Optional[str] = DOWNLOAD_LOG_FILE) -> None:
+        self.path = path
+        self.log_path = log_path
+        self.data: Dict[str, Dict] = {}
+        if path and os.path.exists(path):
+            try:
+                self.data = json.load(open(path))
+            except (OSError, ValueError):
+                self.data = {}
+
+    def connections(self, dc_id: int, default: int) -> int:
+        return self.data.get(str(dc_id), {}).get("connections", default)
+
+    def part_size_kb(self, dc_id: int, default: int) -> int:
+        rates = self.data.get(str(dc_id), {}).get("part_size_rates", {})
+        untried = [size for size in PART_SIZES_KB if str(size) not in rates]
+        if untried:
+            # Try each size once per DC before settling on the fastest
+            return default if default in untried else untried[0]
+        return int(max(rates, key=rates.get))
+
+    def record(self, dc_id: int, part_size_kb: int, summary: Dict) -> None:
+        entry = self.data.setdefault(str(dc_id), {})
+        if summary["bytes"] >= 4 * 1024 * 1024:  # small files say little about the link
+            entry["connections"] = summary["connections_best"]
+            rates = entry.setdefault("part_size_rates", {})
+            key = str(part_size_kb)
+            old = rates.get(key)
+            rate = summary["bytes_per_sec"]
+            rates[key] = round(rate if old is None else old + EWMA_ALPHA * (rate - old))
+        if self.path:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.data, f)
+            os.replace(tmp, self.path)
+        if self.log_path:
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(summary) + "\n")
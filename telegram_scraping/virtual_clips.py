@@ -0,0 +1,164 @@
+# virtual_clips.py
+# Clips as byte ranges of the original recording instead of files of their
+# own. The livestream MP3 is uploaded once, with a JSON manifest listing each
+# question's frame-aligned byte range, duration and seek table, so a player
+# can fetch a clip, or any point inside it, with an HTTP Range request.
+# Transcribe still needs one object per job: that media is cut out of the
+# recording inside S3 (UploadPartCopy of the range, nothing is sent from
+# here) when the job starts, and deleted once its transcript is imported.
+#
+#   VIRTUAL_CLIPS=1   upload the recording and a manifest instead of one file per clip
+
+import json
+import os
+import re
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from operator import itemgetter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from metrics import log, metrics
+from mp3frames import scan_seek_table
+from splitter import plan_clips
+
+VIRTUAL_CLIPS = os.getenv("VIRTUAL_CLIPS", "0") == "1"
+SEEK_INTERVAL_MS = int(os.getenv("VIRTUAL_SEEK_INTERVAL_MS", 5000))
+SOURCE_PREFIX = "livestreams/"
+MANIFEST_PREFIX = "manifests/"
+# Per-job media cut out for Transcribe; removed after import
+MEDIA_PREFIX = "virtual-splits/"
+MANIFEST_VERSION = 1
+
+# start_ms/end_ms are the planned timestamps, as in splitter.Clip. offset_ms is
+# where the clip's first frame starts in the recording; byte_end is exclusive.
+# seek holds (ms into the clip, byte offset in the recording) pairs.
+VirtualClip = namedtuple("VirtualClip", "question start_ms end_ms offset_ms duration_ms byte_start byte_end seek")
+
+_RANGE_KEY = re.compile(rf"^({re.escape(SOURCE_PREFIX)}.+)#bytes=(\d+)-(\d+)$")
+
+
+def index_clips(src_path: str, ts_items, min_clip_ms: int = 0,
+                interval_ms: float = SEEK_INTERVAL_MS) -> Tuple[List[VirtualClip], float]:
+    """
+    One pass over the recording, as split_file makes before cutting, but
+    nothing is written. Returns (clips, duration_ms).
+    """
+    boundaries = [start_sec * 1000 for start_sec, _ in ts_items]
+    with metrics.timer("split_scan_seconds"):
+        cuts, seek, duration_ms, end = scan_seek_table(src_path, boundaries, interval_ms)
+    log(f"🎧 Audio length: {duration_ms / 1000:.1f} seconds", path=src_path, duration_ms=duration_ms)
+
+    clips = []
+    for clip in plan_clips(ts_items, duration_ms, min_clip_ms):
+        byte_start, offset_ms = cuts[clip.start_ms]
+        byte_end, end_ms = cuts.get(clip.end_ms, (end, duration_ms))
+        lo = bisect_right(seek, offset_ms, key=itemgetter(0))
+        hi = bisect_left(seek, end_ms, key=itemgetter(0))
+        points = [(0.0, byte_start)] + [(round(ms - offset_ms, 1), offset) for ms, offset in seek[lo:hi]]
+        clips.append(VirtualClip(clip.question, clip.start_ms, clip.end_ms, offset_ms, end_ms - offset_ms,
+                                 byte_start, byte_end, points))
+    metrics.inc("clips_total", len(clips), mode="virtual")
+    return clips, duration_ms
+
+
+def source_key(date_str: str, document_id: int) -> str:
+    return f"{SOURCE_PREFIX}{date_str}-{document_id}.mp3"
+
+
+def manifest_key(source: str) -> str:
+    return MANIFEST_PREFIX + os.path.splitext(source[len(SOURCE_PREFIX):])[0] + ".json"
+
+
+def media_key(job_name: str) -> str:
+    return f"{MEDIA_PREFIX}{job_name}.mp3"
+
+
+def range_key(source: str, clip: VirtualClip) -> str:
+    """Stands in for a clip's S3 key: the recording's key plus the clip's inclusive byte range."""
+    return f"{source}#bytes={clip.byte_start}-{clip.byte_end - 1}"
+
+
+def parse_range_key(key: Optional[str]) -> Optional[Tuple[str, int, int]]:
+    """(source key, byte_start, byte_end exclusive) for a range key, None for a real object key."""
+    match = _RANGE_KEY.match(key or "")
+    if not match:
+        return None
+    return match.group(1), int(match.group(2)), int(match.group(3)) + 1
+
+
+def seek_offset(seek: Sequence[Tuple[float, int]], at_ms: float) -> int:
+    """Byte offset to start a Range request from to play a clip at at_ms into it."""
+    return seek[max(0, bisect_right(seek, at_ms, key=itemgetter(0)) - 1)][1]
+
+
+def make_manifest(source: str, size: int, duration_ms: float, clips: Sequence[VirtualClip],
+                  names: Sequence[Tuple[str, str]]) -> dict:
+    """
+    names holds (clip name, clip id) for each clip. A clip is served with
+    "Range: bytes={bytes[0]}-{bytes[1] - 1}" on the source object; to start
+    at t ms into it, request from the last seek entry at or before t.
+    """
+    return {
+        "version": MANIFEST_VERSION,
+        "source": source,
+        "bytes": size,
+        "duration_ms": round(duration_ms, 1),
+        "seek_interval_ms": SEEK_INTERVAL_MS,
+        "clips": [{
+            "name": name,
+            "clip_id": cid,
+            "question": clip.question,
+            "start_ms": clip.start_ms,
+            "offset_ms": round(clip.offset_ms, 1),
+            "duration_ms": round(clip.duration_ms, 1),
+            "bytes": [clip.byte_start, clip.byte_end],
+            "seek": [list(point) for point in clip.seek],
+        } for clip, (name, cid) in zip(clips, names)],
+    }
+
+
+def put_manifest(s3, bucket: str, manifest: dict) -> str:
+    key = manifest_key(manifest["source"])
+    s3.put_object(Bucket=bucket, Key=key, Body=json.dumps(manifest, ensure_ascii=False).encode(),
+                  ContentType="application/json")
+    return key
+
+
+def read_range(path: str, byte_start: int, byte_end: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(byte_start)
+        return f.read(byte_end - byte_start)
+
+
+def cut_media(s3, bucket: str, source: str, byte_start: int, byte_end: int, key: str) -> None:
+    """
+    Copies [byte_start, byte_end) of source to key inside S3. A multipart
+    upload of a single part has no minimum size, so any clip fits in one
+    UploadPartCopy.
+    """
+    upload = s3.create_multipart_upload(Bucket=bucket, Key=key, ContentType="audio/mpeg")
+    try:
+        with metrics.timer("s3_range_copy_seconds"):
+            part = s3.upload_part_copy(Bucket=bucket, Key=key, UploadId=upload["UploadId"], PartNumber=1,
+                                       CopySource={"Bucket": bucket, "Key": source},
+                                       CopySourceRange=f"bytes={byte_start}-{byte_end - 1}")
+            s3.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload["UploadId"], MultipartUpload={
+                "Parts": [{"ETag": part["CopyPartResult"]["ETag"], "PartNumber": 1}]})
+    except Exception:
+        s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload["UploadId"])
+        raise
+    metrics.inc("s3_range_copy_bytes_total", byte_end - byte_start)
+
+
+def drop_media(s3, bucket: str, clip_keys: Dict[str, str]) -> int:
+    """Deletes the cut-out media of finished jobs ({job name: clip key}); other keys are left alone."""
+    dropped = 0
+    for job_name, key in clip_keys.items():
+        if not key.startswith(MEDIA_PREFIX):
+            continue
+        try:
+            s3.delete_object(Bucket=bucket, Key=key)
+            dropped += 1
+        except Exception as e:
+            log(f"⚠️ Could not delete cut-out audio for {job_name}: {e}", level="warning", job=job_name)
+    return dropped
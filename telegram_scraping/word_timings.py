@@ -0,0 +1,249 @@
+# word_timings.py
+# Compact per-clip word timings taken from the Transcribe JSON "items", so a
+# search hit can be turned into the audio offset where the word is said
+# without loading the transcript. One .wt file per question plus a
+# vocabulary shared by all of them:
+#
+#   header   "WTS1", word count (uint32)
+#   starts   float32[n]   seconds
+#   ends     float32[n]
+#   tokens   uint32[n]    ids into vocabulary.txt (normalized words)
+#   chars    uint32[n]    offset of each word in the stored transcript text
+#   by_token uint32[n]    word indices sorted by token id, for bisect lookups
+#   conf     uint8[n]     confidence * 255
+#
+# Files are read through mmap; arrays are memoryviews over the mapping.
+
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from search_index import normalize
+
+WORD_TIMINGS_DIR = os.getenv("WORD_TIMINGS_DIR", "word_timings")  # "" disables
+VOCABULARY_FILE = "vocabulary.txt"
+MAGIC = b"WTS1"
+HEADER = struct.Struct("<4sI")
+
+
+def token_of(word: str) -> str:
+    """The same folding search_index applies, so query words find their token."""
+    return "".join(normalize(word).split()) or word.casefold()
+
+
+class Vocabulary:
+    """
+    Append-only word list shared by every clip; a word's id is its line
+    number. Several processes can add to it (the scraper's importer and a
+    manual db_import run), so new ids are only handed out under an exclusive
+    lock on the file, after reading any words the others appended.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.words: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self._offset = 0
+        self.reload()
+
+    def reload(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with self.lock, open(self.path, "rb") as f:
+            self._read_new(f)
+
+    def _read_new(self, f) -> None:
+        f.seek(self._offset)
+        for line in iter(f.readline, b""):
+            if not line.endswith(b"\n"):
+                break  # torn by a writer that died; the next add cuts it off
+            word = line[:-1].decode("utf-8")
+            self.ids[word] = len(self.words)
+            self.words.append(word)
+            self._offset += len(line)
+
+    def get(self, word: str) -> Optional[int]:
+        return self.ids.get(word)
+
+    def refresh(self) -> bool:
+        """Reads words other processes appended since we last looked; True if the file grew."""
+        try:
+            grown = os.path.getsize(self.path) > self._offset
+        except OSError:
+            return False
+        if grown:
+            self.reload()
+        return grown
+
+    def add(self, words: Iterable[str]) -> List[int]:
+        words = list(words)
+        with self.lock:
+            if any(w not in self.ids for w in words):
+                with open(self.path, "a+b") as f:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    try:
+                        self._read_new(f)
+                        new = [w for w in dict.fromkeys(words) if w not in self.ids]
+                        if new:
+                            f.truncate(self._offset)
+                            f.write("".join(w + "\n" for w in new).encode("utf-8"))
+                            f.flush()
+                            self._read_new(f)
+                    finally:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+            return [self.ids[w] for w in words]
+
+
+def parse_items(transcript: str, items: Iterable[dict]) -> List[Tuple[float, float, str, int, float]]:
+    """
+    (start, end, word, char offset, confidence) for each pronounced word.
+    Punctuation items carry no times and are left out; the char offset is
+    where the word sits in transcript, found left to right.
+    """
+    words = []
+    cursor = 0
+    for item in items:
+        if item.get("type") != "pronunciation" or "start_time" not in item:
+            continue
+        best = item["alternatives"][0]
+        content = best["content"]
+        found = transcript.find(content, cursor)
+        if found >= 0:
+            cursor = found + len(content)
+        words.append((float(item["start_time"]), float(item["end_time"]), content,
+                      found if found >= 0 else cursor, float(best.get("confidence") or 0)))
+    return words
+
+
+def encode(words: List[Tuple[float, float, str, int, float]], vocabulary: Vocabulary) -> bytes:
+    ids = array("I", vocabulary.add([token_of(w[2]) for w in words]))
+    by_token = array("I", sorted(range(len(ids)), key=ids.__getitem__))
+    return b"".join([
+        HEADER.pack(MAGIC, len(words)),
+        array("f", (w[0] for w in words)).tobytes(),
+        array("f", (w[1] for w in words)).tobytes(),
+        ids.tobytes(),
+        array("I", (w[3] for w in words)).tobytes(),
+        by_token.tobytes(),
+        bytes(min(255, max(0, round(w[4] * 255))) for w in words),
+    ])
+
+
+class WordTimings:
+    """
+    Read-only view of one clip's timings. Looking a word up is a bisect over
+    by_token, and time or text positions are bisects over starts and chars,
+    so nothing is scanned or parsed when a hit is resolved.
+    """
+
+    def __init__(self, data, vocabulary: Vocabulary) -> None:
+        magic, count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("not a word timings file")
+        self.data = data
+        self.vocabulary = vocabulary
+        self.count = count
+        self.views = [memoryview(data)]
+        offset = HEADER.size
+        for fmt in "ffIII":
+            self.views.append(self.views[0][offset:offset + count * 4].cast(fmt))
+            offset += count * 4
+        self.views.append(self.views[0][offset:offset + count])
+        self.starts, self.ends, self.tokens, self.chars, self.by_token, self.confidence = self.views[1:]
+
+    @classmethod
+    def open(cls, path: str, vocabulary: Vocabulary) -> "WordTimings":
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), vocabulary)
+
+    def close(self) -> None:
+        # The mapping cannot be closed while views into it exist
+        for view in reversed(self.views):
+            view.release()
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __enter__(self) -> "WordTimings":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def word(self, index: int) -> str:
+        token = self.tokens[index]
+        if token >= len(self.vocabulary.words):
+            self.vocabulary.reload()  # written by another process since we loaded it
+        return self.vocabulary.words[token]
+
+    def find(self, word: str) -> List[int]:
+        """Indices where word is said, in order."""
+        token = self.vocabulary.get(token_of(word))
+        if token is None and self.vocabulary.refresh():
+            # This clip may be newer than our copy of the vocabulary
+            token = self.vocabulary.get(token_of(word))
+        if token is None:
+            return []
+        key = self.tokens.__getitem__
+        lo = bisect_left(self.by_token, token, key=key)
+        hi = bisect_right(self.by_token, token, lo=lo, key=key)
+        return sorted(self.by_token[lo:hi])
+
+    def offset_of(self, word: str, occurrence: int = 0) -> Optional[float]:
+        """Start time in seconds of the given occurrence of word, None if it is never said."""
+        found = self.find(word)
+        return self.starts[found[occurrence]] if occurrence < len(found) else None
+
+    def index_at_time(self, seconds: float) -> int:
+        """The word being said (or last said) at seconds."""
+        return max(0, bisect_right(self.starts, seconds) - 1)
+
+    def index_at_char(self, position: int) -> int:
+        """The word covering a character offset in the stored transcript text."""
+        return max(0, bisect_right(self.chars, position) - 1)
+
+    def offset_at_char(self, position: int) -> Optional[float]:
+        return self.starts[self.index_at_char(position)] if self.count else None
+
+
+class WordTimingStore:
+    """
+    One file per question, named from (title, date) like the rows in
+    search_index, so a search hit leads straight to its timings.
+    """
+
+    def __init__(self, folder: str = WORD_TIMINGS_DIR) -> None:
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.vocabulary = Vocabulary(os.path.join(folder, VOCABULARY_FILE))
+
+    def path_for(self, title: str, date: str) -> str:
+        name = hashlib.sha1(f"{date}\n{title}".encode()).hexdigest()[:20]
+        return os.path.join(self.folder, name[:2], name + ".wt")
+
+    def encode(self, transcript: str, items: Iterable[dict]) -> bytes:
+        return encode(parse_items(transcript, items), self.vocabulary)
+
+    def write(self, title: str, date: str, data: bytes) -> None:
+        path = self.path_for(title, date)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def open(self, title: str, date: str) -> Optional[WordTimings]:
+        path = self.path_for(title, date)
+        if not os.path.exists(path):
+            return None
+        return WordTimings.open(path, self.vocabulary)
+
+
+def open_store(folder: Optional[str] = WORD_TIMINGS_DIR) -> Optional[WordTimingStore]:
+    return WordTimingStore(folder) if folder else None